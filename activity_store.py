@@ -0,0 +1,268 @@
+"""
+Relational storage of synced Garmin activities.
+
+The summaryDTO metrics of each activity are typed columns of the activities
+table and its typed splits are rows of activity_splits, both indexed by user,
+activity type and local start time, so years of history can be filtered and
+aggregated in SQL (or loaded column by column with load_columns) instead of
+parsing one JSON file per activity.
+
+    uv run activity_store.py import <user_id> [data/activities]
+
+imports the per-activity JSON files written by core/parse.py.
+"""
+import asyncio
+import json
+import sys
+from collections.abc import Iterable
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import Float, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+import training_load
+from db_models.activity import Activity, ActivitySplit
+
+# Activity column -> summaryDTO key
+SUMMARY_FIELDS = {
+    "distance_m": "distance",
+    "duration_s": "duration",
+    "moving_duration_s": "movingDuration",
+    "elevation_gain_m": "elevationGain",
+    "elevation_loss_m": "elevationLoss",
+    "average_speed": "averageSpeed",
+    "average_hr": "averageHR",
+    "max_hr": "maxHR",
+    "average_run_cadence": "averageRunCadence",
+    "calories": "calories",
+    "training_effect": "trainingEffect",
+    "anaerobic_training_effect": "anaerobicTrainingEffect",
+    "training_load": "activityTrainingLoad",
+    "aerobic_message": "aerobicTrainingEffectMessage",
+    "anaerobic_message": "anaerobicTrainingEffectMessage",
+}
+
+# ActivitySplit column -> typed split key
+SPLIT_FIELDS = {
+    "distance_m": "distance",
+    "duration_s": "duration",
+    "moving_duration_s": "movingDuration",
+    "elevation_gain_m": "elevationGain",
+    "average_speed": "averageSpeed",
+    "average_hr": "averageHR",
+    "max_hr": "maxHR",
+    "average_run_cadence": "averageRunCadence",
+}
+
+METRIC_COLUMNS = [name for name in SUMMARY_FIELDS if not name.endswith("_message")]
+SPLIT_METRIC_COLUMNS = list(SPLIT_FIELDS)
+
+
+def parse_time(value: str) -> datetime:
+    # Garmin uses both "2025-11-03 07:12:33" (lists) and "2025-11-03T07:12:33.0" (details)
+    return datetime.fromisoformat(value)
+
+
+def to_record(user_id: int, detail: dict, splits: list[dict] | None) -> Activity:
+    """An Activity row from a Garmin activity detail and its typed splits."""
+    summary = detail.get("summaryDTO", {})
+    return Activity(
+        user_id=user_id,
+        garmin_id=detail["activityId"],
+        activity_type=(detail.get("activityTypeDTO") or {}).get("typeKey", "other"),
+        name=detail.get("activityName"),
+        start_time_local=parse_time(summary["startTimeLocal"]),
+        start_time_gmt=parse_time(summary["startTimeGMT"]),
+        detail=detail,
+        splits=[
+            ActivitySplit(
+                position=position,
+                split_type=split.get("type", "UNKNOWN"),
+                **{column: split.get(key) for column, key in SPLIT_FIELDS.items()},
+            )
+            for position, split in enumerate(splits or [])
+        ],
+        **{column: summary.get(key) for column, key in SUMMARY_FIELDS.items()},
+    )
+
+
+async def stored_ids(db: AsyncSession, user_id: int, garmin_ids: Iterable[int]) -> set[int]:
+    result = await db.execute(
+        select(Activity.garmin_id).where(Activity.user_id == user_id, Activity.garmin_id.in_(list(garmin_ids)))
+    )
+    return set(result.scalars().all())
+
+
+async def save_activities(db: AsyncSession, user_id: int, records: list[Activity]) -> int:
+    """
+    Adds the activities that are not stored yet, and their training load, and
+    returns how many. The caller commits.
+    """
+    existing = await stored_ids(db, user_id, [record.garmin_id for record in records])
+    new = [record for record in records if record.garmin_id not in existing]
+    db.add_all(new)
+    await training_load.add_activities(db, user_id, new)
+    return len(new)
+
+
+def _filtered(query, user_id: int, start: date | None, end: date | None, activity_types: Iterable[str] | None):
+    query = query.where(Activity.user_id == user_id)
+    if activity_types is not None:
+        query = query.where(Activity.activity_type.in_(list(activity_types)))
+    if start:
+        query = query.where(Activity.start_time_local >= datetime.combine(start, time.min))
+    if end:
+        query = query.where(Activity.start_time_local < datetime.combine(end + timedelta(days=1), time.min))
+    return query.order_by(Activity.start_time_local)
+
+
+async def list_activities(
+    db: AsyncSession,
+    user_id: int,
+    start: date | None = None,
+    end: date | None = None,
+    activity_types: Iterable[str] | None = None,
+    with_splits: bool = False,
+) -> list[Activity]:
+    """Activities that started (local time) between start and end inclusive, oldest first."""
+    query = _filtered(select(Activity), user_id, start, end, activity_types)
+    if with_splits:
+        query = query.options(selectinload(Activity.splits))
+    result = await db.execute(query)
+    return list(result.scalars().all())
+
+
+def _column_array(values: tuple, numeric: bool) -> np.ndarray:
+    if numeric:
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    return np.array(values, dtype=object)
+
+
+def _columns(rows: list, names: list[str], numeric: list[bool]) -> dict[str, np.ndarray]:
+    values = list(zip(*rows)) or [()] * len(names)
+    return {name: _column_array(column, is_numeric) for name, column, is_numeric in zip(names, values, numeric)}
+
+
+def detail_columns(details: list[dict]) -> dict[str, np.ndarray]:
+    """Garmin activity details as the columns load_columns returns, with every metric plus "name"."""
+    summaries = [detail.get("summaryDTO", {}) for detail in details]
+    return {
+        "garmin_id": np.array([detail["activityId"] for detail in details], dtype=np.int64),
+        "activity_type": _column_array(
+            tuple((detail.get("activityTypeDTO") or {}).get("typeKey", "other") for detail in details), False
+        ),
+        "start_time_local": np.array(
+            [parse_time(summary["startTimeLocal"]) for summary in summaries], dtype="datetime64[s]"
+        ),
+        "name": _column_array(tuple(detail.get("activityName") for detail in details), False),
+        **{
+            column: _column_array(tuple(summary.get(key) for summary in summaries), column in METRIC_COLUMNS)
+            for column, key in SUMMARY_FIELDS.items()
+        },
+    }
+
+
+def split_columns(details: list[dict], splits: list[list[dict] | None]) -> dict[str, np.ndarray]:
+    """Typed splits of Garmin activities (one list, or None, per detail) as load_split_columns returns them."""
+    rows = [
+        (detail["activityId"], position, split.get("type", "UNKNOWN"), *(split.get(key) for key in SPLIT_FIELDS.values()))
+        for detail, activity_splits in zip(details, splits)
+        for position, split in enumerate(activity_splits or [])
+    ]
+    return _split_columns(rows, SPLIT_METRIC_COLUMNS)
+
+
+def _split_columns(rows: list, columns: list[str]) -> dict[str, np.ndarray]:
+    result = _columns(rows, ["garmin_id", "position", "split_type", *columns], [False, False, False, *[True] * len(columns)])
+    result["garmin_id"] = result["garmin_id"].astype(np.int64)
+    result["position"] = result["position"].astype(np.int64)
+    return result
+
+
+async def load_columns(
+    db: AsyncSession,
+    user_id: int,
+    start: date | None = None,
+    end: date | None = None,
+    activity_types: Iterable[str] | None = None,
+    columns: list[str] = METRIC_COLUMNS,
+) -> dict[str, np.ndarray]:
+    """
+    Selected columns of the matching activities as numpy arrays, oldest first,
+    plus "garmin_id", "activity_type" and "start_time_local" (datetime64[s]).
+    Missing metrics are NaN; text columns (e.g. "name") are object arrays.
+    """
+    selected = [getattr(Activity, name) for name in columns]
+    query = _filtered(
+        select(Activity.garmin_id, Activity.activity_type, Activity.start_time_local, *selected),
+        user_id, start, end, activity_types,
+    )
+    rows = (await db.execute(query)).all()
+    result = _columns(
+        rows,
+        ["garmin_id", "activity_type", "start_time_local", *columns],
+        [False, False, False, *(isinstance(column.type, Float) for column in selected)],
+    )
+    result["garmin_id"] = result["garmin_id"].astype(np.int64)
+    result["start_time_local"] = result["start_time_local"].astype("datetime64[s]")
+    return result
+
+
+async def load_split_columns(
+    db: AsyncSession,
+    user_id: int,
+    start: date | None = None,
+    end: date | None = None,
+    activity_types: Iterable[str] | None = None,
+    columns: list[str] = SPLIT_METRIC_COLUMNS,
+) -> dict[str, np.ndarray]:
+    """
+    Typed splits of the activities load_columns would return, as numpy arrays
+    in the same order (then by position), with the "garmin_id" of their
+    activity, "position" and "split_type".
+    """
+    selected = [getattr(ActivitySplit, name) for name in columns]
+    query = _filtered(
+        select(Activity.garmin_id, ActivitySplit.position, ActivitySplit.split_type, *selected)
+        .join(Activity, ActivitySplit.activity_id == Activity.id),
+        user_id, start, end, activity_types,
+    ).order_by(ActivitySplit.position)
+    return _split_columns((await db.execute(query)).all(), columns)
+
+
+async def import_files(db: AsyncSession, user_id: int, activities_dir: Path) -> int:
+    """
+    Stores the {id}.json activity details written by core/parse.py. Those files
+    have no typed splits. The caller commits.
+    """
+    records = []
+    for path in sorted(activities_dir.glob("*.json")):
+        with path.open() as f:
+            detail = json.load(f)
+        if "summaryDTO" not in detail:
+            print(f"Skipping {path}: not an activity detail")
+            continue
+        records.append(to_record(user_id, detail, None))
+    return await save_activities(db, user_id, records)
+
+
+async def main():
+    from database import async_session, init_db
+
+    if len(sys.argv) < 3 or sys.argv[1] != "import":
+        print("usage: activity_store.py import <user_id> [activities_dir]")
+        sys.exit(1)
+    user_id = int(sys.argv[2])
+    activities_dir = Path(sys.argv[3] if len(sys.argv) > 3 else "data/activities")
+    await init_db()
+    async with async_session() as db:
+        imported = await import_files(db, user_id, activities_dir)
+        await db.commit()
+    print(f"Imported {imported} activities for user {user_id} from {activities_dir}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
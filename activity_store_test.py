@@ -0,0 +1,121 @@
+import asyncio
+import json
+from datetime import date
+
+import numpy as np
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import activity_store
+from database import Base
+from db_models import User
+
+
+def detail(activity_id: int, day: str, type_key: str = "running", **summary) -> dict:
+    return {
+        "activityId": activity_id,
+        "activityName": f"Activity {activity_id}",
+        "activityTypeDTO": {"typeKey": type_key},
+        "summaryDTO": {
+            "startTimeLocal": f"{day}T07:30:00.0",
+            "startTimeGMT": f"{day}T06:30:00.0",
+            "distance": 10000.0,
+            "duration": 3000.0,
+            **summary,
+        },
+    }
+
+
+SPLITS = [
+    {"type": "INTERVAL_WARMUP", "distance": 2000.0, "duration": 720.0, "averageHR": 135.0},
+    {"type": "INTERVAL_ACTIVE", "distance": 1000.0, "duration": 230.0, "averageHR": 172.0, "averageRunCadence": 182.0},
+]
+
+
+async def setup(engine) -> tuple[async_sessionmaker, int]:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with factory() as db:
+        user = User(email="test@example.com", hashed_password="x")
+        db.add(user)
+        await db.commit()
+        return factory, user.id
+
+
+def test_to_record_promotes_summary_metrics():
+    record = activity_store.to_record(1, detail(7, "2030-01-07", averageHR=151.0, trainingEffect=3.2), SPLITS)
+    assert record.garmin_id == 7
+    assert record.activity_type == "running"
+    assert record.start_time_local.isoformat() == "2030-01-07T07:30:00"
+    assert (record.distance_m, record.duration_s, record.average_hr, record.training_effect) == (10000, 3000, 151, 3.2)
+    assert record.max_hr is None
+    assert [s.split_type for s in record.splits] == ["INTERVAL_WARMUP", "INTERVAL_ACTIVE"]
+    assert record.splits[1].average_run_cadence == 182
+
+
+def test_query_by_date_range_and_type():
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        factory, user_id = await setup(engine)
+        records = [
+            activity_store.to_record(user_id, detail(1, "2030-01-06", averageHR=140.0), None),
+            activity_store.to_record(user_id, detail(2, "2030-01-08", "cycling"), None),
+            activity_store.to_record(user_id, detail(3, "2030-01-09", averageHR=160.0), SPLITS),
+            activity_store.to_record(user_id, detail(4, "2030-01-14"), None),
+        ]
+        async with factory() as db:
+            stored = await activity_store.save_activities(db, user_id, records[:3])
+            await db.commit()
+        async with factory() as db:
+            # Already stored activities are skipped
+            stored += await activity_store.save_activities(
+                db, user_id, [activity_store.to_record(user_id, detail(3, "2030-01-09"), None), records[3]]
+            )
+            await db.commit()
+        async with factory() as db:
+            results = (
+                await activity_store.list_activities(db, user_id, date(2030, 1, 7), date(2030, 1, 13)),
+                await activity_store.list_activities(db, user_id, activity_types=["running"], with_splits=True),
+                await activity_store.load_columns(
+                    db, user_id, end=date(2030, 1, 9), activity_types=["running"], columns=["average_hr", "distance_m"]
+                ),
+                await activity_store.load_columns(db, user_id, start=date(2031, 1, 1)),
+            )
+        await engine.dispose()
+        return stored, results
+
+    stored, (week, runs, columns, empty) = asyncio.run(scenario())
+    assert stored == 4
+    assert [a.garmin_id for a in week] == [2, 3]
+    assert [a.garmin_id for a in runs] == [1, 3, 4]
+    assert [s.split_type for s in runs[1].splits] == ["INTERVAL_WARMUP", "INTERVAL_ACTIVE"]
+    assert runs[0].splits == []
+    assert columns["garmin_id"].tolist() == [1, 3]
+    assert columns["average_hr"].tolist() == [140, 160]
+    assert columns["start_time_local"][0] == np.datetime64("2030-01-06T07:30:00")
+    assert len(empty["garmin_id"]) == 0 and len(empty["distance_m"]) == 0
+
+
+def test_import_files(tmp_path):
+    for activity in (detail(11, "2030-02-01", averageHR=None), detail(12, "2030-02-03")):
+        (tmp_path / f"{activity['activityId']}.json").write_text(json.dumps(activity))
+    (tmp_path / "cache.json").write_text(json.dumps({"11": "summary"}))
+
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        factory, user_id = await setup(engine)
+        imported = []
+        for _ in range(2):
+            async with factory() as db:
+                imported.append(await activity_store.import_files(db, user_id, tmp_path))
+                await db.commit()
+        async with factory() as db:
+            columns = await activity_store.load_columns(db, user_id, columns=["average_hr"])
+        await engine.dispose()
+        return imported, columns
+
+    imported, columns = asyncio.run(scenario())
+    assert imported == [2, 0]
+    assert columns["garmin_id"].tolist() == [11, 12]
+    assert np.isnan(columns["average_hr"]).all()
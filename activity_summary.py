@@ -0,0 +1,181 @@
+"""
+Batch text summaries of activities for LLM context, in the format of
+core/parse.summarize_run:
+
+    07/01 | Intervals | Dist: 10.00 km | Time: 50m00s | Pace: 5:00 min/km | HR: 150 avg / 171 max | ...
+    Splits:
+    Split 0 (INTERVAL_WARMUP): 2.00 km, 6:00 min/km, HR 135 Cad: 170
+
+Takes the columns of activity_store.load_columns / load_split_columns (or
+detail_columns / split_columns for raw Garmin dicts). Every number is computed
+for all activities at once, each distinct value is formatted only once, and
+lines are assembled from those preformatted string columns.
+"""
+from collections.abc import Callable
+
+import numpy as np
+
+# Split types shown in summaries, as in summarize_run
+SHOWN_SPLIT_TYPES = ["INTERVAL_WARMUP", "INTERVAL_ACTIVE", "INTERVAL_RECOVERY", "INTERVAL_COOLDOWN"]
+
+
+def _or_zero(values: np.ndarray) -> np.ndarray:
+    return np.nan_to_num(values, nan=0.0)
+
+
+def _render(values: np.ndarray, fmt: Callable[[object], str]) -> np.ndarray:
+    """fmt(value) for each value, as an object array; each distinct value is formatted once."""
+    if len(values) == 0:
+        return np.array([], dtype=object)
+    distinct, inverse = np.unique(values, return_inverse=True)
+    return np.array([fmt(value) for value in distinct.tolist()], dtype=object)[inverse]
+
+
+def _fixed(values: np.ndarray, digits: int) -> np.ndarray:
+    """
+    values rounded to `digits` decimals, as integers in units of 10**-digits,
+    exactly as "%.{digits}f" rounds them.
+    """
+    scaled = _or_zero(values) * 10 ** digits
+    fixed = np.rint(scaled).astype(np.int64)
+    # Near a tie, scaling may have moved the value across it: let Python decide
+    ties = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for i in ties.tolist():
+        fixed[i] = int(("%.*f" % (digits, values[i])).replace(".", ""))
+    return fixed
+
+
+def _decimal(values: np.ndarray, digits: int) -> np.ndarray:
+    return _render(_fixed(values, digits), lambda v: "%d.%0*d" % (v // 10 ** digits, digits, v % 10 ** digits))
+
+
+def _rounded(values: np.ndarray) -> np.ndarray:
+    # np.rint rounds half to even like "%.0f"
+    return _render(np.rint(_or_zero(values)).astype(np.int64), str)
+
+
+def _pace(duration_s: np.ndarray, distance_m: np.ndarray) -> np.ndarray:
+    """"m:ss" per km, "0:00" where there is no distance."""
+    distance_km = _or_zero(distance_m) / 1000
+    pace = np.divide(_or_zero(duration_s), distance_km, out=np.zeros(len(distance_km)), where=distance_km > 0)
+    # Seconds are rounded after taking the minutes, so "4:60" is possible, as in summarize_run
+    minutes, seconds = (pace // 60).astype(np.int64), np.rint(pace % 60).astype(np.int64)
+    return _render(minutes * 100 + seconds, lambda v: "%d:%02d" % divmod(v, 100))
+
+
+def _join(template: str, *columns: np.ndarray) -> np.ndarray:
+    """template % row for each row of already formatted string columns."""
+    return np.array([template % row for row in zip(*(column.tolist() for column in columns))], dtype=object)
+
+
+def _when(shown: np.ndarray, text: np.ndarray) -> np.ndarray:
+    return np.where(shown, text, "")
+
+
+def _is_set(values: np.ndarray) -> np.ndarray:
+    return ~np.isnan(values)
+
+
+def _is_nonzero(values: np.ndarray) -> np.ndarray:
+    # summarize_run drops these when falsy
+    return _is_set(values) & (values != 0)
+
+
+def _text(values: np.ndarray) -> np.ndarray:
+    return np.array([value or "" for value in values], dtype=object)
+
+
+def _titles(names: np.ndarray) -> np.ndarray:
+    # As core/parse.parse_title; the default "Running" title is dropped
+    titles = _render(
+        _text(names),
+        lambda name: name.replace("Bresso", "").replace("-", "").strip(),
+    )
+    return _when((titles != "") & (titles != "Running"), " | " + titles)
+
+
+def _split_suffixes(garmin_ids: np.ndarray, splits: dict[str, np.ndarray]) -> np.ndarray:
+    """The "\\nSplits:\\n..." suffix of each activity, "" when it has fewer than two shown splits."""
+    suffixes = np.full(len(garmin_ids), "", dtype=object)
+
+    # Row of each split's activity
+    order = np.argsort(garmin_ids, kind="stable")
+    found = np.searchsorted(garmin_ids, splits["garmin_id"], sorter=order).clip(max=len(garmin_ids) - 1)
+    row = order[found]
+    shown = np.isin(splits["split_type"], SHOWN_SPLIT_TYPES) & (garmin_ids[row] == splits["garmin_id"])
+    if not shown.any():
+        return suffixes
+
+    by_activity = np.lexsort((splits["position"][shown], row[shown]))
+    split = {name: values[shown][by_activity] for name, values in splits.items()}
+    row = row[shown][by_activity]
+
+    # Index of each split within its activity
+    starts = np.flatnonzero(np.r_[True, row[1:] != row[:-1]])
+    counts = np.diff(np.r_[starts, len(row)])
+    index = np.arange(len(row)) - np.repeat(starts, counts)
+
+    lines = _join(
+        "\nSplit %s (%s): %s km, %s min/km,%s%s",
+        _render(index, str),
+        split["split_type"],
+        _decimal(split["distance_m"] / 1000, 2),
+        _pace(split["duration_s"], split["distance_m"]),
+        _when(_is_set(split["average_hr"]), " HR " + _rounded(split["average_hr"])),
+        _when(_is_set(split["average_run_cadence"]), " Cad: " + _rounded(split["average_run_cadence"])),
+    )
+    # A single shown split is the whole activity
+    several = counts > 1
+    suffixes[row[starts[several]]] = "\nSplits:" + np.add.reduceat(lines, starts)[several]
+    return suffixes
+
+
+def summarize_batch(activities: dict[str, np.ndarray], splits: dict[str, np.ndarray] | None = None) -> list[str]:
+    """
+    One summary per activity, in order. `activities` needs "start_time_local",
+    "name", "distance_m", "duration_s", "average_hr", "max_hr",
+    "elevation_gain_m", "average_run_cadence", "training_effect",
+    "aerobic_message" and "anaerobic_message". Missing metrics leave their
+    part out (summarize_run would fail on a missing heart rate).
+    """
+    if len(activities["start_time_local"]) == 0:
+        return []
+
+    dates = _render(
+        activities["start_time_local"].astype("datetime64[D]"),
+        lambda day: "%02d/%02d" % (day.day, day.month),
+    )
+    duration_s = _or_zero(activities["duration_s"])
+    # Whole minutes and truncated seconds, as in summarize_run
+    durations = _render(
+        (duration_s // 60).astype(np.int64) * 100 + (duration_s % 60).astype(np.int64),
+        lambda v: "%dm%02ds" % divmod(v, 100),
+    )
+    average_hr, max_hr = activities["average_hr"], activities["max_hr"]
+    elevation_gain, cadence = activities["elevation_gain_m"], activities["average_run_cadence"]
+    training_effect = activities["training_effect"]
+
+    summaries = _join(
+        "%s%s | Dist: %s km | Time: %s | Pace: %s min/km%s%s%s%s",
+        dates,
+        _titles(activities["name"]),
+        _decimal(activities["distance_m"] / 1000, 2),
+        durations,
+        _pace(activities["duration_s"], activities["distance_m"]),
+        # summarize_run requires both
+        _when(
+            _is_set(average_hr) & _is_set(max_hr),
+            " | HR: " + _rounded(average_hr) + " avg / " + _rounded(max_hr) + " max",
+        ),
+        _when(_is_nonzero(elevation_gain), " | Elev+: " + _rounded(elevation_gain) + " m"),
+        _when(_is_nonzero(cadence), " | Cad: " + _rounded(cadence) + " spm"),
+        _when(
+            _is_nonzero(training_effect),
+            " | TE: " + _decimal(training_effect, 1)
+            + " (" + _text(activities["aerobic_message"]) + ", " + _text(activities["anaerobic_message"]) + ")",
+        ),
+    )
+
+    if splits is not None and len(splits["garmin_id"]):
+        summaries = summaries + _split_suffixes(activities["garmin_id"], splits)
+    return summaries.tolist()
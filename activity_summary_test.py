@@ -0,0 +1,79 @@
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+
+import activity_store
+from activity_summary import summarize_batch
+
+sys.path.insert(0, str(Path(__file__).parent / "core"))
+from parse import parse_title, summarize_run  # noqa: E402
+
+
+def sample_activities(n: int, seed: int = 0) -> tuple[list[dict], list[list[dict] | None]]:
+    rng = random.Random(seed)
+    details, splits = [], []
+    for k in range(n):
+        distance = rng.choice([0.0, rng.uniform(1000, 42195)])
+        summary = {
+            "startTimeLocal": f"2030-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T07:{rng.randint(0, 59):02d}:00.0",
+            "startTimeGMT": "2030-01-01T06:00:00.0",
+            "distance": distance,
+            "duration": rng.uniform(600, 15000),
+            "averageHR": rng.uniform(110, 175),
+            "maxHR": rng.uniform(160, 195),
+        }
+        if rng.random() < 0.7:
+            summary["elevationGain"] = rng.choice([0.0, rng.uniform(1, 800)])
+        if rng.random() < 0.7:
+            summary["averageRunCadence"] = rng.uniform(150, 190)
+        if rng.random() < 0.5:
+            summary["trainingEffect"] = rng.uniform(1, 5)
+            summary["aerobicTrainingEffectMessage"] = "IMPROVING_AEROBIC_BASE_8"
+            if rng.random() < 0.5:
+                summary["anaerobicTrainingEffectMessage"] = "NO_ANAEROBIC_BENEFIT_0"
+        details.append({
+            "activityId": 1000 + k,
+            "activityName": rng.choice(["Running", "Bresso - Running", "Intervals", "Bresso Long Run", ""]),
+            "summaryDTO": summary,
+        })
+        activity_splits = None
+        if rng.random() < 0.6:
+            activity_splits = [
+                {
+                    "type": rng.choice(["INTERVAL_WARMUP", "INTERVAL_ACTIVE", "INTERVAL_RECOVERY", "RWD_RUN"]),
+                    "distance": rng.choice([0.0, rng.uniform(200, 3000)]),
+                    "duration": rng.uniform(30, 900),
+                    "averageHR": rng.uniform(110, 185),
+                    "averageRunCadence": rng.uniform(140, 195),
+                }
+                for _ in range(rng.randint(0, 6))
+            ]
+        splits.append(activity_splits)
+    return details, splits
+
+
+def test_matches_summarize_run():
+    details, splits = sample_activities(500)
+    expected = [summarize_run(d, parse_title(d["activityName"]), s) for d, s in zip(details, splits)]
+    # Splits are matched to their activity whatever their order
+    columns = activity_store.detail_columns(details)
+    split_columns = activity_store.split_columns(details, splits)
+    shuffle = np.random.default_rng(0).permutation(len(split_columns["garmin_id"]))
+    split_columns = {name: values[shuffle] for name, values in split_columns.items()}
+
+    assert summarize_batch(columns, split_columns) == expected
+    assert any("\nSplits:\n" in summary for summary in expected)
+
+
+def test_missing_metrics_are_left_out():
+    detail = {
+        "activityId": 1,
+        "activityName": "Running",
+        "summaryDTO": {"startTimeLocal": "2030-03-05T07:00:00.0", "startTimeGMT": "2030-03-05T06:00:00.0"},
+    }
+    assert summarize_batch(activity_store.detail_columns([detail])) == [
+        "05/03 | Dist: 0.00 km | Time: 0m00s | Pace: 0:00 min/km"
+    ]
+    assert summarize_batch(activity_store.detail_columns([])) == []
@@ -1,16 +1,21 @@
 import asyncio
+import hashlib
+import math
 from contextlib import asynccontextmanager
 from typing import Annotated
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
 
-from datetime import date, timedelta
+from datetime import date, datetime
 from models.inputs import UserProfileInput, UserProfile
+from models.outputs import WeeklySchedule
 from database import init_db, get_db
 from db_models.user import User
 from db_models.user_data import UserData
@@ -18,18 +23,34 @@ from auth import (
     UserCreate,
     UserResponse,
     Token,
-    hash_password,
-    verify_password,
     create_access_token,
+    create_events_token,
+    events_token_user_id,
     get_current_user,
+    login_email_rate_limiter,
+    login_rate_limiter,
+    password_hasher,
 )
-from tasks import run_verification, run_macroplanner
+from events import event_bus, format_sse
+from jobs import job_queue
+from llm_cache import llm_cache
+from llm_usage import next_month_start, usage_tracker
+from rate_limit import RateLimiter
+from weekly_templates import weekly_templates
+from verifier_rules import fast_path_report
+from schedule_repair import repair_report
+from user_cache import user_cache
+import schedule_store
+import shared
+import tasks  # noqa: F401  (registers the pipeline stage handlers)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    await job_queue.start()
     yield
+    await job_queue.stop()
 
 
 app = FastAPI(title="Garmin Training Plan API", lifespan=lifespan)
@@ -40,11 +61,42 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+def check_rate_limit(limiter: RateLimiter, *keys: str):
+    retry_after = limiter.hit(*keys)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts, try again later",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
+async def check_budget(user_id: int):
+    """Rejects requests that would start LLM work once the user's monthly budget is spent."""
+    if not await usage_tracker.admit(user_id):
+        now = datetime.utcnow()
+        retry_after = next_month_start(now.date()) - now
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Monthly LLM budget exhausted",
+            headers={"Retry-After": str(math.ceil(retry_after.total_seconds()))},
+        )
+
+
 @app.post("/register", response_model=UserResponse)
-async def register(user_data: UserCreate, db: Annotated[AsyncSession, Depends(get_db)]):
+async def register(request: Request, user_data: UserCreate, db: Annotated[AsyncSession, Depends(get_db)]):
+    check_rate_limit(login_rate_limiter, f"register:{client_ip(request)}")
+    # Hashed before the first query: the session holds a pooled connection from then on
+    hashed_password = await password_hasher.hash(user_data.password)
+
     # Check if user exists
     result = await db.execute(select(User).where(User.email == user_data.email))
     if result.scalar_one_or_none():
@@ -54,10 +106,7 @@ async def register(user_data: UserCreate, db: Annotated[AsyncSession, Depends(ge
         )
 
     # Create user
-    user = User(
-        email=user_data.email,
-        hashed_password=hash_password(user_data.password),
-    )
+    user = User(email=user_data.email, hashed_password=hashed_password)
     db.add(user)
     await db.commit()
     await db.refresh(user)
@@ -67,20 +116,29 @@ async def register(user_data: UserCreate, db: Annotated[AsyncSession, Depends(ge
 
 @app.post("/login", response_model=Token)
 async def login(
+    request: Request,
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     db: Annotated[AsyncSession, Depends(get_db)],
 ):
+    # Checked before bcrypt so a login storm is turned away cheaply
+    email_key = f"login_email:{form_data.username.lower()}"
+    check_rate_limit(login_rate_limiter, f"login_ip:{client_ip(request)}")
+    check_rate_limit(login_email_rate_limiter, email_key)
+
     result = await db.execute(select(User).where(User.email == form_data.username))
     user = result.scalar_one_or_none()
+    # Give the connection back to the pool before bcrypt runs
+    await db.close()
 
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await password_hasher.verify(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token = create_access_token(user.id)
+    login_email_rate_limiter.reset(email_key)
+    access_token = create_access_token(user.id, user.email)
     return Token(access_token=access_token, token_type="bearer")
 
 
@@ -95,6 +153,7 @@ async def create_profile(
     current_user: Annotated[User, Depends(get_current_user)],
     db: Annotated[AsyncSession, Depends(get_db)],
 ):
+    await check_budget(current_user.id)
     profile = inp_profile.to_user_profile()
     profile_data = profile.model_dump(mode="json")
 
@@ -115,9 +174,15 @@ async def create_profile(
         db.add(user_data)
 
     await db.commit()
+    event_bus.publish(current_user.id, "state", {
+        "has_profile": True,
+        "profile": profile_data,
+        "verification_status": "pending",
+        "verification_result": None,
+    })
 
-    # Start background verification task
-    asyncio.create_task(run_verification(current_user.id, profile_data))
+    # Queue background verification job
+    await job_queue.enqueue(current_user.id, "verification", {"profile_dict": profile_data})
 
     return {"message": "Profile saved", "verification_status": "pending"}
 
@@ -153,44 +218,168 @@ class UserStateResponse(BaseModel):
     macroplan_status: str | None = None
     training_overview: dict | None = None
     weekly_plan_status: str | None = None
-    weekly_schedules: list | None = None
+    # Week number -> "pending" | "completed" | "error". The weeks themselves
+    # are fetched from /user/weeks so this payload stays small as plans grow.
+    weekly_statuses: dict | None = None
 
 
 def compute_plan_start_date(first_training_date_str: str) -> str:
     """Compute the Monday of the week containing first_training_date."""
-    first_training_date = date.fromisoformat(first_training_date_str)
-    days_since_monday = first_training_date.weekday()
-    plan_start = first_training_date - timedelta(days=days_since_monday)
-    return plan_start.isoformat()
+    return schedule_store.plan_start_date(first_training_date_str).isoformat()
+
+
+# UserData column each /user/state field is read from
+STATE_FIELD_COLUMNS = {
+    "profile": "profile",
+    "plan_start_date": "profile",
+    "verification_status": "verification_status",
+    "verification_result": "verification_result",
+    "macroplan_status": "macroplan_status",
+    "training_overview": "training_overview",
+    "weekly_plan_status": "weekly_plan_status",
+    "weekly_statuses": "weekly_statuses",
+}
+
+
+def parse_state_fields(fields: str | None) -> list[str]:
+    if not fields:
+        return list(STATE_FIELD_COLUMNS)
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in STATE_FIELD_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return sorted(set(selected))
+
+
+def state_etag(user_id: int, version: int, fields: list[str]) -> str:
+    """Changes whenever UserData is written, and differs per field selection."""
+    selection = hashlib.sha1(",".join(fields).encode()).hexdigest()[:8]
+    return f'W/"{user_id}-{version}-{selection}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
 
 
 @app.get("/user/state", response_model=UserStateResponse)
 async def get_user_state(
+    request: Request,
     current_user: Annotated[User, Depends(get_current_user)],
     db: Annotated[AsyncSession, Depends(get_db)],
+    fields: str | None = None,
 ):
-    """Get complete user state for frontend routing."""
-    result = await db.execute(select(UserData).where(UserData.user_id == current_user.id))
+    """
+    Get user state for frontend routing.
+    `fields` is a comma separated subset of the UserStateResponse fields
+    (has_profile is always included). Responses carry an ETag derived from
+    UserData.version, so unchanged state is answered with 304 after a
+    single-column lookup.
+    """
+    selected = parse_state_fields(fields)
+
+    result = await db.execute(select(UserData.version).where(UserData.user_id == current_user.id))
+    version = result.scalar_one_or_none() or 0
+    etag = state_etag(current_user.id, version, selected)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # has_profile always needs the profile column
+    columns = {"profile", *(STATE_FIELD_COLUMNS[field] for field in selected)}
+    result = await db.execute(
+        select(UserData)
+        .options(load_only(*(getattr(UserData, column) for column in columns)))
+        .where(UserData.user_id == current_user.id)
+    )
     user_data = result.scalar_one_or_none()
 
     if not user_data or not user_data.profile:
-        return UserStateResponse(has_profile=False)
-
-    # Compute plan_start_date from first_training_date
-    plan_start_date = None
-    if user_data.profile and user_data.profile.get("first_training_date"):
-        plan_start_date = compute_plan_start_date(user_data.profile["first_training_date"])
-
-    return UserStateResponse(
-        has_profile=True,
-        profile=user_data.profile,
-        plan_start_date=plan_start_date,
-        verification_status=user_data.verification_status,
-        verification_result=user_data.verification_result,
-        macroplan_status=user_data.macroplan_status,
-        training_overview=user_data.training_overview,
-        weekly_plan_status=user_data.weekly_plan_status,
-        weekly_schedules=user_data.weekly_schedules,
+        state = UserStateResponse(has_profile=False)
+    else:
+        # Compute plan_start_date from first_training_date
+        plan_start_date = None
+        if "plan_start_date" in selected and user_data.profile.get("first_training_date"):
+            plan_start_date = compute_plan_start_date(user_data.profile["first_training_date"])
+
+        state = UserStateResponse(
+            has_profile=True,
+            plan_start_date=plan_start_date,
+            **{field: getattr(user_data, field) for field in selected if field != "plan_start_date"},
+        )
+
+    content = state.model_dump(include={"has_profile", *selected})
+    return JSONResponse(content, headers=headers)
+
+
+@app.get("/user/weeks", response_model=list[WeeklySchedule])
+async def get_weeks(
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    start: date | None = None,
+    end: date | None = None,
+):
+    """Generated weeks overlapping the [start, end] date range, or all of them."""
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return await schedule_store.list_weeks(db, current_user.id, start, end)
+
+
+@app.get("/user/weeks/{week_number}", response_model=WeeklySchedule)
+async def get_week(
+    week_number: int,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+):
+    schedule = await schedule_store.get_week(db, current_user.id, week_number)
+    if not schedule:
+        raise HTTPException(status_code=404, detail="Week not found")
+    return schedule
+
+
+# Comment line sent when idle so proxies keep the connection open
+EVENTS_KEEPALIVE_SECONDS = 15
+
+
+@app.post("/user/events/token", response_model=Token)
+async def user_events_token(current_user: Annotated[User, Depends(get_current_user)]):
+    """Short-lived token to open /user/events with (see auth.create_events_token)."""
+    return Token(access_token=create_events_token(current_user.id), token_type="bearer")
+
+
+@app.get("/user/events")
+async def user_events(request: Request, token: str):
+    """
+    Server-sent events stream of pipeline progress, replacing polling of /user/state.
+    "state" events carry the UserStateResponse fields that changed, "week" events
+    carry a single weekly schedule. EventSource cannot send headers, so the stream
+    is opened with a token from /user/events/token in the query string rather than
+    the access token.
+    """
+    user_id = events_token_user_id(token)
+    queue = event_bus.subscribe(user_id)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event, data)
+        finally:
+            event_bus.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
@@ -216,11 +405,14 @@ async def proceed_with_plan(
     if user_data.macroplan_status in ("pending", "completed"):
         return {"message": "Macroplan already in progress or completed"}
 
+    await check_budget(current_user.id)
+
     # Start macroplan generation
     user_data.macroplan_status = "pending"
     await db.commit()
+    event_bus.publish(current_user.id, "state", {"macroplan_status": "pending"})
 
-    asyncio.create_task(run_macroplanner(current_user.id, user_data.profile))
+    await job_queue.enqueue(current_user.id, "macroplan", {"profile_dict": user_data.profile})
 
     return {"message": "Macroplan generation started", "macroplan_status": "pending"}
 
@@ -228,3 +420,20 @@ async def proceed_with_plan(
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+
+@app.get("/metrics")
+def metrics():
+    return {
+        "llm_cache": llm_cache.stats(),
+        "weekly_templates": weekly_templates.stats(),
+        "events": event_bus.stats(),
+        "verifier_fast_path": fast_path_report(),
+        "schedule_repair": repair_report(),
+        "auth_user_cache": user_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "login_rate_limit": login_rate_limiter.stats(),
+        "login_email_rate_limit": login_email_rate_limiter.stats(),
+        "llm_router": shared.model.stats(),
+        "llm_usage": usage_tracker.stats(),
+    }
@@ -0,0 +1,306 @@
+"""
+HTTP load test of the API: users signing up (/register, /login, /profiles,
+polling /profiles/verification, /profiles/proceed on warnings, polling
+/user/state until their plan is ready) while users who already have a plan
+poll /user/state with their ETag, as the frontend does.
+
+    uv run api_loadtest.py [--signups 50] [--pollers 100] [--output results.json] [--baseline results.json]
+
+The app runs in-process (ASGI transport, with its lifespan) on a temporary
+SQLite database, with the verifier and weekly agents stubbed by a model
+answering after LOADTEST_LLM_LATENCY seconds; the macroplan uses the solver and
+weekly plans are generated without streaming.
+Prints RPS and latency percentiles per endpoint; --output saves them with the
+commit they were measured on, --baseline prints the change from a saved run.
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+from pathlib import Path
+
+DB_DIR = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{DB_DIR.name}/api_loadtest.db")
+os.environ.setdefault("LLM_CACHE_PATH", f"{DB_DIR.name}/llm_cache.db")
+os.environ["MACROPLAN_MODE"] = "solver"
+os.environ["WEEKLY_PLAN_STREAM"] = "0"
+
+import asyncio  # noqa: E402
+import json  # noqa: E402
+import random  # noqa: E402
+import time  # noqa: E402
+from collections import defaultdict  # noqa: E402
+from contextlib import ExitStack  # noqa: E402
+
+import httpx  # noqa: E402
+from pydantic_ai.messages import ModelResponse, ToolCallPart  # noqa: E402
+from pydantic_ai.models.function import AgentInfo, FunctionModel  # noqa: E402
+
+import api  # noqa: E402
+import verifier  # noqa: E402
+import weeks_builder  # noqa: E402
+
+LLM_LATENCY_SECONDS = float(os.environ.get("LOADTEST_LLM_LATENCY", 1.0))
+# The frontend polls verification every 2 s
+POLL_INTERVAL_SECONDS = float(os.environ.get("LOADTEST_POLL_INTERVAL", 2.0))
+# A signup giving up on its plan
+PLAN_TIMEOUT_SECONDS = float(os.environ.get("LOADTEST_PLAN_TIMEOUT", 300))
+PASSWORD = "load-test-password"
+
+
+def stub_output(messages, info: AgentInfo) -> dict:
+    """A valid output for the verifier (warning on injuries) and weekly agents."""
+    prompt = messages[0].parts[-1].content
+    properties = info.output_tools[0].parameters_json_schema["properties"]
+    if "outcome" in properties:
+        if "injury_history" in prompt:
+            return {
+                "message": "Build up carefully given the injury history.",
+                "outcome": "warning",
+                "proposals": [{"description": "Add a fourth easy day", "reason": "Spreads the load", "new_days_per_week": 4}],
+            }
+        return {"message": "Goal is realistic.", "outcome": "ok", "proposals": []}
+
+    week = json.loads(prompt.split("\n", 1)[1])
+    long_run, volume = week["weekly_long_run_target"], week["weekly_volume_target"]
+    other_days = [day for day in week["running_days_available"] if day != week["long_run_day"]]
+    easy = round((volume - long_run) / max(len(other_days), 1), 1)
+    return {
+        "week_number": week["week_number"],
+        "phase_name": week["phase"],
+        "weekly_volume_target": volume,
+        "weekly_long_run_target": long_run,
+        "week_overview": "Easy running around the long run.",
+        "running_sessions": [
+            *({"day": day, "run_type": "easy", "distance_km": easy, "workout_description": "Easy"} for day in other_days),
+            {"day": week["long_run_day"], "run_type": "long_run", "distance_km": long_run, "workout_description": "Long"},
+        ],
+        "strength_sessions": [],
+    }
+
+
+async def stub_model(messages, info: AgentInfo) -> ModelResponse:
+    await asyncio.sleep(LLM_LATENCY_SECONDS * random.uniform(0.5, 1.5))
+    return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, stub_output(messages, info))])
+
+
+def sample_profile(k: int) -> dict:
+    rng = random.Random(k)
+    days = sorted(rng.sample(["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"], rng.randint(3, 5)))
+    fitness = rng.choice([
+        {"level": "beginner", "general_activity_level": "lightly_active", "can_run_nonstop_30min": "yes"},
+        {"level": "intermediate", "average_weekly_distance": 35, "current_longest_run": 14},
+        {"level": "advanced", "average_weekly_distance": 70, "current_longest_run": 28},
+    ])
+    goal = rng.choice([
+        {"type": "base_building"},
+        {"type": "half_marathon", "goal_type": "finish", "race_date": "2031-04-13"},
+        {"type": "marathon", "goal_type": "finish", "race_date": "2031-05-04"},
+    ])
+    return {
+        "name": f"Runner {k}",
+        "age": rng.randint(20, 55),
+        "biological_sex": rng.choice(["male", "female"]),
+        "injury_history": "Recovered mild shin splints 6 months ago" if k % 4 == 0 else None,
+        "fitness": fitness,
+        "logistics": {"days_available": days, "long_run_day": days[-1]},
+        "goal": goal,
+        "first_training_date": "2030-11-04",
+    }
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class Recorder:
+    """Latency (ms) and error count of every request, per endpoint."""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, method: str, path: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        response = await client.request(method, path, **kwargs)
+        endpoint = f"{method} {path}"
+        self.latencies[endpoint].append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            self.errors[endpoint] += 1
+        return response
+
+    def report(self, seconds: float) -> dict:
+        return {
+            endpoint: {
+                "requests": len(values),
+                "errors": self.errors[endpoint],
+                "rps": round(len(values) / seconds, 2),
+                **{f"p{round(q * 100)}_ms": round(percentile(values, q), 1) for q in (0.5, 0.95, 0.99)},
+                "max_ms": round(max(values), 1),
+            }
+            for endpoint, values in sorted(self.latencies.items())
+        }
+
+
+async def poll_state(client: httpx.AsyncClient, recorder: Recorder, headers: dict, until) -> dict:
+    """Polls /user/state with the last ETag (fetching the weeks on changes) until `until(state)`."""
+    state, etag = {}, None
+    deadline = time.perf_counter() + PLAN_TIMEOUT_SECONDS
+    while time.perf_counter() < deadline:
+        response = await recorder.request(
+            client, "GET", "/user/state", headers={**headers, **({"If-None-Match": etag} if etag else {})},
+        )
+        if response.status_code == 200:
+            state, etag = response.json(), response.headers["ETag"]
+            if "completed" in (state.get("weekly_statuses") or {}).values():
+                await recorder.request(client, "GET", "/user/weeks", headers=headers)
+        if until(state):
+            return state
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+    return state
+
+
+async def login(client: httpx.AsyncClient, recorder: Recorder, email: str) -> dict | None:
+    """Authorization headers for the user, None if the login failed."""
+    response = await recorder.request(client, "POST", "/login", data={"username": email, "password": PASSWORD})
+    if response.status_code != 200:
+        return None
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def signup(client: httpx.AsyncClient, recorder: Recorder, k: int) -> str:
+    """A new user going from registration to their first week; returns how it ended."""
+    email = f"runner{k}@example.com"
+    await recorder.request(client, "POST", "/register", json={"email": email, "password": PASSWORD})
+    headers = await login(client, recorder, email)
+    if headers is None:
+        return "login failed"
+    response = await recorder.request(client, "POST", "/profiles", json=sample_profile(k), headers=headers)
+    if response.status_code != 200:
+        return f"profile {response.status_code}"
+
+    deadline = time.perf_counter() + PLAN_TIMEOUT_SECONDS
+    while True:
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        response = await recorder.request(client, "GET", "/profiles/verification", headers=headers)
+        if response.status_code != 200:
+            return f"verification {response.status_code}"
+        verification = response.json()
+        if verification["status"] != "pending" or time.perf_counter() > deadline:
+            break
+    outcome = (verification.get("result") or {}).get("outcome", verification["status"])
+    if outcome == "warning":
+        await recorder.request(client, "POST", "/profiles/proceed", headers=headers)
+    elif outcome != "ok":
+        return outcome
+
+    state = await poll_state(
+        client, recorder, headers, until=lambda s: s.get("weekly_plan_status") in ("completed", "error"),
+    )
+    return f"plan {state.get('weekly_plan_status') or 'timeout'}"
+
+
+async def poll(client: httpx.AsyncClient, recorder: Recorder, headers: dict, stop: asyncio.Event):
+    """A user with a plan keeping the app open."""
+    await asyncio.sleep(random.uniform(0, POLL_INTERVAL_SECONDS))
+    await poll_state(client, recorder, headers, until=lambda s: stop.is_set())
+
+
+async def run(signups: int, pollers: int) -> dict:
+    api.login_rate_limiter.enabled = False
+    api.login_email_rate_limiter.enabled = False
+    # Server errors are answered with a 500 and counted, as in production, rather than raised here
+    transport = httpx.ASGITransport(app=api.app, raise_app_exceptions=False)
+    model = FunctionModel(stub_model)
+    with ExitStack() as stack:
+        for agent in (verifier.agent, weeks_builder.agent):
+            stack.enter_context(agent.override(model=model))
+        async with api.lifespan(api.app), httpx.AsyncClient(
+            transport=transport, base_url="http://test", timeout=None,
+        ) as client:
+            # Users with a plan already, not measured
+            warmup = Recorder()
+            await asyncio.gather(*(signup(client, warmup, k) for k in range(pollers)))
+            logins = [await login(client, warmup, f"runner{k}@example.com") for k in range(pollers)]
+            poller_headers = [headers for headers in logins if headers is not None]
+
+            recorder = Recorder()
+            stop = asyncio.Event()
+            polling = [asyncio.create_task(poll(client, recorder, headers, stop)) for headers in poller_headers]
+            start = time.perf_counter()
+            outcomes = await asyncio.gather(*(signup(client, recorder, pollers + k) for k in range(signups)))
+            seconds = time.perf_counter() - start
+            stop.set()
+            await asyncio.gather(*polling)
+
+    counts = defaultdict(int)
+    for outcome in outcomes:
+        counts[outcome] += 1
+    return {
+        "commit": git_commit(),
+        "config": {
+            "signups": signups,
+            "pollers": pollers,
+            "llm_latency_s": LLM_LATENCY_SECONDS,
+            "poll_interval_s": POLL_INTERVAL_SECONDS,
+            "database": os.environ["DATABASE_URL"].split("://")[0],
+        },
+        "seconds": round(seconds, 2),
+        "signups": dict(counts),
+        "endpoints": recorder.report(seconds),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results: dict, baseline: dict | None = None):
+    config = results["config"]
+    print(
+        f"{config['signups']} signups, {config['pollers']} pollers, LLM latency {config['llm_latency_s']} s "
+        f"({results['commit']}): {results['seconds']} s, {', '.join(f'{n} {o}' for o, n in sorted(results['signups'].items()))}"
+    )
+    if baseline:
+        print(f"change from {baseline['commit']} at the end of each row")
+        if baseline["config"] != config:
+            print(f"note: the baseline ran with {baseline['config']}")
+    print(f"{'endpoint':<28}{'requests':>9}{'errors':>7}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for endpoint, stats in results["endpoints"].items():
+        line = (
+            f"{endpoint:<28}{stats['requests']:>9}{stats['errors']:>7}{stats['rps']:>8.1f}"
+            f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}"
+        )
+        before = (baseline or {}).get("endpoints", {}).get(endpoint)
+        if before:
+            line += "  " + " ".join(
+                f"{key.removesuffix('_ms')} {(stats[key] - before[key]) / before[key]:+.0%}"
+                for key in ("rps", "p50_ms", "p95_ms") if before[key]
+            )
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--signups", type=int, default=50, help="users signing up during the test")
+    parser.add_argument("--pollers", type=int, default=100, help="users with a plan polling their state")
+    parser.add_argument("--output", type=Path, help="save the results to this JSON file")
+    parser.add_argument("--baseline", type=Path, help="results JSON of a previous run to compare with")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.signups, args.pollers))
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    print_report(results, baseline)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import api
+import auth
+from api import app
+from auth import PasswordHasher, get_current_user
+from database import Base, get_db
+from events import event_bus
+from db_models import User, UserData
+from llm_usage import month_start, usage_tracker
+
+PROFILE = {"name": "Test", "first_training_date": "2030-01-09"}
+
+
+@pytest.fixture
+def client():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def setup() -> User:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with factory() as db:
+            user = User(email="test@example.com", hashed_password="x")
+            db.add(user)
+            await db.flush()
+            db.add(UserData(user_id=user.id, profile=PROFILE, verification_status="pending"))
+            await db.commit()
+            return user
+
+    user = asyncio.run(setup())
+
+    async def override_db():
+        async with factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_db
+    app.dependency_overrides[get_current_user] = lambda: user
+    # Not used as a context manager, so the lifespan (init_db, job queue) does not run
+    yield TestClient(app), factory
+    app.dependency_overrides.clear()
+    asyncio.run(engine.dispose())
+
+
+def update_user_data(factory, **fields):
+    async def update():
+        async with factory() as db:
+            user_data = (await db.execute(select(UserData))).scalar_one()
+            for name, value in fields.items():
+                setattr(user_data, name, value)
+            await db.commit()
+            return user_data.version
+
+    return asyncio.run(update())
+
+
+def test_user_state_etag(client):
+    client, factory = client
+    response = client.get("/user/state")
+    assert response.status_code == 200
+    assert response.json()["plan_start_date"] == "2030-01-07"
+    etag = response.headers["ETag"]
+
+    response = client.get("/user/state", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    assert update_user_data(factory, verification_status="completed") == 2
+    response = client.get("/user/state", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["verification_status"] == "completed"
+    assert response.headers["ETag"] != etag
+
+
+def test_user_state_fields(client):
+    client, _ = client
+    response = client.get("/user/state", params={"fields": "verification_status,macroplan_status"})
+    assert response.status_code == 200
+    assert response.json() == {"has_profile": True, "verification_status": "pending", "macroplan_status": None}
+    # A different selection is a different representation
+    assert response.headers["ETag"] != client.get("/user/state").headers["ETag"]
+
+    assert client.get("/user/state", params={"fields": "password"}).status_code == 400
+
+
+def test_proceed_over_budget(client, monkeypatch):
+    test_client, factory = client
+    update_user_data(
+        factory, verification_status="completed", verification_result={"outcome": "warning"}, macroplan_status=None
+    )
+    monkeypatch.setattr(usage_tracker, "_spent", {1: (month_start(datetime.utcnow().date()), 1000.0)})
+
+    response = test_client.post("/profiles/proceed")
+    assert response.status_code == 429
+    assert response.json()["detail"] == "Monthly LLM budget exhausted"
+    assert 0 < int(response.headers["Retry-After"]) <= 31 * 24 * 3600
+
+
+def read_events(token: str, publish=lambda: None, events: int = 0) -> tuple[int, str]:
+    """
+    GET /user/events through the ASGI interface: `publish` is called once the
+    stream is open, and the client disconnects after `events` events.
+    (httpx's ASGITransport waits for the response to end, which a stream never does.)
+    """
+    status_code, body = None, ""
+    requested = False
+    done = asyncio.Event()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status_code, body
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+        elif message["type"] == "http.response.body":
+            body += message.get("body", b"").decode()
+            if body == "retry: 3000\n\n":
+                publish()
+            if not message.get("more_body") or body.count("event: ") == events:
+                done.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/user/events", "raw_path": b"/user/events", "query_string": f"token={token}".encode(),
+        "headers": [], "server": ("test", 80), "client": ("127.0.0.1", 1), "root_path": "",
+    }
+    asyncio.run(asyncio.wait_for(app(scope, receive, send), timeout=5))
+    return status_code, body
+
+
+def test_user_events_stream(client):
+    test_client, _ = client
+    assert read_events("garbage")[0] == 401
+    # The access token does not belong in URLs and is refused
+    assert read_events(auth.create_access_token(1))[0] == 401
+
+    token = test_client.post("/user/events/token").json()["access_token"]
+
+    def publish():
+        event_bus.publish(1, "state", {"verification_status": "completed"})
+        event_bus.publish(2, "state", {"verification_status": "error"})
+        event_bus.publish(1, "session", {"week_number": 1, "session": {"day": "Sunday"}})
+
+    assert read_events(token, publish, events=2) == (200, (
+        "retry: 3000\n\n"
+        'event: state\ndata: {"verification_status": "completed"}\n\n'
+        'event: session\ndata: {"week_number": 1, "session": {"day": "Sunday"}}\n\n'
+    ))
+    # Unsubscribed once the client went away
+    assert event_bus.stats()["subscribers"] == 0
+
+
+def test_bcrypt_does_not_hold_connections(tmp_path, monkeypatch):
+    # One pooled connection, and bcrypt slow enough that requests overlap on it
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/pool.db", pool_size=1, max_overflow=0, pool_timeout=0.5)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    hash_password, verify_password = auth.hash_password, auth.verify_password
+
+    def slow(fn):
+        def run(*args):
+            time.sleep(0.2)
+            return fn(*args)
+        return run
+
+    monkeypatch.setattr(auth, "hash_password", slow(hash_password))
+    monkeypatch.setattr(auth, "verify_password", slow(verify_password))
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 4)
+    monkeypatch.setattr(api, "password_hasher", PasswordHasher(workers=4))
+    monkeypatch.setattr(api.login_rate_limiter, "enabled", False)
+
+    async def override_db():
+        async with factory() as db:
+            yield db
+
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            users = [{"email": f"user{k}@example.com", "password": "secret"} for k in range(4)]
+            registered = await asyncio.gather(*(client.post("/register", json=user) for user in users))
+            logged_in = await asyncio.gather(*(
+                client.post("/login", data={"username": user["email"], "password": user["password"]})
+                for user in users
+            ))
+        await engine.dispose()
+        return [r.status_code for r in registered], [r.status_code for r in logged_in]
+
+    app.dependency_overrides[get_db] = override_db
+    try:
+        assert asyncio.run(scenario()) == ([200] * 4, [200] * 4)
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_failed_logins_from_one_ip_do_not_lock_out_the_account(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/limits.db")
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 4)
+    monkeypatch.setattr(api, "login_rate_limiter", auth.RateLimiter(3, 60))
+    monkeypatch.setattr(api, "login_email_rate_limiter", auth.RateLimiter(30, 60))
+
+    async def override_db():
+        async with factory() as db:
+            yield db
+
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        attacker = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=("10.0.0.1", 1)), base_url="http://test")
+        victim = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=("10.0.0.2", 1)), base_url="http://test")
+        async with attacker, victim:
+            await victim.post("/register", json={"email": "victim@example.com", "password": "secret"})
+            guesses = [
+                (await attacker.post("/login", data={"username": "victim@example.com", "password": "guess"})).status_code
+                for _ in range(5)
+            ]
+            login = await victim.post("/login", data={"username": "victim@example.com", "password": "secret"})
+        await engine.dispose()
+        return guesses, login.status_code
+
+    app.dependency_overrides[get_db] = override_db
+    try:
+        assert asyncio.run(scenario()) == ([401, 401, 401, 429, 429], 200)
+    finally:
+        app.dependency_overrides.clear()
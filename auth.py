@@ -1,4 +1,6 @@
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Annotated
 
@@ -12,10 +14,31 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from database import get_db
 from db_models.user import User
+from rate_limit import RateLimiter
+from user_cache import user_cache
 
 SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "dev-secret-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
+# Lifetime of the single-purpose tokens opening the /user/events stream
+EVENTS_TOKEN_EXPIRE_SECONDS = int(os.environ.get("EVENTS_TOKEN_EXPIRE_SECONDS", 60))
+# Build the user from the token's claims alone, without the cache or the database.
+# Deleted users then stay authenticated until their token expires.
+TRUST_TOKEN_CLAIMS = os.environ.get("AUTH_TRUST_TOKEN_CLAIMS", "0") == "1"
+
+# bcrypt work factor: each increment doubles the cost of hashing and verifying
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+# Threads reserved for bcrypt, and how many calls may wait for them before new ones get a 503.
+# 0 workers runs bcrypt inline on the event loop (only useful for comparisons).
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 32))
+# Login attempts allowed per client IP within the window
+LOGIN_RATE_LIMIT = int(os.environ.get("LOGIN_RATE_LIMIT", 10))
+# Login attempts allowed per email, from all IPs: much looser, so that guessing
+# at someone's address from one IP cannot lock them out
+LOGIN_EMAIL_RATE_LIMIT = int(os.environ.get("LOGIN_EMAIL_RATE_LIMIT", 100))
+LOGIN_RATE_WINDOW_SECONDS = float(os.environ.get("LOGIN_RATE_WINDOW_SECONDS", 60))
+LOGIN_RATE_LIMIT_ENABLED = os.environ.get("LOGIN_RATE_LIMIT_ENABLED", "1") == "1"
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
@@ -39,19 +62,104 @@ class Token(BaseModel):
 
 
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
 
 
 def verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode(), hashed.encode())
 
 
-def create_access_token(user_id: int) -> str:
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated bounded thread pool so hashing does not block the
+    event loop. Calls beyond `max_pending` are rejected with a 503 instead of
+    queueing without bound.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="bcrypt") if workers > 0 else None
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def _run(self, fn, *args):
+        if self._executor is None:
+            self.completed += 1
+            return fn(*args)
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent sign-ins, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(verify_password, password, hashed)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "rounds": BCRYPT_ROUNDS,
+            "pending": self.pending,
+            # Calls waiting for a free worker
+            "queue_depth": max(0, self.pending - self.workers),
+            "peak_pending": self.peak_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher()
+login_rate_limiter = RateLimiter(LOGIN_RATE_LIMIT, LOGIN_RATE_WINDOW_SECONDS, enabled=LOGIN_RATE_LIMIT_ENABLED)
+login_email_rate_limiter = RateLimiter(
+    LOGIN_EMAIL_RATE_LIMIT, LOGIN_RATE_WINDOW_SECONDS, enabled=LOGIN_RATE_LIMIT_ENABLED
+)
+
+
+def create_access_token(user_id: int, email: str | None = None) -> str:
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     payload = {"sub": str(user_id), "exp": expire}
+    if email:
+        payload["email"] = email
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def create_events_token(user_id: int) -> str:
+    """
+    Token accepted by /user/events only. EventSource cannot send headers, so it
+    goes in the query string, where proxies and access logs may keep it: it
+    expires within a minute and every other endpoint refuses it.
+    """
+    expire = datetime.now(timezone.utc) + timedelta(seconds=EVENTS_TOKEN_EXPIRE_SECONDS)
+    return jwt.encode({"sub": str(user_id), "exp": expire, "scope": "events"}, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def events_token_user_id(token: str) -> int:
+    """The user id of a valid events token, raises a 401 otherwise."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        payload = {}
+    if payload.get("scope") != "events" or payload.get("sub") is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid events token")
+    return int(payload["sub"])
+
+
 async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
     db: Annotated[AsyncSession, Depends(get_db)],
@@ -65,15 +173,25 @@ async def get_current_user(
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("sub")
-        if user_id is None:
+        # Scoped tokens (see create_events_token) are not access tokens
+        if user_id is None or "scope" in payload:
             raise credentials_exception
     except jwt.PyJWTError:
         raise credentials_exception
 
-    result = await db.execute(select(User).where(User.id == int(user_id)))
+    user_id = int(user_id)
+    if TRUST_TOKEN_CLAIMS and payload.get("email"):
+        return User(id=user_id, email=payload["email"])
+
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalar_one_or_none()
 
     if user is None:
         raise credentials_exception
 
+    user_cache.put(user)
     return user
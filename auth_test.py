@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import auth
+from auth import PasswordHasher
+
+
+@pytest.fixture(autouse=True)
+def fast_bcrypt(monkeypatch):
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 4)
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_hash_and_verify(workers):
+    hasher = PasswordHasher(workers=workers, max_pending=4)
+
+    async def scenario():
+        hashed = await hasher.hash("secret")
+        return hashed, await hasher.verify("secret", hashed), await hasher.verify("wrong", hashed)
+
+    hashed, valid, invalid = asyncio.run(scenario())
+    assert hashed.startswith("$2b$04$")
+    assert valid and not invalid
+    assert hasher.stats()["completed"] == 3
+
+
+def test_rejects_calls_beyond_max_pending():
+    hasher = PasswordHasher(workers=1, max_pending=2)
+
+    async def scenario():
+        return await asyncio.gather(*(hasher.hash("secret") for _ in range(4)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(rejected) == 2 and rejected[0].status_code == 503
+    assert hasher.stats()["peak_pending"] == 2
+    assert hasher.stats()["pending"] == 0
+
+
+def test_events_token_only_opens_the_event_stream(monkeypatch):
+    token = auth.create_events_token(7)
+    assert auth.events_token_user_id(token) == 7
+    with pytest.raises(HTTPException) as denied:
+        asyncio.run(auth.get_current_user(token, db=None))
+    assert denied.value.status_code == 401
+
+    # Nor is an access token, or an expired events token, accepted by the stream
+    for token in (auth.create_access_token(7), "garbage"):
+        with pytest.raises(HTTPException):
+            auth.events_token_user_id(token)
+    monkeypatch.setattr(auth, "EVENTS_TOKEN_EXPIRE_SECONDS", -1)
+    with pytest.raises(HTTPException):
+        auth.events_token_user_id(auth.create_events_token(7))
@@ -0,0 +1,247 @@
+"""
+Record/replay of model requests, to run the agents without calling the LLM.
+
+In "record" mode requests go to the wrapped model and each response is stored
+in a JSON cassette with its latency, keyed by the request: the messages and
+the tool definitions, without timestamps, ids, usage or model names. In
+"replay" mode responses come from the cassette only (a request it does not
+hold raises CassetteMiss), after a synthetic latency: the recorded one, or
+LLM_CASSETTE_LATENCY seconds, times LLM_CASSETTE_LATENCY_SCALE.
+
+    LLM_CASSETTE=cassettes/pipeline.json LLM_CASSETTE_MODE=record uv run pipeline_bench.py
+
+Prompts include the user's age: profiles whose requests are recorded take
+their birth date from birth_date_for_age, so that their age, and with it the
+request key, stays the same from one day to the next.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, replace
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from pydantic_ai.messages import ModelMessage, ModelMessagesTypeAdapter, ModelRequest, ModelResponse, UserPromptPart
+from pydantic_ai.models import Model, ModelRequestParameters, StreamedResponse
+from pydantic_ai.models.wrapper import WrapperModel
+from pydantic_ai.settings import ModelSettings
+
+# Cassette file, unset to call the model directly
+CASSETTE_PATH = os.environ.get("LLM_CASSETTE")
+CASSETTE_MODE = os.environ.get("LLM_CASSETTE_MODE", "replay")
+# Replay latency in seconds, "recorded" for the latency of each recorded request
+CASSETTE_LATENCY = os.environ.get("LLM_CASSETTE_LATENCY", "recorded")
+CASSETTE_LATENCY_SCALE = float(os.environ.get("LLM_CASSETTE_LATENCY_SCALE", 1.0))
+
+# Fields of messages and parts that differ between two runs of the same request
+VOLATILE_FIELDS = {
+    "timestamp", "run_id", "usage", "model_name", "provider_name", "provider_details",
+    "provider_response_id", "finish_reason", "tool_call_id", "metadata",
+}
+
+
+class CassetteMiss(LookupError):
+    pass
+
+
+def birth_date_for_age(age: int) -> date:
+    """
+    A birth date making the user exactly `age` today. UserProfile.birth_date_from_age
+    assumes a July 1st birthday, so the age it gives changes on July 1st.
+    """
+    today = date.today()
+    try:
+        return today.replace(year=today.year - age)
+    except ValueError:  # February 29th
+        return date(today.year - age, 2, 28)
+
+
+def request_key(messages: list[ModelMessage], model_request_parameters: ModelRequestParameters) -> str:
+    def stable(data: dict) -> dict:
+        return {k: v for k, v in data.items() if k not in VOLATILE_FIELDS}
+
+    history = [
+        {**stable(message), "parts": [stable(part) for part in message["parts"]]}
+        for message in ModelMessagesTypeAdapter.dump_python(messages, mode="json")
+    ]
+    tools = [
+        [tool.name, tool.parameters_json_schema]
+        for tool in [*model_request_parameters.function_tools, *model_request_parameters.output_tools]
+    ]
+    data = [history, tools, model_request_parameters.output_mode]
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def first_prompt(messages: list[ModelMessage]) -> str:
+    """The first user prompt of the request, stored to make cassettes readable."""
+    for message in messages:
+        if isinstance(message, ModelRequest):
+            for part in message.parts:
+                if isinstance(part, UserPromptPart) and isinstance(part.content, str):
+                    return part.content
+    return ""
+
+
+class Cassette:
+    """Recorded responses in a JSON file, rewritten on every new recording."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.entries: dict[str, dict] = {}
+        if self.path.exists():
+            self.entries = json.loads(self.path.read_text())
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> tuple[ModelResponse, float] | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        response = ModelMessagesTypeAdapter.validate_python([entry["response"]])[0]
+        return response, entry["latency_s"]
+
+    def put(self, key: str, prompt: str, response: ModelResponse, latency_s: float):
+        with self._lock:
+            self.entries[key] = {
+                "prompt": prompt,
+                "latency_s": round(latency_s, 3),
+                "response": ModelMessagesTypeAdapter.dump_python([response], mode="json")[0],
+            }
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.entries, indent=1, sort_keys=True, ensure_ascii=False))
+            tmp.replace(self.path)
+
+
+@dataclass
+class ReplayedStreamedResponse(StreamedResponse):
+    """A recorded response streamed back one whole part at a time."""
+
+    response: ModelResponse
+
+    async def _get_event_iterator(self):
+        for index, part in enumerate(self.response.parts):
+            yield self._parts_manager.handle_part(vendor_part_id=index, part=part)
+        self._usage = self.response.usage
+
+    @property
+    def model_name(self) -> str:
+        return self.response.model_name or ""
+
+    @property
+    def provider_name(self) -> str | None:
+        return self.response.provider_name
+
+    @property
+    def timestamp(self) -> datetime:
+        return self.response.timestamp
+
+
+@dataclass(init=False)
+class CassetteModel(WrapperModel):
+    """Records the wrapped model's responses to a Cassette, or replays them from it."""
+
+    cassette: Cassette
+
+    def __init__(
+        self,
+        wrapped: Model,
+        cassette: Cassette,
+        mode: str = CASSETTE_MODE,
+        latency_seconds: float | None = None,
+        latency_scale: float = CASSETTE_LATENCY_SCALE,
+    ):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode {mode!r}")
+        super().__init__(wrapped)
+        self.cassette = cassette
+        self.mode = mode
+        # None: the recorded latency
+        self.latency_seconds = latency_seconds
+        self.latency_scale = latency_scale
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+
+    async def _replay(self, messages: list[ModelMessage], model_request_parameters: ModelRequestParameters) -> ModelResponse:
+        found = self.cassette.get(request_key(messages, model_request_parameters))
+        if found is None:
+            self.misses += 1
+            raise CassetteMiss(f"No recorded response for {first_prompt(messages)[:80]!r} in {self.cassette.path}")
+        response, latency_s = found
+        self.replayed += 1
+        if self.latency_seconds is not None:
+            latency_s = self.latency_seconds
+        await asyncio.sleep(latency_s * self.latency_scale)
+        return replace(response, timestamp=datetime.now(timezone.utc))
+
+    def _record(self, messages: list[ModelMessage], model_request_parameters: ModelRequestParameters,
+                response: ModelResponse, latency_s: float):
+        key = request_key(messages, model_request_parameters)
+        self.cassette.put(key, first_prompt(messages), response, latency_s)
+        self.recorded += 1
+
+    async def request(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> ModelResponse:
+        if self.mode == "replay":
+            return await self._replay(messages, model_request_parameters)
+
+        start = time.perf_counter()
+        response = await self.wrapped.request(messages, model_settings, model_request_parameters)
+        await asyncio.to_thread(
+            self._record, messages, model_request_parameters, response, time.perf_counter() - start
+        )
+        return response
+
+    @asynccontextmanager
+    async def request_stream(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+        run_context: Any = None,
+    ) -> AsyncIterator[StreamedResponse]:
+        if self.mode == "replay":
+            response = await self._replay(messages, model_request_parameters)
+            yield ReplayedStreamedResponse(model_request_parameters=model_request_parameters, response=response)
+            return
+
+        start = time.perf_counter()
+        async with self.wrapped.request_stream(
+            messages, model_settings, model_request_parameters, run_context
+        ) as streamed:
+            yield streamed
+        # The whole stream, as the agent consumed it
+        await asyncio.to_thread(
+            self._record, messages, model_request_parameters, streamed.get(), time.perf_counter() - start
+        )
+
+    def stats(self) -> dict:
+        wrapped = self.wrapped.stats() if hasattr(self.wrapped, "stats") else {}
+        return {
+            **wrapped,
+            "cassette": {
+                "mode": self.mode,
+                "path": str(self.cassette.path),
+                "recorded": self.recorded,
+                "replayed": self.replayed,
+                "misses": self.misses,
+            },
+        }
+
+
+def with_cassette(model: Model, path: str | None = CASSETTE_PATH) -> Model:
+    """`model` wrapped in a CassetteModel configured from the LLM_CASSETTE_* settings, unchanged if no path."""
+    if not path:
+        return model
+    latency = None if CASSETTE_LATENCY == "recorded" else float(CASSETTE_LATENCY)
+    return CassetteModel(model, Cassette(Path(path)), latency_seconds=latency)
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import pytest
+from pydantic import BaseModel
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, ToolCallPart
+from pydantic_ai.models.function import AgentInfo, DeltaToolCall, FunctionModel
+from pydantic_ai.usage import RequestUsage
+
+from cassette import Cassette, CassetteMiss, CassetteModel, with_cassette
+
+
+class Reply(BaseModel):
+    text: str
+
+
+def live(calls: list) -> FunctionModel:
+    """Stands in for the LLM: answers with the prompt, counting its calls."""
+    def prompt(messages) -> str:
+        return messages[0].parts[-1].content
+
+    def respond(messages, info: AgentInfo) -> ModelResponse:
+        calls.append(prompt(messages))
+        return ModelResponse(
+            parts=[ToolCallPart(info.output_tools[0].name, {"text": f"re: {prompt(messages)}"})],
+            usage=RequestUsage(input_tokens=100, output_tokens=20),
+        )
+
+    async def stream(messages, info: AgentInfo):
+        calls.append(prompt(messages))
+        yield {0: DeltaToolCall(name=info.output_tools[0].name, json_args='{"text": "re: ')}
+        yield {0: DeltaToolCall(json_args=prompt(messages) + '"}')}
+
+    return FunctionModel(respond, stream_function=stream)
+
+
+def unreachable() -> FunctionModel:
+    def respond(messages, info: AgentInfo) -> ModelResponse:
+        raise AssertionError("replay called the model")
+
+    return FunctionModel(respond)
+
+
+def ask(model, prompt: str) -> str:
+    return Agent(model, output_type=Reply, instructions="Answer.").run_sync(prompt).output.text
+
+
+def test_record_then_replay(tmp_path):
+    path = tmp_path / "cassette.json"
+    calls = []
+    recorder = CassetteModel(live(calls), Cassette(path), mode="record")
+    assert ask(recorder, "hello") == "re: hello"
+    assert ask(recorder, "hello") == "re: hello"
+    assert ask(recorder, "bye") == "re: bye"
+    assert calls == ["hello", "hello", "bye"]
+    # Equal requests share an entry: timestamps and ids are not part of the key
+    entries = json.loads(path.read_text())
+    assert sorted(entry["prompt"] for entry in entries.values()) == ["bye", "hello"]
+
+    player = CassetteModel(unreachable(), Cassette(path), mode="replay", latency_seconds=0)
+    assert ask(player, "bye") == "re: bye"
+    result = Agent(player, output_type=Reply, instructions="Answer.").run_sync("hello")
+    assert result.output.text == "re: hello"
+    assert result.usage().input_tokens == 100
+
+    # Other instructions are another request
+    with pytest.raises(CassetteMiss):
+        Agent(player, output_type=Reply, instructions="Answer briefly.").run_sync("hello")
+    assert player.stats()["cassette"] | {"path": None} == {
+        "mode": "replay", "path": None, "recorded": 0, "replayed": 2, "misses": 1,
+    }
+
+
+def test_replay_latency(tmp_path):
+    path = tmp_path / "cassette.json"
+    ask(CassetteModel(live([]), Cassette(path), mode="record"), "hello")
+    (key, entry), = json.loads(path.read_text()).items()
+    entry["latency_s"] = 0.3
+    path.write_text(json.dumps({key: entry}))
+
+    def timed(**kwargs) -> float:
+        start = time.perf_counter()
+        ask(CassetteModel(unreachable(), Cassette(path), mode="replay", **kwargs), "hello")
+        return time.perf_counter() - start
+
+    assert 0.3 <= timed() < 0.6
+    assert 0.15 <= timed(latency_scale=0.5) < 0.3
+    assert timed(latency_seconds=0.0) < 0.1
+
+
+def test_streamed_requests(tmp_path):
+    path = tmp_path / "cassette.json"
+
+    async def stream(model) -> str:
+        async with Agent(model, output_type=Reply, instructions="Answer.").run_stream("hello") as result:
+            return (await result.get_output()).text
+
+    calls = []
+    assert asyncio.run(stream(CassetteModel(live(calls), Cassette(path), mode="record"))) == "re: hello"
+    assert calls == ["hello"]
+    player = CassetteModel(unreachable(), Cassette(path), mode="replay", latency_seconds=0)
+    assert asyncio.run(stream(player)) == "re: hello"
+    # Recorded from a stream, replayed as a plain request
+    assert ask(player, "hello") == "re: hello"
+
+
+def test_disabled_without_path():
+    model = live([])
+    assert with_cassette(model, None) is model
+    with pytest.raises(ValueError):
+        CassetteModel(model, Cassette("unused.json"), mode="rewind")
@@ -32,4 +32,5 @@ def main():
     #     json.dump(tmp, f)
 
 
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import database
+
+
+def read_pragmas(url: str, pragmas: dict) -> dict:
+    async def scenario():
+        engine = create_async_engine(url)
+        database.configure_sqlite(engine, pragmas)
+        async with engine.connect() as conn:
+            values = {name: (await conn.execute(text(f"PRAGMA {name}"))).scalar() for name in pragmas}
+        await engine.dispose()
+        return values
+
+    return asyncio.run(scenario())
+
+
+def test_wal_profile_is_applied_on_connect(tmp_path):
+    values = read_pragmas(f"sqlite+aiosqlite:///{tmp_path / 'app.db'}", database.sqlite_pragmas("wal"))
+    assert values["journal_mode"] == "wal"
+    # NORMAL
+    assert values["synchronous"] == 1
+    assert values["busy_timeout"] == 5000
+
+
+def test_default_profile_sets_nothing():
+    assert database.sqlite_pragmas("default") == {}
+
+
+def test_pragmas_can_be_overridden_from_env(monkeypatch):
+    monkeypatch.setenv("SQLITE_BUSY_TIMEOUT", "100")
+    monkeypatch.setenv("SQLITE_JOURNAL_MODE", "DELETE")
+    pragmas = database.sqlite_pragmas("wal")
+    assert pragmas["busy_timeout"] == "100"
+    assert pragmas["journal_mode"] == "DELETE"
+    assert pragmas["synchronous"] == "NORMAL"
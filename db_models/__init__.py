@@ -1,4 +1,25 @@
 from db_models.user import User
 from db_models.user_data import UserData
+from db_models.job import Job
+from db_models.weekly_template import WeeklyTemplate
+from db_models.weekly_schedule import WeeklyScheduleRecord, RunningSessionRecord, StrengthSessionRecord
+from db_models.activity import Activity, ActivitySplit
+from db_models.garmin_sync_state import GarminSyncState
+from db_models.training_load import TrainingLoadDay
+from db_models.llm_usage import LLMUsage, LLMUsageMonth
 
-__all__ = ["User", "UserData"]
+__all__ = [
+    "User",
+    "UserData",
+    "Job",
+    "WeeklyTemplate",
+    "WeeklyScheduleRecord",
+    "RunningSessionRecord",
+    "StrengthSessionRecord",
+    "Activity",
+    "ActivitySplit",
+    "GarminSyncState",
+    "TrainingLoadDay",
+    "LLMUsage",
+    "LLMUsageMonth",
+]
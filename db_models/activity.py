@@ -0,0 +1,75 @@
+from datetime import datetime
+from sqlalchemy import BigInteger, DateTime, Float, ForeignKey, Index, Integer, String, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from database import Base, JSONType
+
+
+class Activity(Base):
+    """
+    A Garmin activity synced for a user. The summaryDTO metrics are stored as
+    typed columns so history can be queried and aggregated without reading the
+    raw detail; typed splits live in activity_splits.
+    """
+    __tablename__ = "activities"
+    __table_args__ = (
+        UniqueConstraint("user_id", "garmin_id"),
+        Index("ix_activities_user_start", "user_id", "start_time_local"),
+        Index("ix_activities_user_type_start", "user_id", "activity_type", "start_time_local"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    garmin_id: Mapped[int] = mapped_column(BigInteger)
+
+    # Garmin activityType.typeKey, e.g. "running", "trail_running", "cycling"
+    activity_type: Mapped[str] = mapped_column(String(50))
+    name: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    start_time_local: Mapped[datetime] = mapped_column(DateTime)
+    start_time_gmt: Mapped[datetime] = mapped_column(DateTime)
+
+    # summaryDTO metrics, see activity_store.SUMMARY_FIELDS
+    distance_m: Mapped[float | None] = mapped_column(Float, nullable=True)
+    duration_s: Mapped[float | None] = mapped_column(Float, nullable=True)
+    moving_duration_s: Mapped[float | None] = mapped_column(Float, nullable=True)
+    elevation_gain_m: Mapped[float | None] = mapped_column(Float, nullable=True)
+    elevation_loss_m: Mapped[float | None] = mapped_column(Float, nullable=True)
+    average_speed: Mapped[float | None] = mapped_column(Float, nullable=True)
+    average_hr: Mapped[float | None] = mapped_column(Float, nullable=True)
+    max_hr: Mapped[float | None] = mapped_column(Float, nullable=True)
+    average_run_cadence: Mapped[float | None] = mapped_column(Float, nullable=True)
+    calories: Mapped[float | None] = mapped_column(Float, nullable=True)
+    training_effect: Mapped[float | None] = mapped_column(Float, nullable=True)
+    anaerobic_training_effect: Mapped[float | None] = mapped_column(Float, nullable=True)
+    training_load: Mapped[float | None] = mapped_column(Float, nullable=True)
+    aerobic_message: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    anaerobic_message: Mapped[str | None] = mapped_column(String(100), nullable=True)
+
+    # /activity-service/activity/{id} as returned by Garmin, for fields not promoted to columns
+    detail: Mapped[dict] = mapped_column(JSONType)
+
+    synced_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    # Not loaded unless asked for (activity_store.list_activities(with_splits=True))
+    splits: Mapped[list["ActivitySplit"]] = relationship(
+        cascade="all, delete-orphan", order_by="ActivitySplit.position", lazy="raise"
+    )
+
+
+class ActivitySplit(Base):
+    """One entry of an activity's /typedsplits, e.g. a warmup or an interval."""
+    __tablename__ = "activity_splits"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    activity_id: Mapped[int] = mapped_column(ForeignKey("activities.id", ondelete="CASCADE"), index=True)
+    position: Mapped[int] = mapped_column(Integer)
+
+    # e.g. "INTERVAL_WARMUP", "INTERVAL_ACTIVE", "INTERVAL_RECOVERY", "RWD_RUN"
+    split_type: Mapped[str] = mapped_column(String(50))
+    distance_m: Mapped[float | None] = mapped_column(Float, nullable=True)
+    duration_s: Mapped[float | None] = mapped_column(Float, nullable=True)
+    moving_duration_s: Mapped[float | None] = mapped_column(Float, nullable=True)
+    elevation_gain_m: Mapped[float | None] = mapped_column(Float, nullable=True)
+    average_speed: Mapped[float | None] = mapped_column(Float, nullable=True)
+    average_hr: Mapped[float | None] = mapped_column(Float, nullable=True)
+    max_hr: Mapped[float | None] = mapped_column(Float, nullable=True)
+    average_run_cadence: Mapped[float | None] = mapped_column(Float, nullable=True)
@@ -0,0 +1,15 @@
+from datetime import datetime
+from sqlalchemy import DateTime, ForeignKey, Integer, Text
+from sqlalchemy.orm import Mapped, mapped_column
+from database import Base
+
+
+class GarminSyncState(Base):
+    __tablename__ = "garmin_sync_state"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    # Start time (GMT) of the newest activity up to which everything is synced
+    high_water_mark: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_synced_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    activities_synced: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
@@ -0,0 +1,27 @@
+from datetime import datetime
+from sqlalchemy import DateTime, ForeignKey, Integer, JSON, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+from database import Base
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+
+    # Pipeline stage: "verification" | "macroplan" | "weekly"
+    stage: Mapped[str] = mapped_column(String(20), index=True)
+    # Keyword arguments passed to the stage handler
+    payload: Mapped[dict] = mapped_column(JSON)
+
+    # Job state: "queued" | "running" | "completed" | "failed" | "cancelled"
+    status: Mapped[str] = mapped_column(String(20), default="queued", index=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, default=3)
+    # Earliest time the job may run (pushed forward on retry backoff)
+    run_after: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
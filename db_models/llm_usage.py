@@ -0,0 +1,45 @@
+from datetime import date, datetime
+from sqlalchemy import Date, DateTime, Float, ForeignKey, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+from database import Base
+
+
+class LLMUsage(Base):
+    """One agent run: the model requests it made, their tokens, cost and wall time."""
+    __tablename__ = "llm_usage"
+    __table_args__ = (
+        Index("ix_llm_usage_user_created", "user_id", "created_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+
+    # Pipeline stage ("verification" | "macroplan" | "weekly") and agent name (see llm_cache.CachedAgent)
+    stage: Mapped[str] = mapped_column(String(20))
+    agent: Mapped[str] = mapped_column(String(50))
+    # Model that answered (the backend behind the router)
+    model: Mapped[str] = mapped_column(String(100))
+
+    requests: Mapped[int] = mapped_column(Integer, default=0)
+    input_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    output_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    cost_usd: Mapped[float] = mapped_column(Float, default=0)
+    duration_s: Mapped[float] = mapped_column(Float, default=0)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class LLMUsageMonth(Base):
+    """Per-month totals of a user's llm_usage rows, updated with every run."""
+    __tablename__ = "llm_usage_months"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    # First day of the (UTC) month
+    month: Mapped[date] = mapped_column(Date, primary_key=True)
+
+    runs: Mapped[int] = mapped_column(Integer, default=0)
+    requests: Mapped[int] = mapped_column(Integer, default=0)
+    input_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    output_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    cost_usd: Mapped[float] = mapped_column(Float, default=0)
+    duration_s: Mapped[float] = mapped_column(Float, default=0)
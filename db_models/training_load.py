@@ -0,0 +1,23 @@
+from datetime import date
+from sqlalchemy import Date, Float, ForeignKey, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+from database import Base
+
+
+class TrainingLoadDay(Base):
+    """Per-day totals of a user's synced activities, kept up to date as activities are stored."""
+    __tablename__ = "training_load_days"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    # Local date of the activities' start
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+
+    # Running activities only (see training_load.RUNNING_TYPES)
+    run_count: Mapped[int] = mapped_column(Integer, default=0)
+    run_distance_km: Mapped[float] = mapped_column(Float, default=0)
+    run_duration_s: Mapped[float] = mapped_column(Float, default=0)
+    longest_run_km: Mapped[float] = mapped_column(Float, default=0)
+
+    # All activities
+    activity_count: Mapped[int] = mapped_column(Integer, default=0)
+    load: Mapped[float] = mapped_column(Float, default=0)
@@ -1,6 +1,6 @@
-from sqlalchemy import ForeignKey, JSON, String
+from sqlalchemy import ForeignKey, Integer, String, event
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from database import Base
+from database import Base, JSONType
 
 
 class UserData(Base):
@@ -9,22 +9,32 @@ class UserData(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), unique=True)
 
-    profile: Mapped[dict | None] = mapped_column(JSON, nullable=True)
-    training_overview: Mapped[dict | None] = mapped_column(JSON, nullable=True)
-    weekly_schedules: Mapped[list | None] = mapped_column(JSON, nullable=True)
+    profile: Mapped[dict | None] = mapped_column(JSONType, nullable=True)
+    training_overview: Mapped[dict | None] = mapped_column(JSONType, nullable=True)
 
     # Verification state: "pending" | "completed" | "error" | None
     verification_status: Mapped[str | None] = mapped_column(String(20), nullable=True)
-    verification_result: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    verification_result: Mapped[dict | None] = mapped_column(JSONType, nullable=True)
 
     # Macroplanner state: "pending" | "completed" | "error" | None
     macroplan_status: Mapped[str | None] = mapped_column(String(20), nullable=True)
 
     # Weekly plan state: "pending" | "completed" | "error" | None
     weekly_plan_status: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    # Per-week state keyed by week number: {"1": "completed", "2": "pending", ...}
+    # The weeks themselves are stored in the weekly_schedules table
+    weekly_statuses: Mapped[dict | None] = mapped_column(JSONType, nullable=True)
+
+    # Incremented on every update, used as the ETag of /user/state (NULL on rows predating it)
+    version: Mapped[int | None] = mapped_column(Integer, default=1, nullable=True)
 
     user: Mapped["User"] = relationship(back_populates="data")
 
 
+@event.listens_for(UserData, "before_update")
+def bump_version(mapper, connection, target: UserData):
+    target.version = (target.version or 0) + 1
+
+
 # Avoid circular import
 from db_models.user import User  # noqa: E402
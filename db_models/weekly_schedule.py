@@ -0,0 +1,59 @@
+from datetime import date, datetime
+from sqlalchemy import Date, DateTime, Float, ForeignKey, Integer, JSON, String, Text, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from database import Base
+
+
+class WeeklyScheduleRecord(Base):
+    """One generated week of a user's plan; its sessions live in their own tables."""
+    __tablename__ = "weekly_schedules"
+    # Also serves as the (user_id, week_number) lookup index
+    __table_args__ = (UniqueConstraint("user_id", "week_number"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    week_number: Mapped[int] = mapped_column(Integer)
+    # Monday of the week, used for date range queries
+    start_date: Mapped[date | None] = mapped_column(Date, nullable=True, index=True)
+
+    phase_name: Mapped[str] = mapped_column(String(20))
+    weekly_volume_target: Mapped[float] = mapped_column(Float)
+    weekly_long_run_target: Mapped[float] = mapped_column(Float)
+    week_overview: Mapped[str] = mapped_column(Text)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    running_sessions: Mapped[list["RunningSessionRecord"]] = relationship(
+        cascade="all, delete-orphan", order_by="RunningSessionRecord.position", lazy="selectin"
+    )
+    strength_sessions: Mapped[list["StrengthSessionRecord"]] = relationship(
+        cascade="all, delete-orphan", order_by="StrengthSessionRecord.position", lazy="selectin"
+    )
+
+
+class RunningSessionRecord(Base):
+    __tablename__ = "running_sessions"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    week_id: Mapped[int] = mapped_column(ForeignKey("weekly_schedules.id", ondelete="CASCADE"), index=True)
+    # Order of the session within its week
+    position: Mapped[int] = mapped_column(Integer)
+
+    day: Mapped[str] = mapped_column(String(10))
+    run_type: Mapped[str] = mapped_column(String(20))
+    distance_km: Mapped[float] = mapped_column(Float)
+    workout_description: Mapped[str] = mapped_column(Text)
+    notes: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+
+class StrengthSessionRecord(Base):
+    __tablename__ = "strength_sessions"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    week_id: Mapped[int] = mapped_column(ForeignKey("weekly_schedules.id", ondelete="CASCADE"), index=True)
+    position: Mapped[int] = mapped_column(Integer)
+
+    day: Mapped[str] = mapped_column(String(10))
+    duration_minutes: Mapped[int] = mapped_column(Integer)
+    # List of Exercise dicts, always read and written with the session
+    exercises: Mapped[list] = mapped_column(JSON)
@@ -0,0 +1,16 @@
+from datetime import datetime
+from sqlalchemy import DateTime, Integer, JSON, String
+from sqlalchemy.orm import Mapped, mapped_column
+from database import Base
+
+
+class WeeklyTemplate(Base):
+    __tablename__ = "weekly_templates"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    # Normalized (phase, recovery, fitness level, running days, long run day, strength) tuple
+    key: Mapped[str] = mapped_column(String(255), index=True)
+    total_volume_km: Mapped[int] = mapped_column(Integer)
+    long_run_km: Mapped[int] = mapped_column(Integer)
+    schedule: Mapped[dict] = mapped_column(JSON)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,51 @@
+import asyncio
+import json
+from collections import defaultdict
+
+# Per-subscriber buffer; a client that falls this far behind loses its oldest events
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class EventBus:
+    """
+    In-process pub/sub of pipeline progress, keyed by user id.
+    Background tasks publish stage transitions and the SSE endpoint forwards
+    them to connected clients. Events only reach subscribers of this process.
+    """
+
+    def __init__(self):
+        self._subscribers: dict[int, set[asyncio.Queue]] = defaultdict(set)
+        self.published = 0
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(user_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[user_id]
+
+    def publish(self, user_id: int, event: str, data: dict):
+        self.published += 1
+        for queue in self._subscribers.get(user_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait((event, data))
+
+    def stats(self) -> dict:
+        return {
+            "published": self.published,
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+        }
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+event_bus = EventBus()
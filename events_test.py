@@ -0,0 +1,39 @@
+import asyncio
+
+import events
+from events import EventBus, format_sse
+
+
+def drain(queue: asyncio.Queue) -> list:
+    return [queue.get_nowait() for _ in range(queue.qsize())]
+
+
+def test_publish_reaches_the_users_subscribers():
+    bus = EventBus()
+    first, second, other = bus.subscribe(1), bus.subscribe(1), bus.subscribe(2)
+    bus.publish(1, "state", {"verification_status": "completed"})
+    bus.publish(3, "state", {"verification_status": "completed"})  # Nobody listening
+
+    assert drain(first) == drain(second) == [("state", {"verification_status": "completed"})]
+    assert drain(other) == []
+    assert bus.stats() == {"published": 2, "subscribers": 3}
+
+    bus.unsubscribe(1, first)
+    bus.unsubscribe(1, second)
+    bus.unsubscribe(1, second)  # Already gone
+    bus.publish(1, "state", {})
+    assert drain(first) == []
+    assert bus.stats()["subscribers"] == 1
+
+
+def test_slow_subscriber_loses_oldest_events(monkeypatch):
+    monkeypatch.setattr(events, "SUBSCRIBER_QUEUE_SIZE", 3)
+    bus = EventBus()
+    queue = bus.subscribe(1)
+    for n in range(5):
+        bus.publish(1, "week", {"week_number": n})
+    assert [data["week_number"] for _, data in drain(queue)] == [2, 3, 4]
+
+
+def test_format_sse():
+    assert format_sse("week", {"week_number": 1}) == 'event: week\ndata: {"week_number": 1}\n\n'
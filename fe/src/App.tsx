@@ -151,13 +151,28 @@ function MainContent() {
           />
         );
 
-      case 'weekly-plan-pending':
+      case 'weekly-plan-pending': {
+        const previews = userState?.session_previews?.['1'] ?? [];
         return (
           <PendingView
             title="Building Your First Week"
             message="Creating detailed workouts for your first week of training..."
-          />
+          >
+            {previews.length > 0 && (
+              <ul className="mt-6 space-y-2 text-left">
+                {previews.map((session, index) => (
+                  <li key={index} className="p-3 bg-neutral-800 rounded-lg">
+                    <p className="text-neutral-100 text-sm font-medium">
+                      {session.day} · {session.run_type.replace('_', ' ')} · {session.distance_km} km
+                    </p>
+                    <p className="text-neutral-400 text-xs mt-1">{session.workout_description}</p>
+                  </li>
+                ))}
+              </ul>
+            )}
+          </PendingView>
         );
+      }
 
       case 'calendar':
         if (!userState?.weekly_schedules?.length || !userState?.plan_start_date) return null;
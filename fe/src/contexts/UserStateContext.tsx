@@ -1,4 +1,4 @@
-import { createContext, useContext, useState, useEffect, useCallback, type ReactNode } from 'react';
+import { createContext, useContext, useState, useEffect, useCallback, useRef, type ReactNode } from 'react';
 import { useAuth } from './AuthContext';
 import type { UserState } from '../types';
 
@@ -19,25 +19,48 @@ export function UserStateProvider({ children }: { children: ReactNode }) {
     const [userState, setUserState] = useState<UserState | null>(null);
     const [isLoading, setIsLoading] = useState(true);
     const [error, setError] = useState<string | null>(null);
+    // ETag of the last /user/state response, so unchanged state comes back as an empty 304
+    const stateEtag = useRef<string | null>(null);
 
     const fetchUserState = useCallback(async () => {
         if (!token) {
+            stateEtag.current = null;
             setUserState(null);
             setIsLoading(false);
             return;
         }
 
         try {
-            const response = await fetch(`${API_URL}/user/state`, {
-                headers: { Authorization: `Bearer ${token}` },
-            });
+            const headers: Record<string, string> = { Authorization: `Bearer ${token}` };
+            if (stateEtag.current) {
+                headers['If-None-Match'] = stateEtag.current;
+            }
+            const response = await fetch(`${API_URL}/user/state`, { headers, cache: 'no-store' });
 
+            if (response.status === 304) {
+                setError(null);
+                return;
+            }
             if (!response.ok) {
                 throw new Error('Failed to fetch user state');
             }
 
-            const data = await response.json();
+            const data: UserState = await response.json();
+
+            // Weeks are not part of the state payload, fetch them once some exist
+            const hasWeeks = Object.values(data.weekly_statuses ?? {}).some(status => status === 'completed');
+            if (hasWeeks) {
+                const weeksResponse = await fetch(`${API_URL}/user/weeks`, {
+                    headers: { Authorization: `Bearer ${token}` },
+                });
+                if (!weeksResponse.ok) {
+                    throw new Error('Failed to fetch weekly schedules');
+                }
+                data.weekly_schedules = await weeksResponse.json();
+            }
+
             setUserState(data);
+            stateEtag.current = response.headers.get('ETag');
             setError(null);
         } catch (err) {
             setError(err instanceof Error ? err.message : 'Unknown error');
@@ -78,20 +101,90 @@ export function UserStateProvider({ children }: { children: ReactNode }) {
         }
     }, [user, fetchUserState]);
 
-    // Polling for pending states
+    // Live updates for pending states, pushed by the server as the pipeline progresses
+    const hasPending = !!userState && (
+        userState.verification_status === 'pending' ||
+        userState.macroplan_status === 'pending' ||
+        userState.weekly_plan_status === 'pending'
+    );
+
     useEffect(() => {
-        if (!userState) return;
+        if (!token || !hasPending) return;
+
+        let source: EventSource | null = null;
+        let reconnect: ReturnType<typeof setTimeout> | undefined;
+        let closed = false;
+
+        const listen = (events: EventSource) => {
+            // Catch up on anything that changed before the stream was (re)connected
+            events.onopen = () => {
+                fetchUserState();
+            };
+
+            // Reconnecting with an expired token fails for good, start over with a new one
+            events.onerror = () => {
+                if (events.readyState === EventSource.CLOSED && !closed) {
+                    reconnect = setTimeout(connect, 3000);
+                }
+            };
+
+            events.addEventListener('state', (e) => {
+                const patch = JSON.parse((e as MessageEvent).data) as Partial<UserState>;
+                setUserState(prev => (prev ? { ...prev, ...patch } : prev));
+            });
 
-        const shouldPoll =
-            userState.verification_status === 'pending' ||
-            userState.macroplan_status === 'pending' ||
-            userState.weekly_plan_status === 'pending';
+            events.addEventListener('week', (e) => {
+                const { week_number, status, schedule } = JSON.parse((e as MessageEvent).data);
+                setUserState(prev => {
+                    if (!prev) return prev;
+                    const schedules = (prev.weekly_schedules ?? []).filter(w => w.week_number !== week_number);
+                    return {
+                        ...prev,
+                        weekly_schedules: [...schedules, schedule].sort((a, b) => a.week_number - b.week_number),
+                        weekly_statuses: { ...(prev.weekly_statuses ?? {}), [String(week_number)]: status },
+                    };
+                });
+            });
 
-        if (!shouldPoll) return;
+            events.addEventListener('session', (e) => {
+                const { week_number, session } = JSON.parse((e as MessageEvent).data);
+                setUserState(prev => {
+                    if (!prev) return prev;
+                    const previews = prev.session_previews ?? {};
+                    const key = String(week_number);
+                    return {
+                        ...prev,
+                        session_previews: { ...previews, [key]: [...(previews[key] ?? []), session] },
+                    };
+                });
+            });
+        };
 
-        const interval = setInterval(fetchUserState, 2000);
-        return () => clearInterval(interval);
-    }, [userState, fetchUserState]);
+        // The stream is opened with a short-lived events token rather than the access token,
+        // which would end up in URLs; a new one is fetched whenever EventSource gives up
+        const connect = async () => {
+            const response = await fetch(`${API_URL}/user/events/token`, {
+                method: 'POST',
+                headers: { Authorization: `Bearer ${token}` },
+            }).catch(() => null);
+            if (closed) return;
+            if (!response?.ok) {
+                reconnect = setTimeout(connect, 3000);
+                return;
+            }
+            const { access_token: eventsToken } = await response.json();
+            if (closed) return;
+            source = new EventSource(`${API_URL}/user/events?token=${encodeURIComponent(eventsToken)}`);
+            listen(source);
+        };
+
+        connect();
+        return () => {
+            closed = true;
+            clearTimeout(reconnect);
+            source?.close();
+        };
+    }, [token, hasPending, fetchUserState]);
 
     return (
         <UserStateContext.Provider value={{
@@ -176,7 +176,11 @@ export interface UserState {
     macroplan_status?: "pending" | "completed" | "error" | null;
     training_overview?: TrainingStrategy;
     weekly_plan_status?: "pending" | "completed" | "error" | null;
+    weekly_statuses?: Record<string, "pending" | "completed" | "error"> | null; // keyed by week number
+    // Loaded separately from /user/weeks, then kept current by "week" events
     weekly_schedules?: WeeklySchedule[];
+    // Client-side only: running sessions streamed while a week is still being generated
+    session_previews?: Record<string, RunningSession[]>;
 }
 
 // Calendar and session feedback types
@@ -0,0 +1,205 @@
+"""
+Incremental Garmin Connect activity sync.
+
+Lists a user's activities newest first down to their high-water mark, fetches
+the detail and typed splits of each new activity concurrently (bounded, with
+retries) and stores them through activity_store. The high-water mark only
+moves past activities that were stored, so a failed fetch is retried on the
+next sync.
+
+    uv run garmin_sync.py <user_id>
+"""
+import asyncio
+import os
+import sys
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+import httpx
+
+import activity_store
+from activity_store import parse_time
+from database import async_session, init_db
+from db_models.garmin_sync_state import GarminSyncState
+
+GARMIN_API_URL = os.environ.get("GARMIN_API_URL", "https://connectapi.garmin.com")
+GARTH_SESSION_PATH = os.environ.get("GARTH_SESSION_PATH", "./garth")
+# Concurrent requests to Garmin per sync
+SYNC_CONCURRENCY = int(os.environ.get("GARMIN_SYNC_CONCURRENCY", 4))
+SYNC_MAX_RETRIES = int(os.environ.get("GARMIN_SYNC_MAX_RETRIES", 3))
+SYNC_BACKOFF_BASE_SECONDS = float(os.environ.get("GARMIN_SYNC_BACKOFF_BASE_SECONDS", 1.0))
+SYNC_PAGE_SIZE = int(os.environ.get("GARMIN_SYNC_PAGE_SIZE", 50))
+# How far back the first sync of a user goes
+INITIAL_SYNC_DAYS = int(os.environ.get("GARMIN_INITIAL_SYNC_DAYS", 365))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+USER_AGENT = "GCM-iOS-5.7.2.1"
+
+stats = Counter()
+
+
+class GarminClient:
+    """
+    Async client for the Garmin Connect API. `token` returns a current OAuth2
+    access token (see garth_token). At most `concurrency` requests are in flight;
+    transport errors and 429/5xx responses are retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        token: Callable[[], str],
+        base_url: str = GARMIN_API_URL,
+        concurrency: int = SYNC_CONCURRENCY,
+        max_retries: int = SYNC_MAX_RETRIES,
+        backoff_base_seconds: float = SYNC_BACKOFF_BASE_SECONDS,
+    ):
+        self.token = token
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._http = httpx.AsyncClient(base_url=base_url, timeout=30, headers={"User-Agent": USER_AGENT})
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._http.aclose()
+
+    async def get(self, path: str, **params):
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    stats["requests"] += 1
+                    response = await self._http.get(
+                        path, params=params, headers={"Authorization": f"Bearer {self.token()}"}
+                    )
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response.json()
+                error = httpx.HTTPStatusError(
+                    f"{response.status_code} from {path}", request=response.request, response=response
+                )
+            except httpx.TransportError as e:
+                error = e
+            if attempt == self.max_retries:
+                raise error
+            stats["retries"] += 1
+            await asyncio.sleep(self.backoff_base_seconds * 2 ** attempt)
+
+    async def list_activities(self, start: int, limit: int) -> list[dict]:
+        return await self.get("/activitylist-service/activities/search/activities", start=start, limit=limit)
+
+    async def activity(self, activity_id: int) -> dict:
+        return await self.get(f"/activity-service/activity/{activity_id}")
+
+    async def typed_splits(self, activity_id: int) -> list[dict] | None:
+        try:
+            return (await self.get(f"/activity-service/activity/{activity_id}/typedsplits"))["splits"]
+        except httpx.HTTPStatusError as e:
+            # Activities without laps (e.g. strength) have no typed splits
+            if e.response.status_code == 404:
+                return None
+            raise
+
+
+def garth_token(session_path: str = GARTH_SESSION_PATH) -> Callable[[], str]:
+    """Access tokens from a saved garth session (see core/new.py login), refreshed when expired."""
+    import garth
+
+    garth.resume(session_path)
+
+    def token() -> str:
+        if garth.client.oauth2_token.expired:
+            garth.client.refresh_oauth2()
+        return garth.client.oauth2_token.access_token
+
+    return token
+
+
+@dataclass
+class SyncResult:
+    user_id: int
+    listed: int = 0
+    stored: int = 0
+    failed: dict[int, str] = field(default_factory=dict)
+    high_water_mark: datetime | None = None
+
+
+async def list_new_activities(client: GarminClient, since: datetime) -> list[dict]:
+    """Activity summaries that started after `since`, oldest first."""
+    new = []
+    start = 0
+    while True:
+        page = await client.list_activities(start, SYNC_PAGE_SIZE)
+        for summary in page:
+            if parse_time(summary["startTimeGMT"]) <= since:
+                return new[::-1]
+            new.append(summary)
+        if len(page) < SYNC_PAGE_SIZE:
+            return new[::-1]
+        start += len(page)
+
+
+async def fetch_activity(client: GarminClient, summary: dict) -> tuple[dict, list[dict] | None]:
+    activity_id = summary["activityId"]
+    return await asyncio.gather(client.activity(activity_id), client.typed_splits(activity_id))
+
+
+async def sync_user(user_id: int, client: GarminClient, session_factory=async_session) -> SyncResult:
+    """Fetches and stores the user's activities newer than their high-water mark."""
+    result = SyncResult(user_id=user_id)
+    async with session_factory() as db:
+        state = await db.get(GarminSyncState, user_id)
+        since = state.high_water_mark if state and state.high_water_mark else None
+    if since is None:
+        since = datetime.utcnow() - timedelta(days=INITIAL_SYNC_DAYS)
+    result.high_water_mark = since
+
+    # Network work happens before any session is opened
+    summaries = await list_new_activities(client, since)
+    result.listed = len(summaries)
+    fetched = await asyncio.gather(*(fetch_activity(client, s) for s in summaries), return_exceptions=True)
+
+    async with session_factory() as db:
+        records = []
+        for summary, outcome in zip(summaries, fetched):
+            if isinstance(outcome, Exception):
+                result.failed[summary["activityId"]] = str(outcome)
+                continue
+            detail, splits = outcome
+            records.append(activity_store.to_record(user_id, detail, splits))
+            # Everything up to the first failure is complete
+            if not result.failed:
+                result.high_water_mark = parse_time(summary["startTimeGMT"])
+        result.stored = await activity_store.save_activities(db, user_id, records)
+
+        state = await db.get(GarminSyncState, user_id)
+        if state is None:
+            state = GarminSyncState(user_id=user_id, activities_synced=0)
+            db.add(state)
+        state.high_water_mark = result.high_water_mark
+        state.last_synced_at = datetime.utcnow()
+        state.activities_synced = (state.activities_synced or 0) + result.stored
+        state.last_error = next(iter(result.failed.values()), None)
+        await db.commit()
+
+    stats["activities_synced"] += result.stored
+    stats["activities_failed"] += len(result.failed)
+    return result
+
+
+async def main():
+    user_id = int(sys.argv[1])
+    await init_db()
+    async with GarminClient(garth_token()) as client:
+        result = await sync_user(user_id, client)
+    print(
+        f"User {user_id}: {result.listed} new, {result.stored} stored, {len(result.failed)} failed, "
+        f"synced up to {result.high_water_mark}"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
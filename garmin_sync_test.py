@@ -0,0 +1,219 @@
+import asyncio
+import json
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import garmin_sync
+from database import Base
+from db_models import Activity, GarminSyncState, User
+from garmin_sync import GarminClient, sync_user
+
+
+class FakeGarmin:
+    """In-memory Garmin Connect API served over HTTP on a local port."""
+
+    def __init__(self):
+        self.activities: list[dict] = []  # newest first, like the real list endpoint
+        self.failures = Counter()  # path -> number of 500s to return before succeeding
+        self.requests = Counter()  # path -> requests served
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def add_activity(self, activity_id: int, start: datetime, type_key: str = "running"):
+        self.activities.insert(0, {
+            "activityId": activity_id,
+            "activityName": f"Run {activity_id}",
+            "activityType": {"typeKey": type_key},
+            "startTimeLocal": (start + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S"),
+            "startTimeGMT": start.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+
+    def detail(self, activity_id: int) -> dict:
+        summary = next(a for a in self.activities if a["activityId"] == activity_id)
+        return {
+            "activityId": activity_id,
+            "activityName": summary["activityName"],
+            "activityTypeDTO": summary["activityType"],
+            "summaryDTO": {
+                "startTimeLocal": summary["startTimeLocal"].replace(" ", "T") + ".0",
+                "startTimeGMT": summary["startTimeGMT"].replace(" ", "T") + ".0",
+                "distance": 10000.0,
+                "duration": 3000.0,
+                "averageHR": 150.0,
+            },
+        }
+
+    def respond(self, path: str, query: dict) -> tuple[int, object]:
+        self.requests[path] += 1
+        if self.failures[path] > 0:
+            self.failures[path] -= 1
+            return 500, {"message": "try again"}
+        if path == "/activitylist-service/activities/search/activities":
+            start, limit = int(query["start"][0]), int(query["limit"][0])
+            return 200, self.activities[start:start + limit]
+        parts = path.strip("/").split("/")
+        ids = {a["activityId"] for a in self.activities}
+        if parts[:2] == ["activity-service", "activity"] and int(parts[2]) in ids:
+            activity_id = int(parts[2])
+            if len(parts) == 4 and parts[3] == "typedsplits":
+                return 200, {"splits": [{"type": "INTERVAL_ACTIVE", "distance": 1000, "duration": 300}]}
+            return 200, self.detail(activity_id)
+        return 404, {"message": "not found"}
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                status, body = fake.respond(url.path, parse_qs(url.query))
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def garmin(monkeypatch):
+    monkeypatch.setattr(garmin_sync, "SYNC_PAGE_SIZE", 2)
+    fake = FakeGarmin()
+    yield fake
+    fake.server.shutdown()
+
+
+def run_sync(garmin: FakeGarmin, factory, user_id: int):
+    async def scenario():
+        async with GarminClient(lambda: "token", base_url=garmin.url, backoff_base_seconds=0) as client:
+            return await sync_user(user_id, client, session_factory=factory)
+
+    return asyncio.run(scenario())
+
+
+@pytest.fixture
+def database():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def setup() -> int:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with factory() as db:
+            user = User(email="runner@example.com", hashed_password="x")
+            db.add(user)
+            await db.commit()
+            return user.id
+
+    user_id = asyncio.run(setup())
+    yield factory, user_id
+    asyncio.run(engine.dispose())
+
+
+def stored(factory, user_id: int) -> tuple[list[Activity], GarminSyncState]:
+    async def load():
+        async with factory() as db:
+            activities = (await db.execute(
+                select(Activity)
+                .where(Activity.user_id == user_id)
+                .options(selectinload(Activity.splits))
+                .order_by(Activity.start_time_gmt)
+            )).scalars().all()
+            return activities, await db.get(GarminSyncState, user_id)
+
+    return asyncio.run(load())
+
+
+def test_sync_fetches_only_new_activities(garmin, database):
+    factory, user_id = database
+    now = datetime.utcnow().replace(microsecond=0)
+    for i in range(5):
+        garmin.add_activity(100 + i, now - timedelta(days=5 - i))
+
+    result = run_sync(garmin, factory, user_id)
+    assert (result.listed, result.stored, result.failed) == (5, 5, {})
+    activities, state = stored(factory, user_id)
+    assert [a.garmin_id for a in activities] == [100, 101, 102, 103, 104]
+    assert (activities[0].distance_m, activities[0].average_hr) == (10000, 150)
+    assert activities[0].splits[0].split_type == "INTERVAL_ACTIVE"
+    assert state.high_water_mark == now - timedelta(days=1)
+
+    garmin.add_activity(105, now)
+    garmin.requests.clear()
+    result = run_sync(garmin, factory, user_id)
+    assert (result.listed, result.stored) == (1, 1)
+    # Only the newest page is listed, and only the new activity is fetched
+    assert garmin.requests["/activitylist-service/activities/search/activities"] == 1
+    assert garmin.requests["/activity-service/activity/104"] == 0
+    assert stored(factory, user_id)[1].activities_synced == 6
+
+
+def test_transient_errors_are_retried(garmin, database):
+    factory, user_id = database
+    garmin.add_activity(200, datetime.utcnow() - timedelta(days=1))
+    garmin.failures["/activity-service/activity/200"] = 2
+
+    result = run_sync(garmin, factory, user_id)
+    assert result.stored == 1
+    assert garmin.requests["/activity-service/activity/200"] == 3
+
+
+def test_failed_activity_holds_back_high_water_mark(garmin, database, monkeypatch):
+    factory, user_id = database
+    now = datetime.utcnow().replace(microsecond=0)
+    for i in range(3):
+        garmin.add_activity(300 + i, now - timedelta(days=3 - i))
+    garmin.failures["/activity-service/activity/301"] = 10
+
+    result = run_sync(garmin, factory, user_id)
+    assert result.stored == 2 and list(result.failed) == [301]
+    activities, state = stored(factory, user_id)
+    assert [a.garmin_id for a in activities] == [300, 302]
+    assert state.high_water_mark == now - timedelta(days=3)
+    assert state.last_error
+
+    # The next sync picks up the failed activity without duplicating the others
+    garmin.failures.clear()
+    result = run_sync(garmin, factory, user_id)
+    assert (result.listed, result.stored, result.failed) == (2, 1, {})
+    activities, state = stored(factory, user_id)
+    assert [a.garmin_id for a in activities] == [300, 301, 302]
+    assert state.high_water_mark == now - timedelta(days=1)
+    assert state.last_error is None
+
+
+def test_activities_without_splits(garmin, database):
+    factory, user_id = database
+    garmin.add_activity(400, datetime.utcnow() - timedelta(days=1), type_key="strength_training")
+    original = garmin.respond
+
+    def no_splits(path, query):
+        if path.endswith("/typedsplits"):
+            garmin.requests[path] += 1
+            return 404, {"message": "not found"}
+        return original(path, query)
+
+    garmin.respond = no_splits
+    result = run_sync(garmin, factory, user_id)
+    assert result.stored == 1
+    activities, _ = stored(factory, user_id)
+    assert activities[0].splits == []
+    assert activities[0].activity_type == "strength_training"
@@ -0,0 +1,311 @@
+import asyncio
+import os
+from collections.abc import Awaitable, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from database import async_session
+from db_models.job import Job
+from db_models.user_data import UserData
+from llm_usage import UsageTracker, next_month_start, usage_scope, usage_tracker
+
+JOB_STAGES = ("verification", "macroplan", "weekly")
+
+# Number of concurrent workers per stage, e.g. JOB_CONCURRENCY_WEEKLY=4
+DEFAULT_CONCURRENCY = int(os.environ.get("JOB_CONCURRENCY", 2))
+MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+BACKOFF_BASE_SECONDS = float(os.environ.get("JOB_BACKOFF_BASE_SECONDS", 2.0))
+BACKOFF_MAX_SECONDS = float(os.environ.get("JOB_BACKOFF_MAX_SECONDS", 60.0))
+# A running job's lease: its worker refreshes Job.updated_at every third of it,
+# and only jobs not refreshed for this long are taken over by another process
+LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", 60.0))
+
+
+def stage_concurrency(stage: str) -> int:
+    return int(os.environ.get(f"JOB_CONCURRENCY_{stage.upper()}", DEFAULT_CONCURRENCY))
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Exponential backoff: base, 2*base, 4*base, ... capped at BACKOFF_MAX_SECONDS."""
+    return min(BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_SECONDS)
+
+
+@dataclass
+class StageHandler:
+    run: Callable[..., Awaitable[None]]
+    # Called once with (user_id, error message) when a job exhausts its retries
+    on_failure: Callable[[int, str], Awaitable[None]]
+
+
+class JobQueue:
+    """
+    Persisted job queue with a bounded worker pool per pipeline stage.
+    Jobs are written to the `jobs` table before being handed to the in-memory
+    queue, so a restart can pick up anything that did not complete.
+    """
+
+    def __init__(self, session_factory=async_session, usage: UsageTracker = usage_tracker):
+        self.session_factory = session_factory
+        # Jobs of users over their monthly LLM budget are deferred to the next month
+        self.usage = usage
+        self._handlers: dict[str, StageHandler] = {}
+        self._queues: dict[str, asyncio.Queue[int]] = {}
+        self._workers: list[asyncio.Task] = []
+        self._delayed: set[asyncio.Task] = set()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._queues)
+
+    def register(self, stage: str, run: Callable[..., Awaitable[None]], on_failure: Callable[[int, str], Awaitable[None]]):
+        if stage not in JOB_STAGES:
+            raise ValueError(f"Unknown job stage: {stage}")
+        self._handlers[stage] = StageHandler(run=run, on_failure=on_failure)
+
+    async def enqueue(self, user_id: int, stage: str, payload: dict) -> int:
+        """
+        Persist a job and schedule it. Older queued jobs for the same user and
+        stage are cancelled, since their payload is now stale.
+        """
+        async with self.session_factory() as db:
+            await db.execute(
+                update(Job)
+                .where(Job.user_id == user_id, Job.stage == stage, Job.status == "queued")
+                .values(status="cancelled")
+            )
+            job = Job(user_id=user_id, stage=stage, payload=payload, max_attempts=MAX_ATTEMPTS)
+            db.add(job)
+            await db.commit()
+            job_id = job.id
+
+        if self.running:
+            self._queues[stage].put_nowait(job_id)
+        return job_id
+
+    async def start(self):
+        """Recover unfinished work and spawn the workers, and the task reclaiming expired leases."""
+        self._queues = {stage: asyncio.Queue() for stage in JOB_STAGES}
+        await self.recover()
+        for stage in JOB_STAGES:
+            for _ in range(stage_concurrency(stage)):
+                self._workers.append(asyncio.create_task(self._worker(stage)))
+        self._workers.append(asyncio.create_task(self._sweep()))
+
+    async def stop(self):
+        for task in [*self._workers, *self._delayed]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._delayed, return_exceptions=True)
+        self._workers = []
+        self._delayed = set()
+        self._queues = {}
+
+    async def drain(self):
+        """Wait until every queue is empty and no retry is waiting on its backoff."""
+        while True:
+            for queue in self._queues.values():
+                await queue.join()
+            if self._delayed:
+                await asyncio.gather(*self._delayed, return_exceptions=True)
+                continue
+            if all(queue.empty() for queue in self._queues.values()):
+                return
+
+    async def recover(self):
+        """
+        Re-schedule work lost by a restart:
+        1. Jobs left "running" by a crashed process, i.e. whose lease expired,
+           go back to "queued". Jobs other processes are running are left alone.
+        2. Every "queued" job is put back on its stage queue.
+        3. UserData rows stuck on "pending" without a queued or running job get a new one.
+        """
+        await self._reclaim()
+        async with self.session_factory() as db:
+            result = await db.execute(select(Job).where(Job.status.in_(("queued", "running"))).order_by(Job.id))
+            jobs = result.scalars().all()
+            active = {(job.user_id, job.stage) for job in jobs}
+            for job in jobs:
+                if job.status == "queued":
+                    self._schedule(job.id, job.stage, job.run_after)
+
+            result = await db.execute(select(UserData))
+            stale = []
+            for user_data in result.scalars().all():
+                if not user_data.profile:
+                    continue
+                if user_data.verification_status == "pending":
+                    stale.append((user_data.user_id, "verification", {"profile_dict": user_data.profile}))
+                elif user_data.macroplan_status == "pending":
+                    stale.append((user_data.user_id, "macroplan", {"profile_dict": user_data.profile}))
+                elif user_data.weekly_plan_status == "pending" and user_data.training_overview:
+                    stale.append((
+                        user_data.user_id,
+                        "weekly",
+                        {"profile_dict": user_data.profile, "strategy_dict": user_data.training_overview},
+                    ))
+
+        for user_id, stage, payload in stale:
+            if (user_id, stage) not in active:
+                print(f"Recovering stale {stage} job for user {user_id}")
+                await self.enqueue(user_id, stage, payload)
+
+    async def _reclaim(self) -> list[Job]:
+        """Puts running jobs whose lease expired back to "queued", and returns them."""
+        expired = datetime.utcnow() - timedelta(seconds=LEASE_SECONDS)
+        reclaimed = []
+        async with self.session_factory() as db:
+            result = await db.execute(select(Job).where(Job.status == "running", Job.updated_at < expired))
+            for job in result.scalars().all():
+                # Conditional, as another process may be reclaiming the same job
+                claimed = await db.execute(
+                    update(Job)
+                    .where(Job.id == job.id, Job.status == "running", Job.updated_at < expired)
+                    .values(status="queued")
+                )
+                if claimed.rowcount == 1:
+                    reclaimed.append(job)
+            await db.commit()
+        return reclaimed
+
+    async def _sweep(self):
+        """Reclaims the jobs of processes that died while this one keeps running."""
+        while True:
+            await asyncio.sleep(LEASE_SECONDS)
+            try:
+                for job in await self._reclaim():
+                    print(f"Reclaiming {job.stage} job {job.id} for user {job.user_id}: its lease expired")
+                    self._schedule(job.id, job.stage)
+            except Exception as e:
+                print(f"Lease sweep error: {e}")
+
+    def _schedule(self, job_id: int, stage: str, run_after: datetime | None = None):
+        delay = (run_after - datetime.utcnow()).total_seconds() if run_after else 0
+        if delay <= 0:
+            self._queues[stage].put_nowait(job_id)
+            return
+
+        async def put_later():
+            await asyncio.sleep(delay)
+            self._queues[stage].put_nowait(job_id)
+
+        task = asyncio.create_task(put_later())
+        self._delayed.add(task)
+        task.add_done_callback(self._delayed.discard)
+
+    async def _worker(self, stage: str):
+        queue = self._queues[stage]
+        while True:
+            job_id = await queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                print(f"Job worker error for job {job_id}: {e}")
+            finally:
+                queue.task_done()
+
+    async def _run(self, job_id: int):
+        async with self.session_factory() as db:
+            # Claim atomically, so a job queued in several processes sharing a database runs once
+            claimed = await db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == "queued")
+                .values(status="running", attempts=Job.attempts + 1, updated_at=datetime.utcnow())
+            )
+            await db.commit()
+            if claimed.rowcount != 1:
+                return
+            job = await db.get(Job, job_id)
+            user_id, stage, payload, attempts, max_attempts = (
+                job.user_id, job.stage, job.payload, job.attempts, job.max_attempts
+            )
+
+        # Checked once per job: handlers making many agent calls (the weekly planner) check again between them
+        if not await self.usage.admit(user_id):
+            await self._defer(job_id, next_month_start(datetime.utcnow().date()))
+            print(f"{stage} job {job_id} for user {user_id} deferred: monthly LLM budget exhausted")
+            return
+
+        handler = self._handlers[stage]
+        try:
+            async with self._lease(job_id):
+                with usage_scope(user_id, stage):
+                    await handler.run(user_id, **payload)
+        except asyncio.CancelledError:
+            # Stopped mid-job (e.g. a redeploy): hand it back rather than leave it running until its lease expires
+            await self._release(job_id)
+            raise
+        except Exception as e:
+            print(f"{stage} job {job_id} for user {user_id} failed (attempt {attempts}/{max_attempts}): {e}")
+            retry = attempts < max_attempts
+            async with self.session_factory() as db:
+                job = await db.get(Job, job_id)
+                job.last_error = str(e)
+                if retry:
+                    job.status = "queued"
+                    job.run_after = datetime.utcnow() + timedelta(seconds=backoff_seconds(attempts))
+                else:
+                    job.status = "failed"
+                await db.commit()
+                run_after = job.run_after
+
+            if retry:
+                self._schedule(job_id, stage, run_after)
+            else:
+                await handler.on_failure(user_id, str(e))
+            return
+
+        async with self.session_factory() as db:
+            job = await db.get(Job, job_id)
+            job.status = "completed"
+            await db.commit()
+
+    @asynccontextmanager
+    async def _lease(self, job_id: int):
+        """Keep the claimed job's lease alive while the block runs."""
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(LEASE_SECONDS / 3)
+                try:
+                    async with self.session_factory() as db:
+                        await db.execute(
+                            update(Job)
+                            .where(Job.id == job_id, Job.status == "running")
+                            .values(updated_at=datetime.utcnow())
+                        )
+                        await db.commit()
+                except Exception as e:
+                    print(f"Lease heartbeat error for job {job_id}: {e}")
+
+        task = asyncio.create_task(heartbeat())
+        try:
+            yield
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _release(self, job_id: int):
+        """Put a claimed job back in the queue right away, without using up an attempt."""
+        async with self.session_factory() as db:
+            await db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == "running")
+                .values(status="queued", attempts=Job.attempts - 1)
+            )
+            await db.commit()
+
+    async def _defer(self, job_id: int, run_after: datetime):
+        """Put a claimed job back in the queue until run_after, without using up an attempt."""
+        async with self.session_factory() as db:
+            job = await db.get(Job, job_id)
+            job.status = "queued"
+            job.attempts -= 1
+            job.run_after = run_after
+            job.last_error = "Monthly LLM budget exhausted"
+            await db.commit()
+            stage = job.stage
+        self._schedule(job_id, stage, run_after)
+
+
+job_queue = JobQueue()
@@ -0,0 +1,422 @@
+import asyncio
+import json
+import os
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import pytest
+from pydantic_ai.messages import ModelResponse, ToolCallPart
+from pydantic_ai.usage import RequestUsage
+from pydantic_ai.models.function import AgentInfo, DeltaToolCall, FunctionModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import jobs
+import models as m
+import schedule_store
+import tasks
+import weeks_builder
+from database import Base
+from events import event_bus
+from db_models import Job, User, UserData
+from jobs import JobQueue, job_queue
+from llm_cache import llm_cache
+from macroplanner import TrainingStrategy
+from llm_usage import UsageTracker, usage_scope, usage_tracker
+from schedule_repair import schedule_violations
+from weekly_templates import weekly_templates
+
+PROFILE = m.UserProfile(
+    name="Test",
+    birth_date=m.UserProfile.birth_date_from_age(30),
+    biological_sex="female",
+    fitness=m.IntermediateFitness(level="intermediate", average_weekly_distance=30, current_longest_run=12),
+    logistics=m.Logistics(days_available=[m.DayOfWeek.TUE, m.DayOfWeek.THU, m.DayOfWeek.SUN], long_run_day=m.DayOfWeek.SUN),
+    goal=m.GeneralGoal(type="base_building"),
+    first_training_date="2025-12-01",
+).model_dump(mode="json")
+
+STRATEGY = {
+    "plan_overview": "Build an aerobic base.",
+    "target_peak_volume_km": 40,
+    "target_longest_run_km": 16,
+    "phases": [
+        {"phase_name": "Base", "duration_weeks": 10, "key_focus": "Easy volume"},
+        {"phase_name": "Build", "duration_weeks": 2, "key_focus": "Some tempo"},
+    ],
+}
+
+SCHEDULE = {
+    "week_number": 1,
+    "phase_name": "Base",
+    "weekly_volume_target": 30,
+    "weekly_long_run_target": 12,
+    "week_overview": "Easy week.",
+    "running_sessions": [
+        {"day": "Tuesday", "run_type": "easy", "distance_km": 9, "workout_description": "Easy"},
+        {"day": "Thursday", "run_type": "easy", "distance_km": 9, "workout_description": "Easy"},
+        {"day": "Sunday", "run_type": "long_run", "distance_km": 12, "workout_description": "Long"},
+    ],
+    "strength_sessions": [],
+}
+
+
+def returns(output: dict) -> FunctionModel:
+    def respond(messages, info: AgentInfo) -> ModelResponse:
+        return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, output)])
+
+    return FunctionModel(respond)
+
+
+def fails() -> FunctionModel:
+    def respond(messages, info: AgentInfo) -> ModelResponse:
+        raise RuntimeError("provider unavailable")
+
+    return FunctionModel(respond)
+
+
+def streams(output: dict, interrupt_first: bool = False) -> FunctionModel:
+    """Streams `output` one running session at a time; the first stream breaks off after two if asked."""
+    calls = []
+
+    async def stream(messages, info: AgentInfo):
+        calls.append(messages)
+        head = json.dumps({k: v for k, v in output.items() if k != "running_sessions"})
+        yield {0: DeltaToolCall(name=info.output_tools[0].name, json_args=head[:-1] + ', "running_sessions": [')}
+        for index, session in enumerate(output["running_sessions"]):
+            await asyncio.sleep(0.15)  # Longer than stream_output's debounce
+            if interrupt_first and len(calls) == 1 and index == 2:
+                raise RuntimeError("connection reset")
+            yield {0: DeltaToolCall(json_args=(", " if index else "") + json.dumps(session))}
+        yield {0: DeltaToolCall(json_args="]}")}
+
+    return FunctionModel(stream_function=stream)
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    monkeypatch.setattr(tasks, "async_session", factory)
+    monkeypatch.setattr(job_queue, "session_factory", factory)
+    monkeypatch.setattr(jobs, "BACKOFF_BASE_SECONDS", 0.0)
+    monkeypatch.setattr(llm_cache, "enabled", False)
+    monkeypatch.setattr(tasks, "MACROPLAN_MODE", "agent")
+    monkeypatch.setattr(weekly_templates, "session_factory", factory)
+    monkeypatch.setattr(usage_tracker, "session_factory", factory)
+    monkeypatch.setattr(usage_tracker, "_spent", {})
+    yield factory
+    asyncio.run(engine.dispose())
+
+
+async def create_user(factory, **user_data_fields) -> int:
+    async with factory() as db:
+        conn = await db.connection()
+        await conn.run_sync(Base.metadata.create_all)
+        user = User(email="test@example.com", hashed_password="x")
+        db.add(user)
+        await db.flush()
+        db.add(UserData(user_id=user.id, profile=PROFILE, **user_data_fields))
+        await db.commit()
+        return user.id
+
+
+async def get_user_data(factory, user_id: int) -> UserData:
+    async with factory() as db:
+        result = await db.execute(select(UserData).where(UserData.user_id == user_id))
+        return result.scalar_one()
+
+
+def test_pipeline_runs_every_stage(session_factory):
+    async def scenario():
+        user_id = await create_user(session_factory, verification_status="pending")
+        with tasks.macroplanner_agent.override(model=returns(STRATEGY)), weeks_builder.agent.override(model=returns(SCHEDULE)):
+            await job_queue.enqueue(user_id, "verification", {"profile_dict": PROFILE})
+            await job_queue.start()
+            await job_queue.drain()
+            await job_queue.stop()
+        async with session_factory() as db:
+            week = await schedule_store.get_week(db, user_id, 1)
+        return await get_user_data(session_factory, user_id), week
+
+    user_data, week = asyncio.run(scenario())
+    assert user_data.verification_status == "completed"
+    assert user_data.macroplan_status == "completed"
+    assert user_data.weekly_plan_status == "completed"
+    assert user_data.weekly_statuses == {"1": "completed"}
+    assert week.week_number == 1
+
+
+def test_failing_stage_retries_then_marks_error(session_factory):
+    async def scenario():
+        user_id = await create_user(session_factory, macroplan_status="pending")
+        with tasks.macroplanner_agent.override(model=fails()):
+            # Persisted before the workers start, so recovery does not add a second job
+            await job_queue.enqueue(user_id, "macroplan", {"profile_dict": PROFILE})
+            await job_queue.start()
+            await job_queue.drain()
+            await job_queue.stop()
+        async with session_factory() as db:
+            job = (await db.execute(select(Job))).scalar_one()
+        return job, await get_user_data(session_factory, user_id)
+
+    job, user_data = asyncio.run(scenario())
+    assert job.status == "failed"
+    assert job.attempts == jobs.MAX_ATTEMPTS
+    assert user_data.macroplan_status == "error"
+
+
+def test_start_recovers_stale_pending_rows(session_factory):
+    async def scenario():
+        # Simulates a restart: the row is pending but no job was ever persisted
+        user_id = await create_user(
+            session_factory,
+            macroplan_status="completed",
+            training_overview=STRATEGY,
+            weekly_plan_status="pending",
+        )
+        with weeks_builder.agent.override(model=returns(SCHEDULE)):
+            await job_queue.start()
+            await job_queue.drain()
+            await job_queue.stop()
+        return await get_user_data(session_factory, user_id)
+
+    user_data = asyncio.run(scenario())
+    assert user_data.weekly_plan_status == "completed"
+
+
+def test_recovery_leaves_jobs_of_live_processes_alone(session_factory, monkeypatch):
+    monkeypatch.setattr(jobs, "LEASE_SECONDS", 0.3)
+    runs = []
+
+    async def handle(user_id: int, profile_dict: dict):
+        runs.append(user_id)
+        if len(runs) == 1:
+            await asyncio.Event().wait()  # Until its process goes away
+
+    async def fail(user_id: int, error: str):
+        pass
+
+    def process() -> JobQueue:
+        queue = JobQueue(session_factory=session_factory, usage=UsageTracker(session_factory=session_factory))
+        queue.register("macroplan", handle, on_failure=fail)
+        return queue
+
+    async def jobs_by_status() -> list[tuple[str, int]]:
+        async with session_factory() as db:
+            return [(job.status, job.attempts) for job in (await db.execute(select(Job).order_by(Job.id))).scalars()]
+
+    async def scenario():
+        user_id = await create_user(session_factory, macroplan_status="pending")
+        first, second = process(), process()
+        await first.enqueue(user_id, "macroplan", {"profile_dict": PROFILE})
+        await first.start()
+        await asyncio.sleep(0.6)  # Well past the lease, which the heartbeat keeps refreshing
+
+        # Another process starting up leaves the running job (and its pending row) to the first
+        await second.start()
+        await second.drain()
+        assert await jobs_by_status() == [("running", 1)]
+
+        # The first process dies mid-job, without a chance to hand the job back:
+        # once its lease expires the second takes it over, without restarting
+        async def crash(job_id: int):
+            pass
+
+        first._release = crash
+        await first.stop()
+        await asyncio.sleep(0.8)  # Lease expiry, then the second's next sweep
+        await second.drain()
+        await second.stop()
+        return user_id, await jobs_by_status()
+
+    user_id, statuses = asyncio.run(scenario())
+    assert runs == [user_id, user_id]
+    assert statuses == [("completed", 2)]
+
+
+def test_streamed_weekly_plan_is_repaired_and_previews_reset_on_retry(session_factory, monkeypatch):
+    monkeypatch.setattr(tasks, "WEEKLY_PLAN_STREAM", True)
+    # Long run on Thursday: the schedule_repair step moves it to Sunday before saving
+    draft = {**SCHEDULE, "running_sessions": [
+        {"day": "Tuesday", "run_type": "easy", "distance_km": 9, "workout_description": "Easy"},
+        {"day": "Thursday", "run_type": "long_run", "distance_km": 12, "workout_description": "Long"},
+        {"day": "Sunday", "run_type": "easy", "distance_km": 9, "workout_description": "Easy"},
+    ]}
+
+    async def scenario():
+        user_id = await create_user(
+            session_factory, macroplan_status="completed", training_overview=STRATEGY, weekly_plan_status="pending",
+        )
+        events = event_bus.subscribe(user_id)
+        with weeks_builder.stream_agent.override(model=streams(draft, interrupt_first=True)):
+            await job_queue.enqueue(user_id, "weekly", {"profile_dict": PROFILE, "strategy_dict": STRATEGY})
+            await job_queue.start()
+            await job_queue.drain()
+            await job_queue.stop()
+        event_bus.unsubscribe(user_id, events)
+        async with session_factory() as db:
+            week = await schedule_store.get_week(db, user_id, 1)
+        return [events.get_nowait() for _ in range(events.qsize())], week, await get_user_data(session_factory, user_id)
+
+    events, week, user_data = asyncio.run(scenario())
+    sessions = [(event, data) for event, data in events if event == "session" or "session_previews" in data]
+    streamed = [
+        ("session", {"week_number": 1, "session": m.RunningSession.model_validate(session).model_dump(mode="json")})
+        for session in draft["running_sessions"]
+    ]
+    reset = ("state", {"session_previews": {}})
+    # The first attempt broke off after its first session was complete; the retry sends each session once, in order
+    assert sessions == [reset, streamed[0], reset, *streamed]
+
+    profile = m.UserProfile.model_validate(PROFILE)
+    target = weeks_builder.calculate_weekly_progression(profile, TrainingStrategy.model_validate(STRATEGY))[0]
+    assert schedule_violations(week, profile, target) == []
+    assert [(s.day, s.run_type) for s in week.running_sessions if s.run_type == "long_run"] == [(m.DayOfWeek.SUN, "long_run")]
+    assert events[-1] == ("state", {"weekly_plan_status": "completed", "weekly_statuses": {"1": "completed"}})
+    assert user_data.weekly_plan_status == "completed"
+
+
+def test_failed_week_does_not_stop_the_others(session_factory, monkeypatch):
+    monkeypatch.setattr(tasks, "WEEKLY_PLAN_WEEKS", "4")
+    monkeypatch.setattr(tasks, "WEEKLY_PLAN_CONCURRENCY", 2)
+    in_flight, peak = 0, 0
+
+    async def respond(messages, info: AgentInfo) -> ModelResponse:
+        nonlocal in_flight, peak
+        week_number = json.loads(messages[0].parts[-1].content.split("\n", 1)[1])["week_number"]
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        if week_number == 2:
+            raise RuntimeError("provider unavailable")
+        return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, {**SCHEDULE, "week_number": week_number})])
+
+    async def scenario():
+        user_id = await create_user(
+            session_factory, macroplan_status="completed", training_overview=STRATEGY, weekly_plan_status="pending",
+        )
+        with weeks_builder.agent.override(model=FunctionModel(respond)), pytest.raises(RuntimeError, match="week 2"):
+            await tasks.run_weekly_planner(user_id, PROFILE, STRATEGY)
+        async with session_factory() as db:
+            saved = await schedule_store.week_numbers(db, user_id)
+        return saved, await get_user_data(session_factory, user_id)
+
+    saved, user_data = asyncio.run(scenario())
+    assert sorted(saved) == [1, 3, 4]
+    assert user_data.weekly_statuses == {"1": "completed", "2": "error", "3": "completed", "4": "completed"}
+    assert user_data.weekly_plan_status == "pending"
+    assert peak == 2
+
+
+def test_weekly_planner_stops_at_the_budget(session_factory, monkeypatch):
+    monkeypatch.setattr(tasks, "WEEKLY_PLAN_WEEKS", "3")
+    monkeypatch.setattr(tasks, "WEEKLY_PLAN_CONCURRENCY", 1)
+    # Each week costs 0.0008 USD: the budget allows a second week to start, not a third
+    monkeypatch.setattr(usage_tracker, "monthly_budget_usd", 0.001)
+
+    def respond(messages, info: AgentInfo) -> ModelResponse:
+        week_number = json.loads(messages[0].parts[-1].content.split("\n", 1)[1])["week_number"]
+        return ModelResponse(
+            parts=[ToolCallPart(info.output_tools[0].name, {**SCHEDULE, "week_number": week_number})],
+            usage=RequestUsage(input_tokens=1000, output_tokens=200),
+        )
+
+    async def scenario():
+        user_id = await create_user(
+            session_factory, macroplan_status="completed", training_overview=STRATEGY, weekly_plan_status="pending",
+        )
+        with weeks_builder.agent.override(model=FunctionModel(respond)), usage_scope(user_id, "weekly"):
+            with pytest.raises(RuntimeError, match="budget exhausted"):
+                await tasks.run_weekly_planner(user_id, PROFILE, STRATEGY)
+        async with session_factory() as db:
+            saved = await schedule_store.week_numbers(db, user_id)
+        return saved, await get_user_data(session_factory, user_id)
+
+    saved, user_data = asyncio.run(scenario())
+    assert sorted(saved) == [1, 2]
+    assert user_data.weekly_statuses == {"1": "completed", "2": "completed", "3": "error"}
+
+
+CROWDED = {**SCHEDULE, "running_sessions": [
+    {"day": day, "run_type": "easy", "distance_km": 6, "workout_description": "Easy"}
+    for day in ("Monday", "Tuesday", "Thursday", "Friday")
+]}
+
+
+def test_repair_reprompts_respect_concurrency_and_budget(session_factory, monkeypatch):
+    monkeypatch.setattr(tasks, "WEEKLY_PLAN_WEEKS", "3")
+    monkeypatch.setattr(tasks, "WEEKLY_PLAN_CONCURRENCY", 1)
+    # Each call costs 0.0008 USD: weeks 1 and 2 get their draft and re-prompt, week 3's draft is the last call
+    monkeypatch.setattr(usage_tracker, "monthly_budget_usd", 0.0035)
+    calls, in_flight, peak = [], 0, 0
+
+    async def respond(messages, info: AgentInfo) -> ModelResponse:
+        nonlocal in_flight, peak
+        content = messages[0].parts[-1].content
+        week_number = json.loads(content.split("\n")[1])["week_number"]
+        reprompt = "### Previous Attempt" in content
+        calls.append((week_number, reprompt))
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.02)
+        in_flight -= 1
+        # Four runs on three available days can't be repaired locally, so each draft is sent back
+        output = SCHEDULE if reprompt else CROWDED
+        return ModelResponse(
+            parts=[ToolCallPart(info.output_tools[0].name, {**output, "week_number": week_number})],
+            usage=RequestUsage(input_tokens=1000, output_tokens=200),
+        )
+
+    async def scenario():
+        user_id = await create_user(
+            session_factory, macroplan_status="completed", training_overview=STRATEGY, weekly_plan_status="pending",
+        )
+        with weeks_builder.agent.override(model=FunctionModel(respond)), usage_scope(user_id, "weekly"):
+            with pytest.raises(RuntimeError, match="budget exhausted"):
+                await tasks.run_weekly_planner(user_id, PROFILE, STRATEGY)
+        async with session_factory() as db:
+            saved = await schedule_store.week_numbers(db, user_id)
+        return saved, await get_user_data(session_factory, user_id)
+
+    saved, user_data = asyncio.run(scenario())
+    assert calls == [(1, False), (1, True), (2, False), (2, True), (3, False)]
+    assert peak == 1
+    assert sorted(saved) == [1, 2]
+    assert user_data.weekly_statuses == {"1": "completed", "2": "completed", "3": "error"}
+
+
+def test_job_stopped_midway_runs_after_an_immediate_restart(session_factory):
+    runs = []
+
+    async def handle(user_id: int, profile_dict: dict):
+        runs.append(user_id)
+        if len(runs) == 1:
+            await asyncio.Event().wait()  # Until the queue is stopped
+
+    async def fail(user_id: int, error: str):
+        pass
+
+    async def scenario():
+        user_id = await create_user(session_factory, macroplan_status="pending")
+        queue = JobQueue(session_factory=session_factory, usage=UsageTracker(session_factory=session_factory))
+        queue.register("macroplan", handle, on_failure=fail)
+        await queue.enqueue(user_id, "macroplan", {"profile_dict": PROFILE})
+        await queue.start()
+        while not runs:
+            await asyncio.sleep(0.01)
+        # A redeploy: well within the lease
+        await queue.stop()
+        await queue.start()
+        await queue.drain()
+        await queue.stop()
+        async with session_factory() as db:
+            jobs = (await db.execute(select(Job))).scalars().all()
+        return user_id, [(job.status, job.attempts) for job in jobs]
+
+    user_id, statuses = asyncio.run(scenario())
+    assert runs == [user_id, user_id]
+    # The interrupted run did not use up an attempt
+    assert statuses == [("completed", 1)]
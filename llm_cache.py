@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from pydantic_ai import Agent
+from pydantic_ai.models import Model
+
+from llm_usage import usage_tracker
+
+CACHE_PATH = Path(os.environ.get("LLM_CACHE_PATH", Path(__file__).parent / "llm_cache.db"))
+CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") == "1"
+CACHE_TTL_SECONDS = float(os.environ.get("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 5000))
+
+
+def sha256(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def model_name(model: Model | str) -> str:
+    """
+    Name of a model as used in cache keys. Wrappers (cassettes, instrumentation)
+    report the name of the model they wrap; the router, its list of backends.
+    """
+    return getattr(model, "model_name", None) or str(model)
+
+
+class LLMCache:
+    """
+    Content-addressed cache of agent outputs stored in a local SQLite file.
+    Entries expire after `ttl_seconds`; once more than `max_entries` are stored
+    the least recently used ones are evicted.
+    """
+
+    def __init__(
+        self,
+        path: Path = CACHE_PATH,
+        ttl_seconds: float = CACHE_TTL_SECONDS,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        enabled: bool = CACHE_ENABLED,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits: dict[str, int] = defaultdict(int)
+        self.misses: dict[str, int] = defaultdict(int)
+        self.evictions = 0
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(agent_name: str, model: str, instructions: str, prompt: str) -> str:
+        return sha256("\n".join([agent_name, model, sha256(instructions), sha256(prompt)]))
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    agent TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    output TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS ix_llm_cache_last_used_at ON llm_cache (last_used_at);
+            """)
+        return self._conn
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT output, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            output, created_at = row
+            if now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE llm_cache SET last_used_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            return output
+
+    def put(self, key: str, agent_name: str, model: str, output: str):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?, ?)",
+                (key, agent_name, model, output, now, now),
+            )
+            # Evict expired entries, then the least recently used beyond the size cap
+            cursor = conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            self.evictions += cursor.rowcount
+            cursor = conn.execute(
+                """
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            self.evictions += cursor.rowcount
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._connection().execute("DELETE FROM llm_cache")
+            self._connection().commit()
+
+    def stats(self) -> dict:
+        agents = sorted(set(self.hits) | set(self.misses))
+        return {
+            "enabled": self.enabled,
+            "evictions": self.evictions,
+            "agents": {
+                name: {"hits": self.hits[name], "misses": self.misses[name]}
+                for name in agents
+            },
+        }
+
+
+llm_cache = LLMCache()
+
+
+@dataclass
+class CachedRunResult:
+    output: Any
+    cached: bool
+
+
+class CachedAgent:
+    """
+    Wraps a pydantic-ai Agent so that `run` answers identical prompts from the
+    cache, and accounts the runs that reach the model (see llm_usage).
+    Every other attribute (run_sync, override, ...) is the wrapped agent's.
+    """
+
+    def __init__(self, agent: Agent, name: str, instructions: str, cache: LLMCache = llm_cache):
+        self.agent = agent
+        self.name = name
+        self.instructions = instructions
+        self.cache = cache
+        self._model_override: ContextVar[Model | str | None] = ContextVar(f"{name}_model_override", default=None)
+
+    def __getattr__(self, attr):
+        return getattr(self.agent, attr)
+
+    @property
+    def model(self) -> Model | str:
+        """The model the next run goes to: the one set with override(model=...), if any."""
+        return self._model_override.get() or self.agent.model
+
+    @contextmanager
+    def override(self, **kwargs) -> Iterator[None]:
+        """The wrapped agent's override, keeping track of the model so that cache keys follow it."""
+        token = self._model_override.set(kwargs["model"]) if "model" in kwargs else None
+        try:
+            with self.agent.override(**kwargs):
+                yield
+        finally:
+            if token:
+                self._model_override.reset(token)
+
+    async def _run(self, prompt: str):
+        start = time.perf_counter()
+        response = await self.agent.run(prompt)
+        await usage_tracker.record(self.name, response.new_messages(), time.perf_counter() - start)
+        return response
+
+    async def run(self, prompt: str) -> CachedRunResult:
+        if not self.cache.enabled:
+            response = await self._run(prompt)
+            return CachedRunResult(output=response.output, cached=False)
+
+        model = model_name(self.model)
+        key = self.cache.make_key(self.name, model, self.instructions, prompt)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            self.cache.hits[self.name] += 1
+            return CachedRunResult(output=self.agent.output_type.model_validate_json(cached), cached=True)
+
+        self.cache.misses[self.name] += 1
+        response = await self._run(prompt)
+        await asyncio.to_thread(self.cache.put, key, self.name, model, response.output.model_dump_json())
+        return CachedRunResult(output=response.output, cached=False)
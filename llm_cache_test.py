@@ -0,0 +1,93 @@
+import asyncio
+import os
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from pydantic import BaseModel
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, ToolCallPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from cassette import Cassette, CassetteModel
+from llm_cache import CachedAgent, LLMCache, model_name
+
+
+def test_get_returns_stored_output(tmp_path):
+    cache = LLMCache(path=tmp_path / "cache.db")
+    key = cache.make_key("weekly", "gemini-2.5-flash", "instructions", "prompt")
+    assert cache.get(key) is None
+
+    cache.put(key, "weekly", "gemini-2.5-flash", '{"week_number": 1}')
+    assert cache.get(key) == '{"week_number": 1}'
+
+
+def test_key_depends_on_every_component():
+    keys = {
+        LLMCache.make_key("weekly", "m1", "instructions", "prompt"),
+        LLMCache.make_key("verifier", "m1", "instructions", "prompt"),
+        LLMCache.make_key("weekly", "m2", "instructions", "prompt"),
+        LLMCache.make_key("weekly", "m1", "other instructions", "prompt"),
+        LLMCache.make_key("weekly", "m1", "instructions", "other prompt"),
+    }
+    assert len(keys) == 5
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = LLMCache(path=tmp_path / "cache.db", ttl_seconds=0.01)
+    cache.put("k", "weekly", "m", "{}")
+    time.sleep(0.02)
+    assert cache.get("k") is None
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = LLMCache(path=tmp_path / "cache.db", max_entries=2)
+    cache.put("a", "weekly", "m", "{}")
+    cache.put("b", "weekly", "m", "{}")
+    cache.get("a")
+    cache.put("c", "weekly", "m", "{}")
+
+    assert cache.get("a") == "{}"
+    assert cache.get("b") is None
+    assert cache.get("c") == "{}"
+    assert cache.evictions == 1
+
+
+class Reply(BaseModel):
+    text: str
+
+
+def replies(text: str, name: str) -> FunctionModel:
+    def respond(messages, info: AgentInfo) -> ModelResponse:
+        return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, {"text": text})])
+
+    return FunctionModel(respond, model_name=name)
+
+
+def test_key_uses_the_model_the_run_goes_to(tmp_path):
+    agent = CachedAgent(
+        Agent(replies("live", "live-model"), output_type=Reply),
+        name="weekly",
+        instructions="",
+        cache=LLMCache(path=tmp_path / "cache.db"),
+    )
+
+    async def ask() -> str:
+        return (await agent.run("hello")).output.text
+
+    assert asyncio.run(ask()) == "live"
+    # An overriding model gets its own entries, and does not answer from (or write to) the other's
+    with agent.override(model=replies("stub", "stub-model")):
+        assert model_name(agent.model) == "stub-model"
+        assert asyncio.run(ask()) == "stub"
+        # An override of something else keeps the model
+        with agent.override(instructions="Be brief."):
+            assert model_name(agent.model) == "stub-model"
+    assert model_name(agent.model) == "live-model"
+    assert asyncio.run(ask()) == "live"
+    assert agent.cache.hits["weekly"] == 1
+
+    # A cassette is transparent: the key is that of the recorded model
+    recorder = CassetteModel(replies("live", "live-model"), Cassette(tmp_path / "cassette.json"), mode="record")
+    with agent.override(model=recorder):
+        assert model_name(agent.model) == "live-model"
@@ -0,0 +1,161 @@
+"""
+Token, cost and wall time accounting of agent runs, and per-user monthly budgets.
+
+Job handlers run inside usage_scope(user_id, stage) (see jobs.JobQueue), and
+every agent run made there is stored in llm_usage and added to the user's
+llm_usage_months totals. Admission checks (UsageTracker.admit) read the
+month's spend from memory: it is loaded from llm_usage_months once per user
+and month, then kept up to date by the runs of this process.
+"""
+import asyncio
+import os
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime
+
+from pydantic_ai.messages import ModelMessage, ModelResponse
+from sqlalchemy import update
+
+from database import async_session
+from db_models.llm_usage import LLMUsage, LLMUsageMonth
+
+# Monthly LLM spend allowed per user, 0 for no limit
+MONTHLY_BUDGET_USD = float(os.environ.get("LLM_MONTHLY_BUDGET_USD", 5.0))
+# USD per million input / output tokens of models genai-prices does not know
+FALLBACK_INPUT_PRICE = float(os.environ.get("LLM_FALLBACK_INPUT_PRICE", 0.30))
+FALLBACK_OUTPUT_PRICE = float(os.environ.get("LLM_FALLBACK_OUTPUT_PRICE", 2.50))
+
+# (user_id, stage) that agent runs are accounted to
+_scope: ContextVar[tuple[int, str] | None] = ContextVar("llm_usage_scope", default=None)
+
+
+@contextmanager
+def usage_scope(user_id: int, stage: str) -> Iterator[None]:
+    """Accounts the agent runs made inside it (and in tasks it spawns) to the user and stage."""
+    token = _scope.set((user_id, stage))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month_start(day: date) -> datetime:
+    """Midnight (UTC) of the first day of the month after `day`, when budgets reset."""
+    first = month_start(day)
+    return datetime(first.year + first.month // 12, first.month % 12 + 1, 1)
+
+
+def response_cost(response: ModelResponse) -> float:
+    try:
+        return float(response.cost().total_price)
+    except LookupError:
+        usage = response.usage
+        return (usage.input_tokens * FALLBACK_INPUT_PRICE + usage.output_tokens * FALLBACK_OUTPUT_PRICE) / 1e6
+
+
+class BudgetExhausted(RuntimeError):
+    pass
+
+
+class UsageTracker:
+    """
+    Records agent runs per user and stage and enforces `monthly_budget_usd`.
+    The in-memory spend only sees this process's runs on top of what was
+    stored when it was loaded.
+    """
+
+    def __init__(self, session_factory=async_session, monthly_budget_usd: float = MONTHLY_BUDGET_USD):
+        self.session_factory = session_factory
+        self.monthly_budget_usd = monthly_budget_usd
+        # user_id -> (month, spend in USD)
+        self._spent: dict[int, tuple[date, float]] = {}
+        # Serializes the read-modify-write of the monthly totals
+        self._lock = asyncio.Lock()
+        self.runs: dict[str, int] = defaultdict(int)
+        self.tokens: dict[str, int] = defaultdict(int)
+        self.cost_usd: dict[str, float] = defaultdict(float)
+        self.rejections = 0
+
+    async def spent(self, user_id: int) -> float:
+        """The user's LLM spend this month."""
+        month = month_start(datetime.utcnow().date())
+        entry = self._spent.get(user_id)
+        if entry is None or entry[0] != month:
+            async with self.session_factory() as db:
+                totals = await db.get(LLMUsageMonth, (user_id, month))
+            entry = self._spent[user_id] = (month, totals.cost_usd if totals else 0.0)
+        return entry[1]
+
+    async def admit(self, user_id: int) -> bool:
+        """False once the user has spent their monthly budget."""
+        if self.monthly_budget_usd <= 0 or await self.spent(user_id) < self.monthly_budget_usd:
+            return True
+        self.rejections += 1
+        return False
+
+    async def record(self, agent: str, messages: list[ModelMessage], duration_s: float):
+        """Accounts an agent run from its new messages, to the current usage_scope if any."""
+        responses = [message for message in messages if isinstance(message, ModelResponse)]
+        if not responses:
+            return
+        input_tokens = sum(response.usage.input_tokens for response in responses)
+        output_tokens = sum(response.usage.output_tokens for response in responses)
+        cost = sum(response_cost(response) for response in responses)
+        self.runs[agent] += 1
+        self.tokens[agent] += input_tokens + output_tokens
+        self.cost_usd[agent] += cost
+
+        scope = _scope.get()
+        if scope is None:
+            return
+        user_id, stage = scope
+        now = datetime.utcnow()
+        month = month_start(now.date())
+        totals = {
+            "runs": 1,
+            "requests": len(responses),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost_usd": cost,
+            "duration_s": duration_s,
+        }
+        async with self._lock, self.session_factory() as db:
+            db.add(LLMUsage(
+                user_id=user_id,
+                stage=stage,
+                agent=agent,
+                model=responses[-1].model_name or "unknown",
+                created_at=now,
+                **{name: value for name, value in totals.items() if name != "runs"},
+            ))
+            result = await db.execute(
+                update(LLMUsageMonth)
+                .where(LLMUsageMonth.user_id == user_id, LLMUsageMonth.month == month)
+                .values({getattr(LLMUsageMonth, name): getattr(LLMUsageMonth, name) + value for name, value in totals.items()})
+            )
+            if result.rowcount == 0:
+                db.add(LLMUsageMonth(user_id=user_id, month=month, **totals))
+            await db.commit()
+
+        entry = self._spent.get(user_id)
+        if entry is not None and entry[0] == month:
+            self._spent[user_id] = (month, entry[1] + cost)
+
+    def stats(self) -> dict:
+        return {
+            "monthly_budget_usd": self.monthly_budget_usd,
+            "rejections": self.rejections,
+            "agents": {
+                name: {"runs": self.runs[name], "tokens": self.tokens[name], "cost_usd": round(self.cost_usd[name], 6)}
+                for name in sorted(self.runs)
+            },
+        }
+
+
+usage_tracker = UsageTracker()
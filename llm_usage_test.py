@@ -0,0 +1,195 @@
+import asyncio
+import os
+from datetime import date, datetime
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from pydantic import BaseModel
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, ToolCallPart
+from pydantic_ai.models.function import AgentInfo, DeltaToolCall, FunctionModel
+from pydantic_ai.usage import RequestUsage
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import llm_cache
+import models as m
+import weeks_builder
+from database import Base
+from db_models import Job, LLMUsage, LLMUsageMonth, User
+from jobs import JobQueue
+from llm_cache import CachedAgent, LLMCache
+from llm_usage import UsageTracker, month_start, next_month_start, response_cost, usage_scope
+
+
+class Reply(BaseModel):
+    text: str
+
+
+def respond(messages, info: AgentInfo) -> ModelResponse:
+    return ModelResponse(
+        parts=[ToolCallPart(info.output_tools[0].name, {"text": "ok"})],
+        usage=RequestUsage(input_tokens=1000, output_tokens=200),
+    )
+
+
+def run(scenario):
+    """Runs scenario(factory) against a fresh database with one user."""
+    async def run_scenario():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, expire_on_commit=False)
+        async with factory() as db:
+            db.add(User(email="runner@example.com", hashed_password="x"))
+            await db.commit()
+        try:
+            return await scenario(factory)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run_scenario())
+
+
+def test_cost_of_known_and_unknown_models():
+    usage = RequestUsage(input_tokens=1_000_000, output_tokens=1_000_000)
+    known = ModelResponse(parts=[], usage=usage, model_name="gemini-2.5-flash", provider_name="google-gla")
+    assert response_cost(known) == 2.8
+    # Unknown models are priced at LLM_FALLBACK_*_PRICE (gemini-2.5-flash's by default)
+    assert response_cost(ModelResponse(parts=[], usage=usage, model_name="function:respond:")) == 2.8
+
+
+def test_budget_month():
+    assert month_start(date(2030, 3, 31)) == date(2030, 3, 1)
+    assert next_month_start(date(2030, 3, 31)) == datetime(2030, 4, 1)
+    assert next_month_start(date(2030, 12, 5)) == datetime(2031, 1, 1)
+
+
+def test_agent_runs_are_recorded(monkeypatch, tmp_path):
+    async def scenario(factory):
+        tracker = UsageTracker(session_factory=factory, monthly_budget_usd=1.0)
+        monkeypatch.setattr(llm_cache, "usage_tracker", tracker)
+        agent = CachedAgent(
+            Agent(FunctionModel(respond), output_type=Reply),
+            name="verifier",
+            instructions="",
+            cache=LLMCache(path=tmp_path / "cache.db"),
+        )
+
+        # Outside a job nothing is stored, cache hits are not runs
+        await agent.run("outside")
+        with usage_scope(1, "weekly"):
+            await asyncio.gather(*(agent.run(f"week {week}") for week in range(5)))
+            await agent.run("week 0")
+
+        async with factory() as db:
+            rows = (await db.execute(select(LLMUsage))).scalars().all()
+            totals = (await db.execute(select(LLMUsageMonth))).scalar_one()
+        return tracker, rows, totals
+
+    tracker, rows, totals = run(scenario)
+    assert len(rows) == 5
+    assert {(row.user_id, row.stage, row.agent, row.model) for row in rows} == {(1, "weekly", "verifier", "function:respond:")}
+    assert rows[0].input_tokens == 1000 and rows[0].output_tokens == 200 and rows[0].duration_s >= 0
+    assert (totals.month, totals.runs, totals.requests, totals.input_tokens, totals.output_tokens) == (
+        month_start(datetime.utcnow().date()), 5, 5, 5000, 1000,
+    )
+    assert round(totals.cost_usd, 6) == round(5 * 0.0008, 6)
+    assert tracker.stats()["agents"] == {"verifier": {"runs": 6, "tokens": 7200, "cost_usd": 0.0048}}
+
+
+def test_budget_is_checked_in_memory(monkeypatch):
+    async def scenario(factory):
+        tracker = UsageTracker(session_factory=factory, monthly_budget_usd=0.002)
+        month = month_start(datetime.utcnow().date())
+        async with factory() as db:
+            db.add(LLMUsageMonth(user_id=1, month=month, runs=1, requests=1, input_tokens=1000, output_tokens=200, cost_usd=0.0008))
+            await db.commit()
+
+        admitted = [await tracker.admit(1)]
+        # Loaded once: later checks and records do not read the totals again
+        monkeypatch.setattr(tracker, "session_factory", None)
+        admitted.append(await tracker.admit(1))
+        tracker.session_factory = factory
+        messages = (await Agent(FunctionModel(respond), output_type=Reply).run("hello")).new_messages()
+        with usage_scope(1, "macroplan"):
+            await tracker.record("macroplanner", messages, 0.1)
+            await tracker.record("macroplanner", messages, 0.1)
+        tracker.session_factory = None
+        admitted.append(await tracker.admit(1))
+        # No limit: nothing to load
+        admitted.append(await UsageTracker(session_factory=None, monthly_budget_usd=0).admit(1))
+        return admitted, tracker
+
+    admitted, tracker = run(scenario)
+    assert admitted == [True, True, False, True]
+    assert tracker.rejections == 1
+
+
+def test_jobs_over_budget_are_deferred():
+    async def scenario(factory):
+        tracker = UsageTracker(session_factory=factory, monthly_budget_usd=0.001)
+        queue = JobQueue(session_factory=factory, usage=tracker)
+        calls = []
+
+        async def handle(user_id: int):
+            calls.append(user_id)
+
+        async def fail(user_id: int, error: str):
+            pass
+
+        queue.register("verification", handle, on_failure=fail)
+        await queue.start()
+        try:
+            await queue.enqueue(1, "verification", {})
+            await queue.drain()
+            tracker._spent[1] = (month_start(datetime.utcnow().date()), 0.001)
+            job_id = await queue.enqueue(1, "verification", {})
+            # drain() would wait for the deferred job
+            await queue._queues["verification"].join()
+            async with factory() as db:
+                job = await db.get(Job, job_id)
+        finally:
+            await queue.stop()
+        return calls, job
+
+    calls, job = run(scenario)
+    assert calls == [1]
+    assert (job.status, job.attempts, job.last_error) == ("queued", 0, "Monthly LLM budget exhausted")
+    assert job.run_after == next_month_start(datetime.utcnow().date())
+
+
+def test_broken_off_stream_is_recorded(monkeypatch):
+    async def stream(messages, info: AgentInfo):
+        yield {0: DeltaToolCall(name=info.output_tools[0].name, json_args='{"week_number": 1, "running_sessions": [')}
+        yield {0: DeltaToolCall(json_args='{"day": "Sunday", "run_type": "long_run", "distance_km": 12')}
+        raise ConnectionError("stream reset")
+
+    async def scenario(factory):
+        tracker = UsageTracker(session_factory=factory)
+        monkeypatch.setattr(weeks_builder, "usage_tracker", tracker)
+        profile = m.UserProfile(
+            name="Test", birth_date="1990-07-01", biological_sex="female",
+            fitness=m.IntermediateFitness(level="intermediate", average_weekly_distance=30, current_longest_run=12),
+            logistics=m.Logistics(days_available=[m.DayOfWeek.TUE, m.DayOfWeek.SUN], long_run_day=m.DayOfWeek.SUN),
+            goal=m.GeneralGoal(type="base_building"), first_training_date="2030-01-07",
+        )
+        target = weeks_builder.WeeklyTarget(
+            week_number=1, phase_name="Base", is_recovery_week=False, total_volume_km=20, long_run_km=12,
+        )
+
+        async def on_session(session):
+            pass
+
+        with weeks_builder.stream_agent.override(model=FunctionModel(stream_function=stream)), usage_scope(1, "weekly"):
+            try:
+                await weeks_builder.stream_weekly_schedule(profile, target, on_session)
+            except ConnectionError:
+                pass
+        async with factory() as db:
+            return (await db.execute(select(LLMUsage))).scalar_one()
+
+    row = run(scenario)
+    assert (row.agent, row.requests) == ("weekly_stream", 1)
+    assert row.output_tokens > 0
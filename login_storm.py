@@ -0,0 +1,87 @@
+"""
+Load test: latency of an unrelated endpoint (/health) while a burst of logins
+hashes passwords, with bcrypt inline on the event loop vs on the thread pool.
+
+    uv run login_storm.py [logins]
+
+Runs the app in-process against a temporary database; rate limiting is off
+so every login reaches bcrypt.
+"""
+import asyncio
+import sys
+import tempfile
+import time
+
+import httpx
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import api
+import auth
+from database import Base, get_db
+
+PROBE_INTERVAL_SECONDS = 0.02
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event) -> list[float]:
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/health")
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(PROBE_INTERVAL_SECONDS)
+    return latencies
+
+
+async def storm(client: httpx.AsyncClient, logins: int) -> list[float]:
+    stop = asyncio.Event()
+    prober = asyncio.create_task(probe(client, stop))
+    await asyncio.gather(*(
+        client.post("/login", data={"username": "storm@example.com", "password": "wrong" if i % 2 else "secret"})
+        for i in range(logins)
+    ))
+    stop.set()
+    return await prober
+
+
+async def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+
+    with tempfile.NamedTemporaryFile(suffix=".db") as db_file:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_file.name}")
+        factory = async_sessionmaker(engine, expire_on_commit=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        async def override_db():
+            async with factory() as db:
+                yield db
+
+        api.app.dependency_overrides[get_db] = override_db
+        api.login_rate_limiter.enabled = False
+        api.login_email_rate_limiter.enabled = False
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.post("/register", json={"email": "storm@example.com", "password": "secret"})
+
+            print(f"{logins} logins, bcrypt rounds={auth.BCRYPT_ROUNDS}")
+            print(f"{'mode':<16}{'probes':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'total s':>10}")
+            for mode, workers in [("inline", 0), ("thread pool", auth.PASSWORD_HASH_WORKERS)]:
+                api.password_hasher = auth.PasswordHasher(workers=workers, max_pending=logins)
+                start = time.perf_counter()
+                latencies = await storm(client, logins)
+                total = time.perf_counter() - start
+                print(
+                    f"{mode:<16}{len(latencies):>8}{percentile(latencies, 0.5):>10.1f}"
+                    f"{percentile(latencies, 0.99):>10.1f}{max(latencies):>10.1f}{total:>10.1f}"
+                )
+
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,121 @@
+import models as m
+from macroplanner import PhaseStrategy, TrainingStrategy
+from weeks_builder import get_starting_values
+
+LEVELS = ("beginner", "intermediate", "advanced")
+
+# (peak weekly volume km, longest run km) per race type, indexed by fitness level
+RACE_TARGETS = {
+    "marathon": [(50, 30), (65, 32), (80, 35)],
+    "half_marathon": [(32, 16), (42, 19), (55, 22)],
+    "10k": [(25, 12), (35, 13), (45, 14)],
+    "5k": [(20, 7), (28, 8), (35, 10)],
+}
+
+# Desired phase lengths in weeks; Base takes whatever is left
+TAPER_WEEKS = {"marathon": 3, "half_marathon": 2, "10k": 1, "5k": 1}
+PEAK_WEEKS = {"marathon": 3, "half_marathon": 3, "10k": 2, "5k": 2}
+BUILD_WEEKS = {"marathon": 6, "half_marathon": 5, "10k": 4, "5k": 4}
+GENERAL_BUILD_WEEKS = 4
+
+# Volume cap per running day, so 2-day runners don't get high-volume plans
+MAX_KM_PER_DAY = 16
+INJURY_VOLUME_FACTOR = 0.9
+# General fitness goals grow volume by at most this much over the plan
+GENERAL_GROWTH = 1.2
+
+KEY_FOCUS = {
+    "Base": "Build aerobic volume with mostly easy running and a gradually longer long run.",
+    "Build": "Introduce race-specific quality sessions while volume keeps rising.",
+    "Peak": "Highest volume and intensity of the plan, including the longest runs.",
+    "Taper": "Reduce volume, keep some intensity and arrive at race day fresh.",
+}
+
+
+def solve_targets(profile: m.UserProfile, metrics: m.TrainingMetrics | None = None) -> tuple[int, int]:
+    """Peak weekly volume and longest run for the goal, fitness level, schedule and injuries."""
+    start_vol, start_lr = get_starting_values(profile, metrics)
+
+    if isinstance(profile.goal, m.RaceGoal):
+        peak_vol, longest = RACE_TARGETS[profile.goal.type][LEVELS.index(profile.fitness.level)]
+    else:
+        peak_vol = round(start_vol * GENERAL_GROWTH)
+        longest = round(start_lr * GENERAL_GROWTH)
+
+    peak_vol = min(peak_vol, MAX_KM_PER_DAY * len(profile.logistics.days_available))
+    if profile.injury_history:
+        peak_vol = round(peak_vol * INJURY_VOLUME_FACTOR)
+
+    # Never plan below the current level, and keep the long run a sane share of the week
+    peak_vol = max(peak_vol, round(start_vol))
+    longest = max(min(longest, round(peak_vol * 0.6)), round(start_lr))
+    return peak_vol, longest
+
+
+def solve_phases(profile: m.UserProfile) -> list[tuple[str, int]]:
+    """
+    Splits duration_weeks into Base/Build/Peak/Taper. Taper, Peak and Build get
+    their desired length in that priority order, so short plans lose Base first.
+    Zero-length phases are left out.
+    """
+    remaining = profile.duration_weeks
+    if isinstance(profile.goal, m.RaceGoal):
+        race = profile.goal.type
+        desired = [("Taper", TAPER_WEEKS[race]), ("Peak", PEAK_WEEKS[race]), ("Build", BUILD_WEEKS[race])]
+    else:
+        desired = [("Build", min(GENERAL_BUILD_WEEKS, remaining // 4))]
+
+    lengths = {}
+    for phase_name, weeks in desired:
+        lengths[phase_name] = min(weeks, remaining)
+        remaining -= lengths[phase_name]
+    lengths["Base"] = remaining
+
+    return [(name, lengths[name]) for name in ("Base", "Build", "Peak", "Taper") if lengths.get(name)]
+
+
+def plan_overview(profile: m.UserProfile, phases: list[tuple[str, int]], peak_vol: int, longest: int) -> str:
+    parts = [f"{weeks} week{'s' if weeks > 1 else ''} of {name}" for name, weeks in phases]
+    return (
+        f"This {profile.duration_weeks}-week plan runs through {', '.join(parts)}. "
+        f"Volume builds gradually to a peak of {peak_vol} km per week, with a longest run of {longest} km."
+    )
+
+
+def solve_strategy(profile: m.UserProfile, metrics: m.TrainingMetrics | None = None) -> TrainingStrategy:
+    """
+    Deterministic TrainingStrategy whose phases always sum to duration_weeks.
+    Measured training, if given, replaces the profile's starting values.
+    """
+    peak_vol, longest = solve_targets(profile, metrics)
+    phases = solve_phases(profile)
+    return TrainingStrategy(
+        plan_overview=plan_overview(profile, phases, peak_vol, longest),
+        target_peak_volume_km=peak_vol,
+        target_longest_run_km=longest,
+        phases=[
+            PhaseStrategy(phase_name=name, duration_weeks=weeks, key_focus=KEY_FOCUS[name])
+            for name, weeks in phases
+        ],
+    )
+
+
+def strategy_problems(strategy: TrainingStrategy, profile: m.UserProfile) -> list[str]:
+    """Checks an agent-generated strategy against the rules the solver guarantees."""
+    problems = []
+    total = sum(p.duration_weeks for p in strategy.phases)
+    if total != profile.duration_weeks:
+        problems.append(f"phases sum to {total} weeks instead of {profile.duration_weeks}")
+    if any(p.duration_weeks < 0 for p in strategy.phases):
+        problems.append("negative phase duration")
+
+    order = [p.phase_name for p in strategy.phases if p.duration_weeks > 0]
+    expected = [name for name in ("Base", "Build", "Peak", "Taper") if name in order]
+    if order != expected:
+        problems.append(f"phases out of order: {order}")
+
+    if strategy.target_peak_volume_km <= 0 or strategy.target_longest_run_km <= 0:
+        problems.append("non-positive volume targets")
+    elif strategy.target_longest_run_km > strategy.target_peak_volume_km:
+        problems.append("longest run exceeds peak weekly volume")
+    return problems
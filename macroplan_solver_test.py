@@ -0,0 +1,63 @@
+import os
+from datetime import date, timedelta
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import pytest
+
+import models as m
+from macroplan_solver import solve_strategy, strategy_problems
+
+START = date(2030, 1, 7)  # a Monday
+
+
+def make_profile(goal, days: int = 4, injury: str | None = None) -> m.UserProfile:
+    return m.UserProfile(
+        name="Test",
+        birth_date=m.UserProfile.birth_date_from_age(35),
+        biological_sex="female",
+        injury_history=injury,
+        fitness=m.IntermediateFitness(level="intermediate", average_weekly_distance=30, current_longest_run=12),
+        logistics=m.Logistics(days_available=list(m.DayOfWeek)[:days], long_run_day=m.DayOfWeek.MON),
+        goal=goal,
+        first_training_date=START,
+    )
+
+
+def race(race_type: str, weeks: int) -> m.RaceGoal:
+    return m.RaceGoal(type=race_type, goal_type="finish", race_date=START + timedelta(weeks=weeks - 1, days=6))
+
+
+@pytest.mark.parametrize("race_type", ["5k", "10k", "half_marathon", "marathon"])
+@pytest.mark.parametrize("weeks", [1, 2, 5, 8, 12, 18, 30])
+def test_phases_always_sum_to_duration(race_type, weeks):
+    profile = make_profile(race(race_type, weeks))
+    strategy = solve_strategy(profile)
+
+    assert sum(p.duration_weeks for p in strategy.phases) == profile.duration_weeks == weeks
+    assert strategy_problems(strategy, profile) == []
+
+
+def test_short_plans_shorten_base_first():
+    phases = {p.phase_name: p.duration_weeks for p in solve_strategy(make_profile(race("marathon", 12))).phases}
+    assert phases == {"Taper": 3, "Peak": 3, "Build": 6}
+
+
+def test_general_goal_has_no_taper():
+    strategy = solve_strategy(make_profile(m.GeneralGoal(type="base_building")))
+    assert [p.phase_name for p in strategy.phases] == ["Base", "Build"]
+    assert strategy.target_peak_volume_km == 36
+
+
+def test_volume_is_capped_for_few_running_days():
+    two_days = solve_strategy(make_profile(race("marathon", 20), days=2))
+    five_days = solve_strategy(make_profile(race("marathon", 20), days=5))
+    assert two_days.target_peak_volume_km < five_days.target_peak_volume_km
+    assert two_days.target_longest_run_km <= two_days.target_peak_volume_km
+
+
+def test_problems_reports_wrong_phase_total():
+    profile = make_profile(race("half_marathon", 12))
+    strategy = solve_strategy(profile)
+    strategy.phases[0].duration_weeks += 1
+    assert strategy_problems(strategy, profile)
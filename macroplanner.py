@@ -1,6 +1,7 @@
 import models as m
 import model_utils as mu
 import shared
+from llm_cache import CachedAgent
 from pydantic import BaseModel, Field
 from pydantic_ai import Agent
 import textwrap
@@ -50,27 +51,82 @@ Your task is to generate a high-level `TrainingStrategy` based on a user's profi
 Analyze the user's data and the time constraints carefully before outputting the strategy.
 """.strip())
 
-agent = Agent(
-    model=shared.model,
-    output_type=TrainingStrategy,
-    instructions=prompt
+agent = CachedAgent(
+    Agent(
+        model=shared.model,
+        output_type=TrainingStrategy,
+        instructions=prompt
+    ),
+    name="macroplanner",
+    instructions=prompt,
 )
 
-def main():
-    params = mu.get_plan_parameters(shared.test_profile)
-    params["user_profile_json"] = shared.test_profile.model_dump_json()
+# --- Narrative only: phases and targets come from macroplan_solver ---
+
+class PlanNarrative(BaseModel):
+    plan_overview: str
+    key_focus: list[str] = Field(..., description="One key focus per phase, in the same order as the phases provided.")
+
+narrative_prompt = textwrap.dedent("""
+You are an expert running coach. A training plan's structure has already been decided: the phases, their
+durations, the peak weekly volume and the longest run. Do not change any of these numbers.
 
-    user_prompt = textwrap.dedent("""
-Please generate the Training Strategy for this user:
+Your task is to write:
+1. `plan_overview`: a short, motivating summary of the strategy, tailored to the runner's goal and history.
+2. `key_focus`: one sentence per phase, in the given order, describing what the runner works on in that phase.
+""".strip())
+
+narrative_agent = CachedAgent(
+    Agent(
+        model=shared.model,
+        output_type=PlanNarrative,
+        instructions=narrative_prompt
+    ),
+    name="macroplanner_narrative",
+    instructions=narrative_prompt,
+)
 
-### Context Variables
-- **Total Weeks Available**: {duration_weeks}
-- **First Week**: {first_week_context}
+def build_strategy_prompt(profile: m.UserProfile, metrics: m.TrainingMetrics | None = None) -> str:
+    params = mu.get_plan_parameters(profile)
+    return "Generate the Training Strategy for this user:\n" + mu.compact_json({
+        "total_weeks_available": params["duration_weeks"],
+        "first_week": params["first_week_context"],
+        "profile": mu.profile_data(profile, metrics),
+    })
+
+def build_narrative_prompt(
+    profile: m.UserProfile, strategy: TrainingStrategy, metrics: m.TrainingMetrics | None = None
+) -> str:
+    # The texts do not depend on the weekly schedule
+    data = mu.profile_data(profile, metrics)
+    for key in ("days_available", "long_run_day", "first_training_date"):
+        data.pop(key)
+    return "Write the texts of this plan:\n" + mu.compact_json({
+        "profile": data,
+        "phases": [{"phase_name": p.phase_name, "duration_weeks": p.duration_weeks} for p in strategy.phases],
+        "peak_weekly_volume_km": strategy.target_peak_volume_km,
+        "longest_run_km": strategy.target_longest_run_km,
+    })
+
+async def write_narrative(
+    profile: m.UserProfile, strategy: TrainingStrategy, metrics: m.TrainingMetrics | None = None
+) -> TrainingStrategy:
+    """Replaces the solver's templated texts with agent-written ones, keeping every number."""
+    response = await narrative_agent.run(build_narrative_prompt(profile, strategy, metrics))
+    narrative = response.output
+    if len(narrative.key_focus) != len(strategy.phases):
+        return strategy.model_copy(update={"plan_overview": narrative.plan_overview})
+
+    return strategy.model_copy(update={
+        "plan_overview": narrative.plan_overview,
+        "phases": [
+            phase.model_copy(update={"key_focus": focus})
+            for phase, focus in zip(strategy.phases, narrative.key_focus)
+        ],
+    })
 
-### User Profile
-{user_profile_json}
-    """.strip().format(**params))
-    # print(params)
+def main():
+    user_prompt = build_strategy_prompt(shared.test_profile)
     # print(user_prompt)
     # response = agent.run_sync(user_prompt)
     # with open("./plan.json", "w") as f:
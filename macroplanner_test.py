@@ -1,30 +1,42 @@
-import json
+import os
+from pathlib import Path
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import pytest
+
 import models as m
-import enums
-from macroplanner import agent
-
-def main():
-    runner_profile = m.UserProfile(
-        name="Alice",
-        birth_date=m.UserProfile.birth_date_from_age(32),
-        biological_sex="female",
-        units=enums.DistanceUnit.KM,
-        injury_history="Recovered mild shin splints 6 months ago",
-        days_per_week=4,
-        fitness=m.IntermediateFitness(
-            level="intermediate",
-            average_weekly_distance=35.0,
-            current_longest_run=14.0,
-            easy_run_pace="06:30"
-        ),
-        goal=m.RaceGoal(
-            type="marathon",
-            goal_type="finish",
-            race_date="05/05/2026"
-        )
-    )
-    plan = agent.run_sync("Here is the user profile:\n" + runner_profile.to_llm_context())
-    print(json.dumps(plan.output.model_dump(), indent=2))
-
-if __name__ == "__main__":
-    main()
+import shared
+from cassette import CASSETTE_MODE, Cassette, CassetteModel, birth_date_for_age
+from macroplan_solver import strategy_problems
+from macroplanner import agent, build_strategy_prompt
+
+# Committed with the solver's strategy as the response, so that the replay runs everywhere;
+# record the live model's with: LLM_CASSETTE_MODE=record uv run pytest macroplanner_test.py
+CASSETTE = Path(__file__).parent / "cassettes" / "macroplanner.json"
+
+PROFILE = m.UserProfile(
+    name="Alice",
+    birth_date=birth_date_for_age(32),
+    biological_sex="female",
+    injury_history="Recovered mild shin splints 6 months ago",
+    logistics=m.Logistics(
+        days_available=[m.DayOfWeek.MON, m.DayOfWeek.WED, m.DayOfWeek.FRI, m.DayOfWeek.SUN],
+        long_run_day=m.DayOfWeek.SUN,
+    ),
+    fitness=m.IntermediateFitness(
+        level="intermediate", average_weekly_distance=35.0, current_longest_run=14.0, easy_run_pace="06:30",
+    ),
+    goal=m.RaceGoal(type="marathon", goal_type="finish", race_date="2031-05-04"),
+    first_training_date="2030-11-04",
+)
+
+
+def test_macroplanner_agent():
+    if CASSETTE_MODE == "replay" and not CASSETTE.exists():
+        pytest.skip(f"{CASSETTE.name} not recorded")
+    model = CassetteModel(shared.model, Cassette(CASSETTE), latency_seconds=0)
+    with agent.override(model=model):
+        strategy = agent.run_sync(build_strategy_prompt(PROFILE)).output
+
+    assert strategy_problems(strategy, PROFILE) == []
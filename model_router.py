@@ -0,0 +1,275 @@
+"""
+Model that routes agent requests over several LLM backends.
+
+Backends are tried in the configured order (backends failing repeatedly move
+to the back). When the first backend has not answered within its hedge
+delay — the LLM_HEDGE_QUANTILE of its recent latencies, LLM_HEDGE_DEFAULT_SECONDS
+until it has LLM_HEDGE_MIN_SAMPLES of them — the same request is also sent to
+the next backend (or again to the only one) and whichever answers first is
+used. A failed request fails over to the next backend right away.
+
+    LLM_BACKENDS=google:gemini-2.5-flash,openai:gpt-4o-mini
+
+Each provider gets one pooled keep-alive HTTP client shared by its models.
+"""
+import asyncio
+import bisect
+import functools
+import os
+import time
+from collections.abc import AsyncIterator
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+from pydantic_ai.exceptions import FallbackExceptionGroup
+from pydantic_ai.messages import ModelMessage, ModelResponse
+from pydantic_ai.models import Model, ModelRequestParameters, StreamedResponse
+from pydantic_ai.models.fallback import FallbackModel
+from pydantic_ai.settings import ModelSettings
+
+BACKENDS = os.environ.get("LLM_BACKENDS", "google:gemini-2.5-flash")
+HEDGE_ENABLED = os.environ.get("LLM_HEDGE_ENABLED", "1") == "1"
+HEDGE_QUANTILE = float(os.environ.get("LLM_HEDGE_QUANTILE", 0.95))
+# Latencies observed before the quantile is trusted over the default delay
+HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", 20))
+HEDGE_DEFAULT_SECONDS = float(os.environ.get("LLM_HEDGE_DEFAULT_SECONDS", 30))
+HEDGE_MIN_SECONDS = float(os.environ.get("LLM_HEDGE_MIN_SECONDS", 2))
+# Consecutive failures after which a backend is tried last
+UNHEALTHY_AFTER = 3
+
+HTTP_MAX_CONNECTIONS = int(os.environ.get("LLM_HTTP_MAX_CONNECTIONS", 50))
+HTTP_KEEPALIVE_SECONDS = float(os.environ.get("LLM_HTTP_KEEPALIVE_SECONDS", 60))
+HTTP_TIMEOUT_SECONDS = float(os.environ.get("LLM_HTTP_TIMEOUT_SECONDS", 300))
+
+# Histogram bucket upper bounds: 10ms to ~10min, 25% apart
+LATENCY_BUCKETS = [0.01 * 1.25 ** i for i in range(50)]
+
+
+class LatencyHistogram:
+    """Counts of latencies (seconds) in log-spaced buckets."""
+
+    def __init__(self, bounds: list[float] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-quantile, None before any observation."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def stats(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else None,
+            **{f"p{round(q * 100)}": self.quantile(q) for q in (0.5, 0.95, 0.99)},
+        }
+
+
+@dataclass(eq=False)
+class Backend:
+    name: str
+    model: Model
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    requests: int = 0
+    errors: int = 0
+    # Requests sent to this backend as a hedge, and responses of this backend that were used
+    hedges: int = 0
+    wins: int = 0
+    consecutive_errors: int = 0
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "hedges": self.hedges,
+            "wins": self.wins,
+            "latency": self.latency.stats(),
+        }
+
+
+@dataclass(init=False)
+class RouterModel(FallbackModel):
+    """
+    FallbackModel that orders its models by health and hedges slow requests.
+    Streamed requests only fail over, like FallbackModel.
+    """
+
+    backends: list[Backend]
+
+    def __init__(
+        self,
+        *models: Model,
+        hedge_enabled: bool = HEDGE_ENABLED,
+        hedge_quantile: float = HEDGE_QUANTILE,
+        hedge_min_samples: int = HEDGE_MIN_SAMPLES,
+        hedge_default_seconds: float = HEDGE_DEFAULT_SECONDS,
+        hedge_min_seconds: float = HEDGE_MIN_SECONDS,
+    ):
+        # Any error fails over, not only provider API errors
+        super().__init__(*models, fallback_on=(Exception,))
+        self.backends = [Backend(f"{model.system}:{model.model_name}", model) for model in models]
+        self.hedge_enabled = hedge_enabled
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_default_seconds = hedge_default_seconds
+        self.hedge_min_seconds = hedge_min_seconds
+
+    @property
+    def model_name(self) -> str:
+        return f"router:{','.join(model.model_name for model in self.models)}"
+
+    @property
+    def system(self) -> str:
+        return "router"
+
+    def hedge_delay(self, backend: Backend) -> float:
+        if backend.latency.count < self.hedge_min_samples:
+            return self.hedge_default_seconds
+        return max(self.hedge_min_seconds, backend.latency.quantile(self.hedge_quantile))
+
+    def ordered(self) -> list[Backend]:
+        # Stable: healthy backends first, each group in configured order
+        return sorted(self.backends, key=lambda b: b.consecutive_errors >= UNHEALTHY_AFTER)
+
+    async def _attempt(self, backend: Backend, messages, model_settings, model_request_parameters) -> ModelResponse:
+        backend.requests += 1
+        start = time.perf_counter()
+        try:
+            response = await backend.model.request(messages, model_settings, model_request_parameters)
+        except Exception:
+            backend.errors += 1
+            backend.consecutive_errors += 1
+            raise
+        backend.latency.observe(time.perf_counter() - start)
+        backend.consecutive_errors = 0
+        return response
+
+    async def request(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> ModelResponse:
+        untried = self.ordered()
+        pending: dict[asyncio.Task, Backend] = {}
+        exceptions: list[Exception] = []
+        hedged = False
+        # The backend whose delay starts a hedge: the first one, or the one failed over to
+        current = untried[0]
+
+        def launch(backend: Backend):
+            task = asyncio.create_task(self._attempt(backend, messages, model_settings, model_request_parameters))
+            pending[task] = backend
+            if backend in untried:
+                untried.remove(backend)
+
+        try:
+            launch(current)
+            while pending:
+                timeout = None
+                if self.hedge_enabled and not hedged:
+                    timeout = self.hedge_delay(current)
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Slow first request: race it against the next backend, or a second request to the only one
+                    hedged = True
+                    backend = untried[0] if untried else current
+                    backend.hedges += 1
+                    launch(backend)
+                    continue
+                for task in done:
+                    backend = pending.pop(task)
+                    if task.exception() is None:
+                        backend.wins += 1
+                        return task.result()
+                    exceptions.append(task.exception())
+                if not pending and untried:
+                    current = untried[0]
+                    launch(current)
+        finally:
+            # The losing requests are cancelled before their response arrives, so their
+            # token usage is never reported and not counted against the budget
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        raise FallbackExceptionGroup("All backends of RouterModel failed", exceptions)
+
+    @asynccontextmanager
+    async def request_stream(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+        run_context: Any = None,
+    ) -> AsyncIterator[StreamedResponse]:
+        exceptions: list[Exception] = []
+        for backend in self.ordered():
+            async with AsyncExitStack() as stack:
+                backend.requests += 1
+                try:
+                    response = await stack.enter_async_context(
+                        backend.model.request_stream(messages, model_settings, model_request_parameters, run_context)
+                    )
+                except Exception as e:
+                    backend.errors += 1
+                    backend.consecutive_errors += 1
+                    exceptions.append(e)
+                    continue
+                backend.consecutive_errors = 0
+                backend.wins += 1
+                yield response
+                return
+        raise FallbackExceptionGroup("All backends of RouterModel failed", exceptions)
+
+    def stats(self) -> dict:
+        return {
+            "hedge_enabled": self.hedge_enabled,
+            "backends": {backend.name: backend.stats() for backend in self.backends},
+        }
+
+
+@functools.cache
+def http_client(provider: str) -> httpx.AsyncClient:
+    """The pooled keep-alive HTTP client shared by all models of a provider."""
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=10),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+        ),
+    )
+
+
+def build_backend(spec: str) -> Model:
+    """A model from a "provider:model" spec, e.g. "google:gemini-2.5-flash"."""
+    provider, _, name = spec.strip().partition(":")
+    if provider == "google":
+        from pydantic_ai.models.google import GoogleModel
+        from pydantic_ai.providers.google import GoogleProvider
+        return GoogleModel(name, provider=GoogleProvider(http_client=http_client(provider)))
+    if provider == "openai":
+        from pydantic_ai.models.openai import OpenAIChatModel
+        from pydantic_ai.providers.openai import OpenAIProvider
+        return OpenAIChatModel(name, provider=OpenAIProvider(http_client=http_client(provider)))
+    raise ValueError(f"Unknown LLM provider {provider!r} in {spec!r}")
+
+
+def build_router(specs: str = BACKENDS) -> RouterModel:
+    return RouterModel(*(build_backend(spec) for spec in specs.split(",") if spec.strip()))
@@ -0,0 +1,146 @@
+import asyncio
+import os
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import pytest
+from pydantic_ai import Agent
+from pydantic_ai.exceptions import FallbackExceptionGroup
+from pydantic_ai.messages import ModelRequest, ModelResponse, TextPart
+from pydantic_ai.models import ModelRequestParameters
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from model_router import LatencyHistogram, RouterModel
+
+
+def backend(name: str, delay: float = 0.0, fail: bool = False) -> FunctionModel:
+    async def respond(messages, info: AgentInfo) -> ModelResponse:
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError(f"{name} unavailable")
+        return ModelResponse(parts=[TextPart(name)])
+
+    return FunctionModel(respond, model_name=name)
+
+
+def router(*models: FunctionModel, **kwargs) -> RouterModel:
+    kwargs.setdefault("hedge_default_seconds", 0.05)
+    kwargs.setdefault("hedge_min_seconds", 0.0)
+    return RouterModel(*models, **kwargs)
+
+
+def ask(model: RouterModel) -> str:
+    return Agent(model).run_sync("hello").output
+
+
+def counts(model: RouterModel) -> dict:
+    return {
+        name: {key: stats[key] for key in ("requests", "errors", "hedges", "wins")}
+        for name, stats in model.stats()["backends"].items()
+    }
+
+
+def test_fast_primary_is_not_hedged():
+    model = router(backend("primary"), backend("secondary"))
+    assert ask(model) == "primary"
+    assert counts(model) == {
+        "function:primary": {"requests": 1, "errors": 0, "hedges": 0, "wins": 1},
+        "function:secondary": {"requests": 0, "errors": 0, "hedges": 0, "wins": 0},
+    }
+    assert model.stats()["backends"]["function:primary"]["latency"]["count"] == 1
+
+
+def test_slow_primary_is_hedged():
+    model = router(backend("primary", delay=1.0), backend("secondary", delay=0.01))
+    assert ask(model) == "secondary"
+    assert counts(model)["function:secondary"] == {"requests": 1, "errors": 0, "hedges": 1, "wins": 1}
+    # The losing request was cancelled, so its latency is not recorded
+    assert model.stats()["backends"]["function:primary"]["latency"]["count"] == 0
+
+
+def test_losing_request_is_finished_before_returning():
+    finished = []
+
+    async def respond(messages, info: AgentInfo) -> ModelResponse:
+        try:
+            await asyncio.sleep(1.0)
+        finally:
+            await asyncio.sleep(0)  # e.g. closing the connection
+            finished.append("primary")
+        return ModelResponse(parts=[TextPart("primary")])
+
+    async def scenario():
+        model = router(FunctionModel(respond, model_name="primary"), backend("secondary", delay=0.01))
+        response = await model.request([ModelRequest.user_text_prompt("hello")], None, ModelRequestParameters())
+        return response, list(finished)
+
+    response, finished_on_return = asyncio.run(scenario())
+    assert response.parts == [TextPart("secondary")]
+    assert finished_on_return == ["primary"]
+
+
+def test_single_backend_hedges_to_itself():
+    model = router(backend("only", delay=0.2), hedge_enabled=True)
+    assert ask(model) == "only"
+    assert counts(model)["function:only"] == {"requests": 2, "errors": 0, "hedges": 1, "wins": 1}
+
+    assert ask(router(backend("only", delay=0.2), hedge_enabled=False)) == "only"
+
+
+def test_errors_fail_over():
+    model = router(backend("primary", fail=True), backend("secondary"), hedge_enabled=False)
+    assert ask(model) == "secondary"
+    assert counts(model)["function:primary"]["errors"] == 1
+
+    # A backend failing repeatedly is tried last
+    for _ in range(2):
+        ask(model)
+    assert model.backends[0].consecutive_errors == 3
+    assert ask(model) == "secondary"
+    assert counts(model)["function:primary"]["requests"] == 3
+
+
+def test_error_during_hedge():
+    # The hedge fails while the slow first request is still running: it is awaited
+    model = router(backend("primary", delay=0.2), backend("secondary", fail=True))
+    assert ask(model) == "primary"
+    assert counts(model)["function:secondary"] == {"requests": 1, "errors": 1, "hedges": 1, "wins": 0}
+
+
+def test_all_backends_fail():
+    model = router(backend("primary", fail=True), backend("secondary", fail=True))
+    with pytest.raises(FallbackExceptionGroup) as e:
+        ask(model)
+    assert [str(exc) for exc in e.value.exceptions] == ["primary unavailable", "secondary unavailable"]
+
+
+def test_hedge_delay_follows_latency_quantile():
+    model = router(backend("primary"), hedge_min_samples=20, hedge_default_seconds=30, hedge_min_seconds=0.5)
+    primary = model.backends[0]
+    assert model.hedge_delay(primary) == 30
+    for k in range(100):
+        primary.latency.observe(1.0 if k < 95 else 20.0)
+    assert 1.0 <= model.hedge_delay(primary) < 1.25
+
+    fast = LatencyHistogram()
+    fast.observe(0.02)
+    assert fast.quantile(0.95) < 0.5
+    primary.latency = fast
+    model.hedge_min_samples = 1
+    assert model.hedge_delay(primary) == 0.5
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.quantile(0.5) is None
+    for seconds in [0.1] * 50 + [2.0] * 45 + [60.0] * 5:
+        histogram.observe(seconds)
+    stats = histogram.stats()
+    assert stats["count"] == 100
+    assert stats["mean"] == 3.95
+    # Bucket upper bounds are at most 25% above the true value
+    assert 0.1 <= stats["p50"] < 0.125
+    assert 2.0 <= stats["p95"] < 2.5
+    assert 60.0 <= stats["p99"] < 75.0
+    histogram.observe(10_000)
+    assert histogram.quantile(1.0) == float("inf")
@@ -1,9 +1,18 @@
+import json
+
 import models as m
 
-def to_llm_context(up: m.UserProfile) -> str:
+DAY_ORDER = list(m.DayOfWeek)
+
+def format_pace(seconds_per_km: float) -> str:
+    minutes, seconds = divmod(round(seconds_per_km), 60)
+    return f"{minutes}:{seconds:02d}"
+
+def to_llm_context(up: m.UserProfile, metrics: m.TrainingMetrics | None = None) -> str:
     """
     Generates a clear Markdown representation of the user profile
-    optimized for LLM reasoning.
+    optimized for LLM reasoning. Measured training from synced activities,
+    if any, is added after the self-reported fitness.
     """
     lines = []
     
@@ -39,6 +48,22 @@ def to_llm_context(up: m.UserProfile) -> str:
             lines.append(f"- **Recent Race**: {up.fitness.recent_race.distance}{up.units.value} in {up.fitness.recent_race.time}")
     lines.append("")
 
+    # 3b. Measured training (from synced activities)
+    if metrics:
+        lines.append(f"## Measured Training (synced activities up to {metrics.as_of})")
+        lines.append(f"- **Avg Weekly Volume (4 weeks)**: {metrics.weekly_volume_km} km over {metrics.runs_per_week} runs/week")
+        lines.append(f"- **Last 7 Days**: {metrics.last_week_volume_km} km")
+        lines.append(f"- **Longest Run (6 weeks)**: {metrics.longest_run_km} km")
+        if metrics.acute_chronic_ratio is not None:
+            lines.append(f"- **Acute:Chronic Load Ratio**: {metrics.acute_chronic_ratio}")
+        if metrics.pace_s_per_km:
+            pace = f"- **Avg Pace (4 weeks)**: {format_pace(metrics.pace_s_per_km)} min/km"
+            if metrics.pace_trend_s_per_km:
+                direction = "faster" if metrics.pace_trend_s_per_km < 0 else "slower"
+                pace += f" ({abs(metrics.pace_trend_s_per_km):.0f} s/km {direction} than the 4 weeks before)"
+            lines.append(pace)
+        lines.append("")
+
     # 4. Goal (Polymorphic handling)
     lines.append("## Primary Goal")
     if isinstance(up.goal, m.RaceGoal):
@@ -66,6 +91,53 @@ def to_llm_context(up: m.UserProfile) -> str:
 
     return "\n".join(lines)
 
+def compact_json(data: dict) -> str:
+    """
+    Canonical, token-minimal JSON for prompts: sorted keys, no whitespace, and
+    no null or empty values, so equal inputs always give the same prompt.
+    """
+    def prune(value):
+        if isinstance(value, dict):
+            pruned = {k: prune(v) for k, v in value.items()}
+            return {k: v for k, v in pruned.items() if v not in (None, "", [], {})}
+        if isinstance(value, list):
+            return [prune(v) for v in value]
+        return value
+
+    return json.dumps(prune(data), separators=(",", ":"), sort_keys=True, ensure_ascii=False)
+
+def sorted_days(days: list[m.DayOfWeek]) -> list[str]:
+    return [d.value for d in sorted(days, key=DAY_ORDER.index)]
+
+def profile_data(up: m.UserProfile, metrics: m.TrainingMetrics | None = None) -> dict:
+    """
+    The profile fields the agents reason on. Name and birth date are left out
+    (age instead), as is a "prefer_not_to_say" sex. Measured training from
+    synced activities, if any, is under "measured", without the raw loads
+    that acute_chronic_ratio already summarizes.
+    """
+    data = {
+        "age": up.age,
+        "sex": None if up.biological_sex == "prefer_not_to_say" else up.biological_sex,
+        "units": up.units.value,
+        "injury_history": up.injury_history,
+        "fitness": up.fitness.model_dump(mode="json"),
+        "days_available": sorted_days(up.logistics.days_available),
+        "days_per_week": len(up.logistics.days_available),
+        "long_run_day": up.logistics.long_run_day.value,
+        "strength": up.strength.model_dump(mode="json") if up.strength else None,
+        "goal": up.goal.model_dump(mode="json"),
+        "first_training_date": up.first_training_date.isoformat(),
+    }
+    if up.has_race_date:
+        data["weeks_to_race"] = (up.goal.race_date - up.first_training_date).days // 7
+    if metrics:
+        data["measured"] = metrics.model_dump(mode="json", exclude={"acute_load", "chronic_load"})
+    return data
+
+def compact_profile(up: m.UserProfile, metrics: m.TrainingMetrics | None = None) -> str:
+    return compact_json(profile_data(up, metrics))
+
 def get_plan_parameters(up: m.UserProfile):
     if up.has_race_date:
         goal_context = f"Targeting race on {up.goal.race_date}."
@@ -9,7 +9,8 @@ from .inputs import (
     StrengthProfile,
     Logistics,
     RaceGoal,
-    GeneralGoal
+    GeneralGoal,
+    TrainingMetrics
 )
 
 # Re-export outputs
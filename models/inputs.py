@@ -182,4 +182,21 @@ class UserProfile(BaseModel):
         for day_idx in range(current_weekday_idx, 7):
             if day_idx in user_days_indices:
                 remaining_sessions += 1
-        return remaining_sessions
\ No newline at end of file
+        return remaining_sessions
+
+class TrainingMetrics(BaseModel):
+    """Training measured from synced activities up to `as_of` (see training_load.py). Distances in km."""
+    as_of: date
+    # Weeks of the last 4 with at least one run
+    weeks_of_data: int
+    weekly_volume_km: float = Field(description="Average running volume per week over the last 4 weeks")
+    last_week_volume_km: float = Field(description="Running volume of the last 7 days")
+    longest_run_km: float = Field(description="Longest run of the last 6 weeks")
+    runs_per_week: float
+    acute_load: float = Field(description="Training load of the last 7 days")
+    chronic_load: float = Field(description="Average weekly training load over the last 4 weeks")
+    acute_chronic_ratio: Optional[float] = None
+    pace_s_per_km: Optional[float] = Field(default=None, description="Average running pace over the last 4 weeks")
+    pace_trend_s_per_km: Optional[float] = Field(
+        default=None, description="Change of pace vs the 4 weeks before (negative is faster)"
+    )
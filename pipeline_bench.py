@@ -0,0 +1,205 @@
+"""
+End-to-end benchmark of the plan pipeline (verification -> macroplan -> weekly)
+for N users submitting their profile at once, with agent calls replayed from a
+cassette (see cassette.py). Record the cassette once against the live model:
+
+    LLM_CASSETTE_MODE=record uv run pipeline_bench.py
+
+then replay it as often as needed, with the recorded latencies or e.g.
+LLM_CASSETTE_LATENCY=2 (seconds per request):
+
+    uv run pipeline_bench.py [users]
+
+Recording runs one user per sample profile. Runs against a temporary database
+with the response cache, weekly templates and monthly budgets off, so every
+user goes through the same agent calls; job concurrency, MACROPLAN_MODE,
+WEEKLY_PLAN_WEEKS etc. are read from the environment as usual.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+DB_DIR = tempfile.TemporaryDirectory()
+os.environ.setdefault("LLM_CASSETTE", str(Path(__file__).parent / "cassettes" / "pipeline.json"))
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{DB_DIR.name}/bench.db")
+os.environ.setdefault("LLM_CACHE_ENABLED", "0")
+os.environ.setdefault("WEEKLY_TEMPLATES_ENABLED", "0")
+os.environ.setdefault("LLM_MONTHLY_BUDGET_USD", "0")
+
+import asyncio  # noqa: E402
+import time  # noqa: E402
+from collections import defaultdict  # noqa: E402
+
+from sqlalchemy import event, func, select  # noqa: E402
+
+import database  # noqa: E402
+import models as m  # noqa: E402
+import shared  # noqa: E402
+import tasks  # noqa: E402
+from cassette import birth_date_for_age  # noqa: E402
+from db_models import Job, User, UserData  # noqa: E402
+from jobs import job_queue  # noqa: E402
+
+STAGES = {
+    "verification": (tasks.run_verification, tasks.fail_verification),
+    "macroplan": (tasks.run_macroplanner, tasks.fail_macroplanner),
+    "weekly": (tasks.run_weekly_planner, tasks.fail_weekly_planner),
+}
+
+
+def sample_profiles() -> list[m.UserProfile]:
+    def profile(fitness, goal, days, long_run_day, **extra) -> m.UserProfile:
+        return m.UserProfile(
+            name="Bench",
+            birth_date=birth_date_for_age(36),
+            biological_sex="female",
+            fitness=fitness,
+            logistics=m.Logistics(days_available=days, long_run_day=long_run_day),
+            goal=goal,
+            first_training_date="2030-11-04",
+            **extra,
+        )
+
+    beginner = m.BeginnerFitness(level="beginner", general_activity_level="lightly_active", can_run_nonstop_30min="yes")
+    intermediate = m.IntermediateFitness(level="intermediate", average_weekly_distance=35, current_longest_run=14)
+    advanced = m.IntermediateFitness(level="advanced", average_weekly_distance=70, current_longest_run=28)
+    three_days = [m.DayOfWeek.TUE, m.DayOfWeek.THU, m.DayOfWeek.SUN]
+    four_days = [m.DayOfWeek.MON, m.DayOfWeek.WED, m.DayOfWeek.FRI, m.DayOfWeek.SAT]
+    return [
+        profile(beginner, m.GeneralGoal(type="base_building"), three_days, m.DayOfWeek.SUN),
+        profile(beginner, m.RaceGoal(type="10k", goal_type="finish", race_date="2031-03-02"), three_days, m.DayOfWeek.SUN),
+        profile(
+            intermediate, m.RaceGoal(type="half_marathon", goal_type="improve_speed", race_date="2031-04-13"),
+            four_days, m.DayOfWeek.SAT, injury_history="Recovered mild shin splints 6 months ago",
+        ),
+        profile(
+            intermediate, m.RaceGoal(type="marathon", goal_type="finish", race_date="2031-05-04"), four_days,
+            m.DayOfWeek.SAT, strength=m.StrengthProfile(equipment_access="dumbbells_kettlebells", sessions_per_week=2),
+        ),
+        profile(advanced, m.GeneralGoal(type="fitness_maintenance"), four_days, m.DayOfWeek.SAT, injury_history="Knee surgery in 2028"),
+        profile(
+            advanced, m.RaceGoal(type="marathon", goal_type="specific_time_target", race_date="2031-04-27",
+                                 target_time_str="03:05:00"),
+            three_days, m.DayOfWeek.SUN,
+        ),
+    ]
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class DBTimer:
+    """Statements run and time spent in them, from the engine's cursor events."""
+
+    def __init__(self, engine):
+        self.statements = 0
+        self.seconds = 0.0
+
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("bench_start", []).append(time.perf_counter())
+
+        @event.listens_for(engine.sync_engine, "after_cursor_execute")
+        def after(conn, cursor, statement, parameters, context, executemany):
+            self.statements += 1
+            self.seconds += time.perf_counter() - conn.info["bench_start"].pop()
+
+
+async def run(profiles: list[m.UserProfile]) -> dict:
+    await database.init_db()
+    async with database.async_session() as db:
+        users = [User(email=f"bench{k}@example.com", hashed_password="x") for k in range(len(profiles))]
+        db.add_all(users)
+        await db.flush()
+        payloads = {}
+        for user, profile in zip(users, profiles):
+            payloads[user.id] = profile.model_dump(mode="json")
+            db.add(UserData(user_id=user.id, profile=payloads[user.id], verification_status="pending"))
+        await db.commit()
+
+    # Handler wall time per stage, and when each user's last job ended
+    durations: dict[str, list[float]] = defaultdict(list)
+    finished: dict[int, float] = {}
+
+    def timed(stage: str, handler):
+        async def run_timed(user_id: int, **payload):
+            start = time.perf_counter()
+            try:
+                await handler(user_id, **payload)
+            finally:
+                durations[stage].append(time.perf_counter() - start)
+                finished[user_id] = time.perf_counter()
+
+        return run_timed
+
+    for stage, (handler, on_failure) in STAGES.items():
+        job_queue.register(stage, timed(stage, handler), on_failure=on_failure)
+
+    # Queued before the workers start, so they all find their job waiting (and none is recovered as stale)
+    for user_id, profile_dict in payloads.items():
+        await job_queue.enqueue(user_id, "verification", {"profile_dict": profile_dict})
+
+    db_timer = DBTimer(database.engine)
+    start = time.perf_counter()
+    await job_queue.start()
+    try:
+        await job_queue.drain()
+    finally:
+        await job_queue.stop()
+    wall = time.perf_counter() - start
+
+    async with database.async_session() as db:
+        jobs = dict((await db.execute(select(Job.status, func.count()).group_by(Job.status))).all())
+        plans = await db.scalar(select(func.count()).where(UserData.weekly_plan_status == "completed"))
+    await database.engine.dispose()
+    return {
+        "wall": wall,
+        "durations": durations,
+        "end_to_end": [end - start for end in finished.values()],
+        "jobs": jobs,
+        "plans": plans,
+        "db": db_timer,
+    }
+
+
+def main():
+    profiles = sample_profiles()
+    model = shared.model
+    if not hasattr(model, "cassette"):
+        sys.exit("LLM_CASSETTE is not set")
+    if model.mode == "record":
+        users = len(profiles)
+    else:
+        if not model.cassette.entries:
+            sys.exit(f"{model.cassette.path} is empty: record it first with LLM_CASSETTE_MODE=record")
+        users = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    profiles = [profiles[k % len(profiles)] for k in range(users)]
+
+    result = asyncio.run(run(profiles))
+
+    wall, db_timer, cassette = result["wall"], result["db"], model.stats()["cassette"]
+    print(
+        f"{users} users ({cassette['mode']} {cassette['path']}): {wall:.1f} s, "
+        f"{users / wall:.2f} users/s, {result['plans']} weekly plans completed"
+    )
+    print(f"jobs: {', '.join(f'{n} {status}' for status, n in sorted(result['jobs'].items()))}")
+    print(
+        f"agent requests: {cassette['recorded'] + cassette['replayed']} ({cassette['misses']} not in cassette), "
+        f"database: {db_timer.statements} statements, {db_timer.seconds:.2f} s"
+    )
+    print(f"{'stage':<16}{'runs':>6}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'max s':>9}")
+    rows = {**result["durations"], "end to end": result["end_to_end"]}
+    for stage, values in rows.items():
+        if not values:
+            continue
+        print(
+            f"{stage:<16}{len(values):>6}{percentile(values, 0.5):>9.2f}{percentile(values, 0.95):>9.2f}"
+            f"{percentile(values, 0.99):>9.2f}{max(values):>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Throughput of the weekly progression: the batch API vs calling
+calculate_weekly_progression once per plan.
+
+    uv run progression_bench.py [n_plans]
+"""
+import itertools
+import sys
+import time
+
+import models as m
+from macroplan_solver import solve_strategy
+from macroplanner import TrainingStrategy
+from weeks_builder import calculate_weekly_progression, calculate_weekly_progression_batch
+
+
+def sample_plans(n: int) -> list[tuple[m.UserProfile, TrainingStrategy]]:
+    fitness_levels = [
+        m.BeginnerFitness(level="beginner", general_activity_level="lightly_active", can_run_nonstop_30min="yes"),
+        m.IntermediateFitness(level="intermediate", average_weekly_distance=35, current_longest_run=14),
+        m.IntermediateFitness(level="advanced", average_weekly_distance=70, current_longest_run=28),
+    ]
+    goals = [
+        m.RaceGoal(type="marathon", goal_type="finish", race_date="2031-05-04"),
+        m.RaceGoal(type="half_marathon", goal_type="finish", race_date="2031-02-02"),
+        m.GeneralGoal(type="base_building"),
+    ]
+    days = [
+        [m.DayOfWeek.TUE, m.DayOfWeek.THU, m.DayOfWeek.SUN],
+        [m.DayOfWeek.MON, m.DayOfWeek.WED, m.DayOfWeek.FRI, m.DayOfWeek.SUN],
+    ]
+
+    distinct = []
+    for fitness, goal, available in itertools.product(fitness_levels, goals, days):
+        profile = m.UserProfile(
+            name="Bench",
+            birth_date="1990-01-01",
+            biological_sex="female",
+            fitness=fitness,
+            logistics=m.Logistics(days_available=available, long_run_day=m.DayOfWeek.SUN),
+            goal=goal,
+            first_training_date="2030-11-04",
+        )
+        distinct.append((profile, solve_strategy(profile)))
+    return [distinct[k % len(distinct)] for k in range(n)]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    plans = sample_plans(n)
+
+    start = time.perf_counter()
+    weeks = calculate_weekly_progression_batch(plans)
+    batch = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for profile, strategy in plans:
+        calculate_weekly_progression(profile, strategy)
+    loop = time.perf_counter() - start
+
+    print(f"{n} plans, {len(weeks)} weeks")
+    print(f"batch: {batch:.2f}s ({n / batch:,.0f} plans/s)")
+    print(f"loop:  {loop:.2f}s ({n / loop:,.0f} plans/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Input tokens per agent call, with the previous Markdown/JSON prompts
+("before") and the compact prompts ("after"), over a corpus of profiles.
+
+    uv run prompt_tokens.py
+
+Counts use tiktoken's o200k_base encoding: Gemini's tokenizer gives different
+absolute numbers, but the before/after ratios are close. When the encoding
+cannot be loaded (it is downloaded on first use) tokens are estimated as one
+per 4 characters, which overstates the savings of dropping whitespace.
+"""
+import itertools
+import statistics
+import textwrap
+
+import tiktoken
+
+import models as m
+import model_utils as mu
+from models.inputs import RecentRace
+from macroplan_solver import solve_strategy
+from macroplanner import (
+    build_narrative_prompt,
+    build_strategy_prompt,
+    narrative_prompt,
+    prompt as macroplanner_prompt,
+)
+from verifier import build_verifier_prompt, verifier_prompt
+from weeks_builder import WeeklyTarget, build_weekly_planner_prompt, calculate_weekly_progression, system_prompt
+
+try:
+    encoding = tiktoken.get_encoding("o200k_base")
+except Exception as e:
+    print(f"o200k_base encoding unavailable ({type(e).__name__}), estimating 4 characters per token")
+    encoding = None
+
+
+def tokens(text: str) -> int:
+    if encoding is None:
+        return -(-len(text) // 4)
+    return len(encoding.encode(text))
+
+
+# --- Prompts as they were built before the compact serializers ---
+
+def legacy_verifier_prompt(profile: m.UserProfile, metrics: m.TrainingMetrics | None) -> str:
+    return f"Here is the user profile:\n{mu.to_llm_context(profile, metrics)}"
+
+
+def legacy_strategy_prompt(profile: m.UserProfile, metrics: m.TrainingMetrics | None) -> str:
+    params = mu.get_plan_parameters(profile)
+    params["user_profile_json"] = profile.model_dump_json()
+    prompt = textwrap.dedent("""
+Please generate the Training Strategy for this user:
+
+### Context Variables
+- **Total Weeks Available**: {duration_weeks}
+- **First Week**: {first_week_context}
+
+### User Profile
+{user_profile_json}
+    """.strip().format(**params))
+    if metrics:
+        prompt += f"\n\n### Measured Training\n{metrics.model_dump_json()}"
+    return prompt
+
+
+def legacy_narrative_prompt(profile: m.UserProfile, strategy, metrics: m.TrainingMetrics | None) -> str:
+    phases = "\n".join(f"- {p.phase_name}: {p.duration_weeks} weeks" for p in strategy.phases)
+    return f"""{mu.to_llm_context(profile, metrics)}
+
+## Plan Structure
+{phases}
+- Peak weekly volume: {strategy.target_peak_volume_km} km
+- Longest run: {strategy.target_longest_run_km} km
+"""
+
+
+def legacy_weekly_prompt(user_profile: m.UserProfile, weekly_target: WeeklyTarget) -> str:
+    strength_info = "Not requested."
+    if user_profile.strength:
+        strength_info = f"""
+        - Status: Active
+        - Target Sessions: {user_profile.strength.sessions_per_week}
+        - Equipment: {user_profile.strength.equipment_access}
+        """
+    available_days = [d.value for d in user_profile.logistics.days_available]
+    return f"""
+Please generate the schedule for this specific week:
+
+### Weekly Goals
+- **Week Number**: {weekly_target.week_number}
+- **Phase**: {weekly_target.phase_name}
+- **Target Total Volume**: {weekly_target.total_volume_km} km
+- **Target Long Run**: {weekly_target.long_run_km} km
+
+### User Constraints
+- **Fitness Level**: {user_profile.fitness.level}
+- **Running Days**: {", ".join(available_days)}
+- **Long Run Day**: {user_profile.logistics.long_run_day.value}
+
+### Strength Training Context
+{strength_info}
+    """
+
+
+def sample_profiles() -> list[tuple[m.UserProfile, m.TrainingMetrics | None]]:
+    fitness_levels = [
+        m.BeginnerFitness(level="beginner", general_activity_level="lightly_active", can_run_nonstop_30min="yes"),
+        m.IntermediateFitness(level="intermediate", average_weekly_distance=35, current_longest_run=14),
+        m.IntermediateFitness(
+            level="advanced", average_weekly_distance=70, current_longest_run=28, easy_run_pace="05:10",
+            recent_race=RecentRace(distance="half_marathon", time="01:32:10"),
+        ),
+    ]
+    goals = [
+        m.RaceGoal(type="marathon", goal_type="finish", race_date="04/05/2031"),
+        m.RaceGoal(type="10k", goal_type="specific_time_target", race_date="12/01/2031", target_time_str="00:48:00"),
+        m.GeneralGoal(type="base_building"),
+    ]
+    logistics = [
+        m.Logistics(days_available=[m.DayOfWeek.TUE, m.DayOfWeek.THU, m.DayOfWeek.SUN], long_run_day=m.DayOfWeek.SUN),
+        m.Logistics(
+            days_available=[m.DayOfWeek.MON, m.DayOfWeek.WED, m.DayOfWeek.FRI, m.DayOfWeek.SAT],
+            long_run_day=m.DayOfWeek.SAT,
+        ),
+    ]
+    extras = [
+        {},
+        {"strength": m.StrengthProfile(equipment_access="dumbbells_kettlebells", sessions_per_week=2),
+         "injury_history": "Recovered mild shin splints 6 months ago"},
+    ]
+    metrics = m.TrainingMetrics(
+        as_of="2030-11-03", weeks_of_data=4, weekly_volume_km=31.5, last_week_volume_km=34.0, longest_run_km=16.0,
+        runs_per_week=3.3, acute_load=240.0, chronic_load=210.5, acute_chronic_ratio=1.14, pace_s_per_km=352,
+        pace_trend_s_per_km=-6,
+    )
+
+    corpus = []
+    for k, (fitness, goal, days, extra) in enumerate(itertools.product(fitness_levels, goals, logistics, extras)):
+        profile = m.UserProfile(
+            name="Alexandra Example-Runner",
+            birth_date="01/07/1988",
+            biological_sex="female" if k % 2 else "male",
+            fitness=fitness,
+            logistics=days,
+            goal=goal,
+            first_training_date="04/11/2030",
+            **extra,
+        )
+        corpus.append((profile, metrics if k % 3 == 0 else None))
+    return corpus
+
+
+def main():
+    corpus = sample_profiles()
+    calls = {"verifier": [], "macroplanner": [], "macroplanner_narrative": [], "weekly": []}
+    for profile, metrics in corpus:
+        strategy = solve_strategy(profile, metrics)
+        calls["verifier"].append((legacy_verifier_prompt(profile, metrics), build_verifier_prompt(profile, metrics)))
+        calls["macroplanner"].append(
+            (legacy_strategy_prompt(profile, metrics), build_strategy_prompt(profile, metrics))
+        )
+        calls["macroplanner_narrative"].append(
+            (legacy_narrative_prompt(profile, strategy, metrics), build_narrative_prompt(profile, strategy, metrics))
+        )
+        for weekly_target in calculate_weekly_progression(profile, strategy, metrics):
+            calls["weekly"].append(
+                (legacy_weekly_prompt(profile, weekly_target), build_weekly_planner_prompt(profile, weekly_target))
+            )
+    instructions = {
+        "verifier": verifier_prompt,
+        "macroplanner": macroplanner_prompt,
+        "macroplanner_narrative": narrative_prompt,
+        "weekly": system_prompt,
+    }
+
+    print(f"{len(corpus)} profiles, mean input tokens per call (user prompt / with instructions)")
+    print(f"{'agent':<24}{'calls':>6}{'before':>16}{'after':>16}{'saved':>8}")
+    for agent, prompts in calls.items():
+        fixed = tokens(instructions[agent])
+        before = statistics.mean(tokens(old) for old, _ in prompts)
+        after = statistics.mean(tokens(new) for _, new in prompts)
+        print(
+            f"{agent:<24}{len(prompts):>6}"
+            f"{before:>8.0f} /{before + fixed:>6.0f}{after:>8.0f} /{after + fixed:>6.0f}"
+            f"{1 - (after + fixed) / (before + fixed):>8.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import time
+from collections import deque
+
+# Drop keys with no hits left in their window every this many allowed hits
+PRUNE_EVERY = 1000
+
+
+class RateLimiter:
+    """
+    In-process sliding window limiter: at most `limit` hits per key within
+    `window_seconds`. Limits only apply to this process.
+    """
+
+    def __init__(self, limit: int, window_seconds: float, enabled: bool = True):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.enabled = enabled
+        self._hits: dict[str, deque[float]] = {}
+        self.allowed = 0
+        self.limited = 0
+
+    def _window(self, key: str, now: float) -> deque[float]:
+        hits = self._hits.setdefault(key, deque())
+        while hits and hits[0] <= now - self.window_seconds:
+            hits.popleft()
+        return hits
+
+    def hit(self, *keys: str) -> float | None:
+        """
+        Records one hit on every key, unless one of them is over its limit.
+        Returns the seconds until a hit would be allowed again, or None if allowed.
+        """
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        windows = [self._window(key, now) for key in keys]
+        full = [hits for hits in windows if len(hits) >= self.limit]
+        if full:
+            self.limited += 1
+            return max(hits[0] + self.window_seconds - now for hits in full)
+
+        for hits in windows:
+            hits.append(now)
+        self.allowed += 1
+        if self.allowed % PRUNE_EVERY == 0:
+            self._prune(now)
+        return None
+
+    def reset(self, key: str):
+        self._hits.pop(key, None)
+
+    def _prune(self, now: float):
+        for key in [k for k, hits in self._hits.items() if not hits or hits[-1] <= now - self.window_seconds]:
+            del self._hits[key]
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "limit": self.limit,
+            "window_seconds": self.window_seconds,
+            "tracked_keys": len(self._hits),
+            "allowed": self.allowed,
+            "limited": self.limited,
+        }
@@ -0,0 +1,29 @@
+from rate_limit import RateLimiter
+
+
+def test_limits_each_key_within_window():
+    limiter = RateLimiter(limit=2, window_seconds=60)
+    assert limiter.hit("ip:1", "email:a") is None
+    assert limiter.hit("ip:1", "email:b") is None
+    # ip:1 is full, so nothing is recorded for email:c either
+    retry_after = limiter.hit("ip:1", "email:c")
+    assert 0 < retry_after <= 60
+    assert limiter.hit("ip:2", "email:c") is None
+    assert limiter.stats()["limited"] == 1
+
+
+def test_window_slides_and_reset():
+    limiter = RateLimiter(limit=1, window_seconds=0)
+    assert limiter.hit("k") is None
+    assert limiter.hit("k") is None
+
+    limiter = RateLimiter(limit=1, window_seconds=60)
+    limiter.hit("k")
+    assert limiter.hit("k") is not None
+    limiter.reset("k")
+    assert limiter.hit("k") is None
+
+
+def test_disabled_limiter_allows_everything():
+    limiter = RateLimiter(limit=0, window_seconds=60, enabled=False)
+    assert limiter.hit("k") is None
@@ -0,0 +1,169 @@
+import os
+from collections import Counter
+from collections.abc import Awaitable, Callable
+
+import models as m
+from llm_usage import BudgetExhausted
+from weekly_templates import DAY_ORDER, rescale_schedule
+from weeks_builder import WeeklyTarget, agent as weekly_agent, build_weekly_planner_prompt
+
+# Allowed relative difference between the sum of distance_km and the weekly target
+VOLUME_TOLERANCE = 0.05
+# Agent round trips allowed after local repair fails
+MAX_REPROMPTS = int(os.environ.get("WEEKLY_MAX_REPROMPTS", 1))
+
+stats = Counter()
+
+
+def schedule_violations(
+    schedule: m.WeeklySchedule, user_profile: m.UserProfile, weekly_target: WeeklyTarget
+) -> list[str]:
+    """Checks a schedule against the running-session rules of the weekly system prompt."""
+    violations = []
+    available = set(user_profile.logistics.days_available)
+    long_run_day = user_profile.logistics.long_run_day
+    runs = schedule.running_sessions
+
+    if not runs:
+        return ["no running sessions"]
+
+    total = sum(s.distance_km for s in runs)
+    if abs(total - weekly_target.total_volume_km) > weekly_target.total_volume_km * VOLUME_TOLERANCE:
+        violations.append(
+            f"running sessions sum to {total:g} km, target is {weekly_target.total_volume_km} km (±5%)"
+        )
+
+    for s in runs:
+        if s.day not in available:
+            violations.append(f"{s.run_type} run on {s.day.value}, which is not a running day")
+
+    long_runs = [s for s in runs if s.run_type == "long_run"]
+    if len(long_runs) != 1:
+        violations.append(f"expected exactly one long run, found {len(long_runs)}")
+    for s in long_runs:
+        if s.day != long_run_day:
+            violations.append(f"long run on {s.day.value} instead of {long_run_day.value}")
+        if s.distance_km != weekly_target.long_run_km:
+            violations.append(f"long run is {s.distance_km:g} km instead of {weekly_target.long_run_km} km")
+    return violations
+
+
+def nearest_day(day: m.DayOfWeek, candidates: list[m.DayOfWeek]) -> m.DayOfWeek:
+    index = DAY_ORDER.index(day)
+    return min(candidates, key=lambda d: (abs(DAY_ORDER.index(d) - index), DAY_ORDER.index(d)))
+
+
+def repair_schedule(
+    schedule: m.WeeklySchedule, user_profile: m.UserProfile, weekly_target: WeeklyTarget
+) -> m.WeeklySchedule | None:
+    """
+    Deterministically fixes day placement and arithmetic:
+    1. Exactly one long run (the one on long_run_day, else the longest run).
+    2. The long run moves to long_run_day, swapping with the run already there.
+    3. Runs on unavailable days move to the nearest free running day.
+    4. Distances are rescaled to the exact long run and weekly volume targets.
+    Returns None when the schedule cannot be repaired locally.
+    """
+    if not schedule.running_sessions:
+        return None
+
+    schedule = schedule.model_copy(deep=True)
+    runs = schedule.running_sessions
+    available = [d for d in DAY_ORDER if d in user_profile.logistics.days_available]
+    long_run_day = user_profile.logistics.long_run_day
+
+    # 1. Exactly one long run
+    long_runs = [s for s in runs if s.run_type == "long_run"] or [max(runs, key=lambda s: s.distance_km)]
+    long_run = next((s for s in long_runs if s.day == long_run_day), max(long_runs, key=lambda s: s.distance_km))
+    for s in runs:
+        if s.run_type == "long_run" and s is not long_run:
+            s.run_type = "easy"
+    long_run.run_type = "long_run"
+
+    # 2. Long run on long_run_day
+    if long_run.day != long_run_day:
+        for s in runs:
+            if s.day == long_run_day and s is not long_run:
+                s.day = long_run.day
+        long_run.day = long_run_day
+
+    # 3. Runs only on available days
+    free = [d for d in available if d not in {s.day for s in runs}]
+    for s in runs:
+        if s.day not in available:
+            if not free:
+                return None
+            s.day = nearest_day(s.day, free)
+            free.remove(s.day)
+    runs.sort(key=lambda s: DAY_ORDER.index(s.day))
+
+    # 4. Arithmetic
+    schedule = rescale_schedule(schedule, weekly_target)
+    if schedule_violations(schedule, user_profile, weekly_target):
+        return None
+    return schedule
+
+
+def build_repair_prompt(
+    user_profile: m.UserProfile, weekly_target: WeeklyTarget, schedule: m.WeeklySchedule, violations: list[str]
+) -> str:
+    problems = "\n".join(f"- {v}" for v in violations)
+    return f"""{build_weekly_planner_prompt(user_profile, weekly_target)}
+
+### Previous Attempt
+Your previous schedule broke these rules:
+{problems}
+
+Fix only what is needed to satisfy the rules and keep everything else unchanged:
+{schedule.model_dump_json()}
+"""
+
+
+async def ensure_valid_schedule(
+    user_profile: m.UserProfile,
+    weekly_target: WeeklyTarget,
+    schedule: m.WeeklySchedule,
+    admit: Callable[[], Awaitable[bool]] | None = None,
+) -> m.WeeklySchedule:
+    """
+    Returns a schedule that satisfies the weekly rules: the original if valid,
+    a locally repaired copy if possible, otherwise the agent is asked to fix its
+    own output (up to MAX_REPROMPTS times). Raises ValueError if all of that fails.
+    If `admit` is given it is awaited before each agent call, and raises
+    BudgetExhausted when it refuses.
+    """
+    violations = schedule_violations(schedule, user_profile, weekly_target)
+    if not violations:
+        stats["valid"] += 1
+        return schedule
+
+    for attempt in range(MAX_REPROMPTS + 1):
+        repaired = repair_schedule(schedule, user_profile, weekly_target)
+        if repaired:
+            stats["repaired" if attempt == 0 else "repaired_after_reprompt"] += 1
+            return repaired
+        if attempt == MAX_REPROMPTS:
+            break
+
+        if admit and not await admit():
+            raise BudgetExhausted("Monthly LLM budget exhausted")
+        stats["reprompted"] += 1
+        response = await weekly_agent.run(build_repair_prompt(user_profile, weekly_target, schedule, violations))
+        schedule = response.output
+        schedule.week_number = weekly_target.week_number
+        violations = schedule_violations(schedule, user_profile, weekly_target)
+        if not violations:
+            stats["valid_after_reprompt"] += 1
+            return schedule
+
+    stats["failed"] += 1
+    raise ValueError(f"Week {weekly_target.week_number} schedule is invalid: {'; '.join(violations)}")
+
+
+def repair_report() -> dict:
+    checked = sum(stats.values())
+    return {
+        "checked": checked,
+        "repair_rate": (stats["repaired"] + stats["repaired_after_reprompt"]) / checked if checked else None,
+        "counts": dict(stats),
+    }
@@ -0,0 +1,57 @@
+import os
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import models as m
+from schedule_repair import repair_schedule, schedule_violations
+from weeks_builder import WeeklyTarget
+
+PROFILE = m.UserProfile(
+    name="Test",
+    birth_date=m.UserProfile.birth_date_from_age(30),
+    biological_sex="female",
+    fitness=m.IntermediateFitness(level="intermediate", average_weekly_distance=30, current_longest_run=12),
+    logistics=m.Logistics(days_available=[m.DayOfWeek.TUE, m.DayOfWeek.THU, m.DayOfWeek.SUN], long_run_day=m.DayOfWeek.SUN),
+    goal=m.GeneralGoal(type="base_building"),
+    first_training_date="2025-12-01",
+)
+TARGET = WeeklyTarget(week_number=2, phase_name="Base", is_recovery_week=False, total_volume_km=32, long_run_km=13)
+
+
+def schedule(*runs: tuple[str, str, float]) -> m.WeeklySchedule:
+    return m.WeeklySchedule(
+        week_number=2,
+        phase_name="Base",
+        weekly_volume_target=32,
+        weekly_long_run_target=13,
+        week_overview="",
+        running_sessions=[
+            m.RunningSession(day=day, run_type=run_type, distance_km=km, workout_description="")
+            for day, run_type, km in runs
+        ],
+        strength_sessions=[],
+    )
+
+
+def test_valid_schedule_has_no_violations():
+    valid = schedule(("Tuesday", "easy", 9), ("Thursday", "tempo", 10), ("Sunday", "long_run", 13))
+    assert schedule_violations(valid, PROFILE, TARGET) == []
+
+
+def test_repair_fixes_days_and_arithmetic():
+    broken = schedule(("Monday", "easy", 8), ("Thursday", "tempo", 8), ("Saturday", "long_run", 15))
+    assert len(schedule_violations(broken, PROFILE, TARGET)) == 4
+
+    repaired = repair_schedule(broken, PROFILE, TARGET)
+    assert schedule_violations(repaired, PROFILE, TARGET) == []
+    by_day = {s.day.value: s for s in repaired.running_sessions}
+    assert by_day["Sunday"].run_type == "long_run" and by_day["Sunday"].distance_km == 13
+    assert by_day["Tuesday"].run_type == "easy"
+    assert sum(s.distance_km for s in repaired.running_sessions) == 32
+
+
+def test_repair_gives_up_when_runs_do_not_fit_the_days():
+    crowded = schedule(
+        ("Monday", "easy", 6), ("Tuesday", "easy", 6), ("Thursday", "easy", 7), ("Sunday", "long_run", 13)
+    )
+    assert repair_schedule(crowded, PROFILE, TARGET) is None
@@ -0,0 +1,172 @@
+"""
+Relational storage of generated weeks.
+
+Each week is a weekly_schedules row with its running and strength sessions in
+their own tables, so saving or reading one week touches only that week's rows,
+however long the plan is.
+"""
+import json
+from datetime import date, timedelta
+
+from sqlalchemy import delete, inspect, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import models as m
+from db_models.weekly_schedule import RunningSessionRecord, StrengthSessionRecord, WeeklyScheduleRecord
+
+
+def plan_start_date(first_training_date: str) -> date:
+    """Monday of the week containing first_training_date."""
+    first = date.fromisoformat(first_training_date)
+    return first - timedelta(days=first.weekday())
+
+
+def week_start_date(profile: dict | None, week_number: int) -> date | None:
+    if not profile or not profile.get("first_training_date"):
+        return None
+    return plan_start_date(profile["first_training_date"]) + timedelta(weeks=week_number - 1)
+
+
+def to_record(user_id: int, schedule: m.WeeklySchedule, start_date: date | None) -> WeeklyScheduleRecord:
+    return WeeklyScheduleRecord(
+        user_id=user_id,
+        week_number=schedule.week_number,
+        start_date=start_date,
+        phase_name=schedule.phase_name,
+        weekly_volume_target=schedule.weekly_volume_target,
+        weekly_long_run_target=schedule.weekly_long_run_target,
+        week_overview=schedule.week_overview,
+        running_sessions=[
+            RunningSessionRecord(
+                position=position,
+                day=s.day.value,
+                run_type=s.run_type,
+                distance_km=s.distance_km,
+                workout_description=s.workout_description,
+                notes=s.notes,
+            )
+            for position, s in enumerate(schedule.running_sessions)
+        ],
+        strength_sessions=[
+            StrengthSessionRecord(
+                position=position,
+                day=s.day.value,
+                duration_minutes=s.duration_minutes,
+                exercises=[e.model_dump(mode="json") for e in s.exercises],
+            )
+            for position, s in enumerate(schedule.strength_sessions)
+        ],
+    )
+
+
+def to_schedule(record: WeeklyScheduleRecord) -> m.WeeklySchedule:
+    return m.WeeklySchedule(
+        week_number=record.week_number,
+        phase_name=record.phase_name,
+        weekly_volume_target=record.weekly_volume_target,
+        weekly_long_run_target=record.weekly_long_run_target,
+        week_overview=record.week_overview,
+        running_sessions=[
+            m.RunningSession(
+                day=s.day,
+                run_type=s.run_type,
+                distance_km=s.distance_km,
+                workout_description=s.workout_description,
+                notes=s.notes,
+            )
+            for s in record.running_sessions
+        ],
+        strength_sessions=[
+            m.StrengthSession(day=s.day, duration_minutes=s.duration_minutes, exercises=s.exercises)
+            for s in record.strength_sessions
+        ],
+    )
+
+
+async def save_week(db: AsyncSession, user_id: int, schedule: m.WeeklySchedule, start_date: date | None):
+    """Insert or replace one week. The caller commits."""
+    result = await db.execute(
+        select(WeeklyScheduleRecord).where(
+            WeeklyScheduleRecord.user_id == user_id,
+            WeeklyScheduleRecord.week_number == schedule.week_number,
+        )
+    )
+    existing = result.scalar_one_or_none()
+    if existing:
+        await db.delete(existing)
+        await db.flush()
+    db.add(to_record(user_id, schedule, start_date))
+
+
+async def get_week(db: AsyncSession, user_id: int, week_number: int) -> m.WeeklySchedule | None:
+    result = await db.execute(
+        select(WeeklyScheduleRecord).where(
+            WeeklyScheduleRecord.user_id == user_id,
+            WeeklyScheduleRecord.week_number == week_number,
+        )
+    )
+    record = result.scalar_one_or_none()
+    return to_schedule(record) if record else None
+
+
+async def list_weeks(
+    db: AsyncSession, user_id: int, start: date | None = None, end: date | None = None
+) -> list[m.WeeklySchedule]:
+    """Weeks overlapping [start, end] (both optional), ordered by week number."""
+    query = select(WeeklyScheduleRecord).where(WeeklyScheduleRecord.user_id == user_id)
+    if start:
+        query = query.where(WeeklyScheduleRecord.start_date > start - timedelta(days=7))
+    if end:
+        query = query.where(WeeklyScheduleRecord.start_date <= end)
+    result = await db.execute(query.order_by(WeeklyScheduleRecord.week_number))
+    return [to_schedule(record) for record in result.scalars().all()]
+
+
+async def week_numbers(db: AsyncSession, user_id: int) -> set[int]:
+    result = await db.execute(
+        select(WeeklyScheduleRecord.week_number).where(WeeklyScheduleRecord.user_id == user_id)
+    )
+    return set(result.scalars().all())
+
+
+async def delete_weeks(db: AsyncSession, user_id: int):
+    """Remove every week of a user's plan. The caller commits."""
+    week_ids = select(WeeklyScheduleRecord.id).where(WeeklyScheduleRecord.user_id == user_id)
+    await db.execute(delete(RunningSessionRecord).where(RunningSessionRecord.week_id.in_(week_ids)))
+    await db.execute(delete(StrengthSessionRecord).where(StrengthSessionRecord.week_id.in_(week_ids)))
+    await db.execute(delete(WeeklyScheduleRecord).where(WeeklyScheduleRecord.user_id == user_id))
+
+
+def migrate_json_schedules(conn):
+    """
+    One-off migration of the legacy user_data.weekly_schedules JSON column into
+    the weekly_schedules tables. Migrated rows have the column cleared, so this
+    is a no-op once every user has been moved over.
+    """
+    columns = {column["name"] for column in inspect(conn).get_columns("user_data")}
+    if "weekly_schedules" not in columns:
+        return
+
+    rows = conn.execute(
+        text("SELECT user_id, profile, weekly_schedules FROM user_data WHERE weekly_schedules IS NOT NULL")
+    ).all()
+    session = Session(bind=conn)
+    for user_id, profile, schedules in rows:
+        profile = json.loads(profile) if isinstance(profile, str) else profile
+        schedules = json.loads(schedules) if isinstance(schedules, str) else schedules
+        existing = set(session.scalars(
+            select(WeeklyScheduleRecord.week_number).where(WeeklyScheduleRecord.user_id == user_id)
+        ))
+        migrated = set()
+        for schedule in schedules or []:
+            # Error markers like {"error": "..."} are dropped, weekly_plan_status already says "error"
+            if "week_number" not in schedule or schedule["week_number"] in existing | migrated:
+                continue
+            schedule = m.WeeklySchedule.model_validate(schedule)
+            session.add(to_record(user_id, schedule, week_start_date(profile, schedule.week_number)))
+            migrated.add(schedule.week_number)
+        session.flush()
+        conn.execute(text("UPDATE user_data SET weekly_schedules = NULL WHERE user_id = :user_id"), {"user_id": user_id})
+        print(f"Migrated {len(migrated)} weekly schedule(s) for user {user_id}")
+    session.close()
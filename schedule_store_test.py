@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+from datetime import date
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import models as m
+from models.outputs import Exercise
+import schedule_store
+from database import Base
+from db_models import User, UserData
+
+PROFILE = {"first_training_date": "2030-01-09"}  # a Wednesday, plan starts Monday 2030-01-07
+
+
+def schedule(week_number: int, long_run: float = 12) -> m.WeeklySchedule:
+    return m.WeeklySchedule(
+        week_number=week_number,
+        phase_name="Base",
+        weekly_volume_target=30,
+        weekly_long_run_target=long_run,
+        week_overview="Easy week.",
+        running_sessions=[
+            m.RunningSession(day=m.DayOfWeek.SUN, run_type="long_run", distance_km=long_run, workout_description="Long"),
+            m.RunningSession(day=m.DayOfWeek.TUE, run_type="easy", distance_km=30 - long_run, workout_description="Easy"),
+        ],
+        strength_sessions=[
+            m.StrengthSession(
+                day=m.DayOfWeek.THU,
+                duration_minutes=30,
+                exercises=[Exercise(name="Squat", series=3, reps=10, recovery=60, form_cues="Knees out")],
+            )
+        ],
+    )
+
+
+async def setup(engine) -> tuple[async_sessionmaker, int]:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with factory() as db:
+        user = User(email="test@example.com", hashed_password="x")
+        db.add(user)
+        await db.flush()
+        db.add(UserData(user_id=user.id, profile=PROFILE))
+        await db.commit()
+        return factory, user.id
+
+
+def test_week_start_date():
+    assert schedule_store.week_start_date(PROFILE, 1) == date(2030, 1, 7)
+    assert schedule_store.week_start_date(PROFILE, 3) == date(2030, 1, 21)
+    assert schedule_store.week_start_date({}, 1) is None
+
+
+def test_save_replace_and_query_weeks():
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        factory, user_id = await setup(engine)
+        async with factory() as db:
+            for week in (1, 2, 3):
+                await schedule_store.save_week(db, user_id, schedule(week), schedule_store.week_start_date(PROFILE, week))
+            await db.commit()
+        async with factory() as db:
+            await schedule_store.save_week(db, user_id, schedule(2, long_run=14), schedule_store.week_start_date(PROFILE, 2))
+            await db.commit()
+        async with factory() as db:
+            results = (
+                await schedule_store.get_week(db, user_id, 2),
+                await schedule_store.get_week(db, user_id, 4),
+                await schedule_store.list_weeks(db, user_id),
+                # Thursday of week 1 to Monday of week 2
+                await schedule_store.list_weeks(db, user_id, date(2030, 1, 10), date(2030, 1, 14)),
+                await schedule_store.list_weeks(db, user_id, start=date(2030, 1, 21)),
+            )
+            await schedule_store.delete_weeks(db, user_id)
+            await db.commit()
+            remaining = await schedule_store.week_numbers(db, user_id)
+        await engine.dispose()
+        return results, remaining
+
+    (week_2, missing, all_weeks, first_two, last), remaining = asyncio.run(scenario())
+    assert week_2 == schedule(2, long_run=14)
+    assert missing is None
+    assert [w.week_number for w in all_weeks] == [1, 2, 3]
+    assert all_weeks[0] == schedule(1)
+    assert [w.week_number for w in first_two] == [1, 2]
+    assert [w.week_number for w in last] == [3]
+    assert remaining == set()
+
+
+def test_migrates_legacy_json_column():
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        factory, user_id = await setup(engine)
+        legacy = [schedule(1).model_dump(mode="json"), schedule(2).model_dump(mode="json"), {"error": "boom"}]
+        async with engine.begin() as conn:
+            await conn.execute(text("ALTER TABLE user_data ADD COLUMN weekly_schedules JSON"))
+            await conn.execute(text("UPDATE user_data SET weekly_schedules = :s"), {"s": json.dumps(legacy)})
+        # Running it twice must not duplicate weeks
+        for _ in range(2):
+            async with engine.begin() as conn:
+                await conn.run_sync(schedule_store.migrate_json_schedules)
+        async with factory() as db:
+            weeks = await schedule_store.list_weeks(db, user_id, start=date(2030, 1, 14))
+            column = (await db.execute(text("SELECT weekly_schedules FROM user_data"))).scalar()
+        await engine.dispose()
+        return weeks, column
+
+    weeks, column = asyncio.run(scenario())
+    assert weeks == [schedule(2)]
+    assert column is None
@@ -4,8 +4,13 @@ dotenv.load_dotenv()
 # from pydantic_ai.models.openai import OpenAIChatModel
 # model = OpenAIChatModel("gpt-4o-mini") # can add settings like temperature and max tokens here
 
-from pydantic_ai.models.google import GoogleModel
-model = GoogleModel("gemini-2.5-flash")
+# from pydantic_ai.models.google import GoogleModel
+# model = GoogleModel("gemini-2.5-flash")
+
+# Backends from LLM_BACKENDS, with hedging and failover, recorded or replayed if LLM_CASSETTE is set
+from cassette import with_cassette
+from model_router import build_router
+model = with_cassette(build_router())
 
 import models as m
 
@@ -0,0 +1,77 @@
+"""
+Throughput of activity summaries: summarize_batch over columns vs
+core/parse.summarize_run once per activity.
+
+    uv run summary_bench.py [n_activities]
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+import activity_store
+from activity_summary import summarize_batch
+
+sys.path.insert(0, str(Path(__file__).parent / "core"))
+from parse import summarize_run  # noqa: E402
+
+
+def sample_activities(n: int) -> tuple[list[dict], list[list[dict]]]:
+    rng = random.Random(0)
+    details, splits = [], []
+    for k in range(n):
+        details.append({
+            "activityId": k,
+            "activityName": "Intervals",
+            "summaryDTO": {
+                "startTimeLocal": f"2030-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T07:00:00.0",
+                "startTimeGMT": "2030-01-01T06:00:00.0",
+                "distance": rng.uniform(3000, 30000),
+                "duration": rng.uniform(900, 10800),
+                "averageHR": rng.uniform(120, 170),
+                "maxHR": rng.uniform(160, 195),
+                "elevationGain": rng.uniform(0, 400),
+                "averageRunCadence": rng.uniform(160, 185),
+                "trainingEffect": rng.uniform(1, 5),
+                "aerobicTrainingEffectMessage": "IMPROVING_AEROBIC_BASE_8",
+                "anaerobicTrainingEffectMessage": "NO_ANAEROBIC_BENEFIT_0",
+            },
+        })
+        splits.append([
+            {
+                "type": kind,
+                "distance": rng.uniform(400, 2000),
+                "duration": rng.uniform(90, 600),
+                "averageHR": rng.uniform(120, 185),
+                "averageRunCadence": rng.uniform(160, 190),
+            }
+            for kind in ["INTERVAL_WARMUP", *["INTERVAL_ACTIVE", "INTERVAL_RECOVERY"] * 4, "INTERVAL_COOLDOWN"]
+        ])
+    return details, splits
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    details, splits = sample_activities(n)
+
+    start = time.perf_counter()
+    columns = activity_store.detail_columns(details)
+    split_columns = activity_store.split_columns(details, splits)
+    convert = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = summarize_batch(columns, split_columns)
+    batched = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loop = [summarize_run(detail, detail["activityName"], s) for detail, s in zip(details, splits)]
+    looped = time.perf_counter() - start
+
+    assert batch == loop
+    print(f"{n} activities, {len(split_columns['garmin_id'])} splits")
+    print(f"batch: {batched * 1000:.0f} ms ({n / batched:,.0f} activities/s), dicts to columns {convert * 1000:.0f} ms")
+    print(f"loop:  {looped * 1000:.0f} ms ({n / looped:,.0f} activities/s)")
+
+
+if __name__ == "__main__":
+    main()
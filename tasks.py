@@ -1,187 +1,336 @@
-import textwrap
-from models.inputs import UserProfile
-from model_utils import to_llm_context, get_plan_parameters
-from verifier import agent as verifier_agent
-from macroplanner import agent as macroplanner_agent, TrainingStrategy
-from weeks_builder import (
-    agent as weekly_agent,
-    calculate_weekly_progression,
-    build_weekly_planner_prompt,
-)
+import asyncio
+import os
+from models.inputs import TrainingMetrics, UserProfile
+from models.outputs import ProfileEvaluation
+from verifier import agent as verifier_agent, build_verifier_prompt
+from verifier_rules import evaluate_rules
+from macroplanner import agent as macroplanner_agent, TrainingStrategy, build_strategy_prompt, write_narrative
+from macroplan_solver import solve_strategy, strategy_problems
+from weeks_builder import WeeklyTarget, calculate_weekly_progression, generate_weekly_schedules
 from database import async_session
 from db_models.user_data import UserData
+from events import event_bus
+from jobs import job_queue
+from llm_usage import usage_tracker
+from weekly_templates import weekly_templates
+from schedule_repair import ensure_valid_schedule
+import schedule_store
+import training_load
 from sqlalchemy import select
 
+# How many weeks the weekly planner generates up front: a number, or "all"
+WEEKLY_PLAN_WEEKS = os.environ.get("WEEKLY_PLAN_WEEKS", "1")
+# Maximum concurrent weekly agent calls per user
+WEEKLY_PLAN_CONCURRENCY = int(os.environ.get("WEEKLY_PLAN_CONCURRENCY", 4))
+# How the training strategy is produced:
+# "solver": deterministic phases, targets and texts (no LLM call)
+# "narrative": solver numbers, texts written by the narrative agent
+# "agent": the full macroplanner agent, checked and replaced by the solver if invalid
+MACROPLAN_MODE = os.environ.get("MACROPLAN_MODE", "solver")
+# Stream the weekly agent and push each running session to the client as it completes
+WEEKLY_PLAN_STREAM = os.environ.get("WEEKLY_PLAN_STREAM", "0") == "1"
 
-async def run_verification(user_id: int, profile_dict: dict):
-    """
-    Background task to run the verifier agent on a user profile.
-    Updates the user_data record with the result.
-    If verification passes (outcome=ok), triggers macroplanner.
-    """
-    async with async_session() as db:
-        try:
-            # Reconstruct UserProfile from dict
-            profile = UserProfile.model_validate(profile_dict)
-
-            # Check if verification is needed
-            if not profile.needs_evaluation:
-                result = await db.execute(
-                    select(UserData).where(UserData.user_id == user_id)
-                )
-                user_data = result.scalar_one_or_none()
-                if user_data:
-                    user_data.verification_status = "completed"
-                    user_data.verification_result = {
-                        "outcome": "ok",
-                        "message": "No verification needed for this goal type.",
-                        "proposals": []
-                    }
-                    user_data.macroplan_status = "pending"
-                    await db.commit()
-                # Trigger macroplanner for auto-approved profiles
-                await run_macroplanner(user_id, profile_dict)
-                return
 
-            # Run the verifier
-            llm_context = to_llm_context(profile)
-            evaluation = await verifier_agent.run(
-                f"Here is the user profile:\n{llm_context}"
-            )
+def publish_state(user_id: int, user_data: UserData, *fields: str):
+    """Push the current value of the given UserData fields to the user's event stream."""
+    event_bus.publish(user_id, "state", {field: getattr(user_data, field) for field in fields})
 
-            # Update the database with the result
-            result = await db.execute(
-                select(UserData).where(UserData.user_id == user_id)
-            )
-            user_data = result.scalar_one_or_none()
 
-            if user_data:
-                user_data.verification_status = "completed"
-                user_data.verification_result = evaluation.output.model_dump(mode="json")
-                # If verification passed, trigger macroplanner
-                if evaluation.output.outcome == "ok":
-                    user_data.macroplan_status = "pending"
-                await db.commit()
+async def load_training_metrics(user_id: int) -> TrainingMetrics | None:
+    """Measured training from the user's synced activities, None if they have none recent."""
+    async with async_session() as db:
+        return await training_load.get_metrics(db, user_id)
 
-                # Trigger macroplanner if verification passed
-                if evaluation.output.outcome == "ok":
-                    await run_macroplanner(user_id, profile_dict)
 
-        except Exception as e:
-            # Log error and update status
-            print(f"Verification error for user {user_id}: {e}")
-
-            result = await db.execute(
-                select(UserData).where(UserData.user_id == user_id)
-            )
-            user_data = result.scalar_one_or_none()
-
-            if user_data:
-                user_data.verification_status = "error"
-                user_data.verification_result = {"error": str(e)}
-                await db.commit()
+def weeks_to_generate(weekly_targets: list[WeeklyTarget]) -> list[WeeklyTarget]:
+    if WEEKLY_PLAN_WEEKS == "all":
+        return weekly_targets
+    return weekly_targets[:int(WEEKLY_PLAN_WEEKS)]
 
 
-async def run_macroplanner(user_id: int, profile_dict: dict):
+async def run_verification(user_id: int, profile_dict: dict):
     """
-    Background task to run the macroplanner agent on a user profile.
-    Updates the user_data record with the training_overview.
-    Then triggers first week generation.
+    Job handler running the verifier agent on a user profile.
+    Updates the user_data record with the result.
+    If verification passes (outcome=ok), enqueues the macroplanner.
+    Exceptions propagate so the job queue can retry.
     """
+    # Reconstruct UserProfile from dict
+    profile = UserProfile.model_validate(profile_dict)
+
+    # Check if verification is needed
+    if not profile.needs_evaluation:
+        output = ProfileEvaluation(
+            outcome="ok",
+            message="No verification needed for this goal type.",
+            proposals=[],
+        )
+    else:
+        # Unambiguous profiles are decided by the rules, the rest go to the verifier agent.
+        # No session is open here: the agent call can take seconds.
+        output = evaluate_rules(profile)
+        if output is None:
+            prompt = build_verifier_prompt(profile, await load_training_metrics(user_id))
+            evaluation = await verifier_agent.run(prompt)
+            output = evaluation.output
+
+    # Update the database with the result
     async with async_session() as db:
-        try:
-            # Reconstruct UserProfile from dict
-            profile = UserProfile.model_validate(profile_dict)
+        result = await db.execute(
+            select(UserData).where(UserData.user_id == user_id)
+        )
+        user_data = result.scalar_one_or_none()
+        if not user_data:
+            return
+
+        user_data.verification_status = "completed"
+        user_data.verification_result = output.model_dump(mode="json")
+        # If verification passed, trigger macroplanner
+        if output.outcome == "ok":
+            user_data.macroplan_status = "pending"
+        await db.commit()
+        publish_state(user_id, user_data, "verification_status", "verification_result", "macroplan_status")
+
+    # Trigger macroplanner if verification passed
+    if output.outcome == "ok":
+        await job_queue.enqueue(user_id, "macroplan", {"profile_dict": profile_dict})
+
+
+async def fail_verification(user_id: int, error: str):
+    """Mark verification as failed once the job has exhausted its retries."""
+    print(f"Verification error for user {user_id}: {error}")
 
-            # Get plan parameters
-            params = get_plan_parameters(profile)
-            params["user_profile_json"] = profile.model_dump_json()
+    async with async_session() as db:
+        result = await db.execute(
+            select(UserData).where(UserData.user_id == user_id)
+        )
+        user_data = result.scalar_one_or_none()
 
-            user_prompt = textwrap.dedent("""
-Please generate the Training Strategy for this user:
+        if user_data:
+            user_data.verification_status = "error"
+            user_data.verification_result = {"error": error}
+            await db.commit()
+            publish_state(user_id, user_data, "verification_status", "verification_result")
 
-### Context Variables
-- **Total Weeks Available**: {duration_weeks}
-- **First Week**: {first_week_context}
 
-### User Profile
-{user_profile_json}
-            """.strip().format(**params))
+async def run_macroplanner(user_id: int, profile_dict: dict):
+    """
+    Job handler producing the training strategy for a user profile (see MACROPLAN_MODE).
+    Updates the user_data record with the training_overview.
+    Then enqueues first week generation.
+    """
+    # Reconstruct UserProfile from dict
+    profile = UserProfile.model_validate(profile_dict)
+    metrics = await load_training_metrics(user_id)
+
+    if MACROPLAN_MODE == "agent":
+        user_prompt = build_strategy_prompt(profile, metrics)
+
+        # Run the macroplanner and check its output
+        response = await macroplanner_agent.run(user_prompt)
+        strategy = response.output
+        problems = strategy_problems(strategy, profile)
+        if problems:
+            print(f"Invalid macroplan for user {user_id} ({'; '.join(problems)}), using solver")
+            strategy = solve_strategy(profile, metrics)
+    else:
+        strategy = solve_strategy(profile, metrics)
+        if MACROPLAN_MODE == "narrative":
+            strategy = await write_narrative(profile, strategy, metrics)
+
+    strategy_dict = strategy.model_dump(mode="json")
+
+    # Update the database with the result
+    async with async_session() as db:
+        result = await db.execute(
+            select(UserData).where(UserData.user_id == user_id)
+        )
+        user_data = result.scalar_one_or_none()
+        if not user_data:
+            return
+
+        user_data.macroplan_status = "completed"
+        user_data.training_overview = strategy_dict
+        user_data.weekly_plan_status = "pending"
+        user_data.weekly_statuses = {}
+        await schedule_store.delete_weeks(db, user_id)
+        await db.commit()
+        publish_state(
+            user_id, user_data,
+            "macroplan_status", "training_overview", "weekly_plan_status", "weekly_statuses",
+        )
+    event_bus.publish(user_id, "state", {"weekly_schedules": []})
+
+    # Trigger first week generation, with the starting point the strategy was planned from
+    await job_queue.enqueue(
+        user_id, "weekly", {
+            "profile_dict": profile_dict,
+            "strategy_dict": strategy_dict,
+            "metrics_dict": metrics.model_dump(mode="json") if metrics else None,
+        }
+    )
+
+
+async def fail_macroplanner(user_id: int, error: str):
+    """Mark macroplanning as failed once the job has exhausted its retries."""
+    print(f"Macroplanner error for user {user_id}: {error}")
 
-            # Run the macroplanner
-            strategy = await macroplanner_agent.run(user_prompt)
-            strategy_dict = strategy.output.model_dump(mode="json")
+    async with async_session() as db:
+        result = await db.execute(
+            select(UserData).where(UserData.user_id == user_id)
+        )
+        user_data = result.scalar_one_or_none()
 
-            # Update the database with the result
-            result = await db.execute(
-                select(UserData).where(UserData.user_id == user_id)
-            )
-            user_data = result.scalar_one_or_none()
+        if user_data:
+            user_data.macroplan_status = "error"
+            user_data.training_overview = {"error": error}
+            await db.commit()
+            publish_state(user_id, user_data, "macroplan_status", "training_overview")
 
-            if user_data:
-                user_data.macroplan_status = "completed"
-                user_data.training_overview = strategy_dict
-                user_data.weekly_plan_status = "pending"
-                await db.commit()
 
-                # Trigger first week generation
-                await run_weekly_planner(user_id, profile_dict, strategy_dict)
+async def run_weekly_planner(user_id: int, profile_dict: dict, strategy_dict: dict, metrics_dict: dict | None = None):
+    """
+    Job handler generating the detailed weekly schedules (WEEKLY_PLAN_WEEKS of them).
+    Weeks matching a stored template are rescaled from it; the others are generated
+    concurrently and each one is saved as soon as it is ready.
+    Weeks already saved by a previous attempt are skipped on retry.
+    """
+    # Reconstruct models from dicts
+    profile = UserProfile.model_validate(profile_dict)
+    strategy = TrainingStrategy.model_validate(strategy_dict)
+    metrics = TrainingMetrics.model_validate(metrics_dict) if metrics_dict else None
 
-        except Exception as e:
-            # Log error and update status
-            print(f"Macroplanner error for user {user_id}: {e}")
+    # Calculate weekly progression targets
+    weekly_targets = weeks_to_generate(calculate_weekly_progression(profile, strategy, metrics))
+    if not weekly_targets:
+        raise ValueError("Training strategy has no weeks")
 
+    async with async_session() as db:
+        result = await db.execute(
+            select(UserData).where(UserData.user_id == user_id)
+        )
+        user_data = result.scalar_one_or_none()
+        if not user_data:
+            return
+
+        done = await schedule_store.week_numbers(db, user_id)
+        user_data.weekly_statuses = {
+            str(t.week_number): "completed" if t.week_number in done else "pending"
+            for t in weekly_targets
+        }
+        await db.commit()
+        publish_state(user_id, user_data, "weekly_statuses")
+    # Sessions streamed by a previous attempt may not be those of the schedules this one saves
+    event_bus.publish(user_id, "state", {"session_previews": {}})
+
+    # Saves run concurrently, serialize them so weekly_statuses updates don't overwrite each other
+    lock = asyncio.Lock()
+
+    async def save_week(weekly_target: WeeklyTarget, schedule):
+        async with lock, async_session() as db:
             result = await db.execute(
                 select(UserData).where(UserData.user_id == user_id)
             )
             user_data = result.scalar_one_or_none()
+            if not user_data:
+                return
 
-            if user_data:
-                user_data.macroplan_status = "error"
-                user_data.training_overview = {"error": str(e)}
-                await db.commit()
-
+            start_date = schedule_store.week_start_date(profile_dict, weekly_target.week_number)
+            await schedule_store.save_week(db, user_id, schedule, start_date)
+            user_data.weekly_statuses = {
+                **(user_data.weekly_statuses or {}),
+                str(weekly_target.week_number): "completed",
+            }
+            await db.commit()
+
+        event_bus.publish(user_id, "week", {
+            "week_number": weekly_target.week_number,
+            "status": "completed",
+            "schedule": schedule.model_dump(mode="json"),
+        })
+
+    async def save_generated_week(weekly_target: WeeklyTarget, schedule):
+        await save_week(weekly_target, schedule)
+        await weekly_templates.add(profile, weekly_target, schedule)
+
+    # Serve weeks from the template library where possible, only ask the agent on misses
+    remaining = []
+    for weekly_target in weekly_targets:
+        if weekly_target.week_number in done:
+            continue
+        schedule = await weekly_templates.find(profile, weekly_target)
+        if schedule:
+            await save_week(weekly_target, schedule)
+        else:
+            remaining.append(weekly_target)
+
+    async def publish_session(weekly_target: WeeklyTarget, session):
+        event_bus.publish(user_id, "session", {
+            "week_number": weekly_target.week_number,
+            "session": session.model_dump(mode="json"),
+        })
+
+    async def within_budget() -> bool:
+        return await usage_tracker.admit(user_id)
+
+    async def validate_week(weekly_target: WeeklyTarget, schedule):
+        return await ensure_valid_schedule(profile, weekly_target, schedule, admit=within_budget)
+
+    # The job queue admitted the job once; with many weeks the budget can run out
+    # part way, so it is checked again before each agent call, repair re-prompts included
+    results = await generate_weekly_schedules(
+        profile,
+        remaining,
+        concurrency=WEEKLY_PLAN_CONCURRENCY,
+        on_complete=save_generated_week,
+        on_session=publish_session if WEEKLY_PLAN_STREAM else None,
+        admit=within_budget,
+        validate=validate_week,
+    )
+    failed = {week: r for week, r in results.items() if isinstance(r, Exception)}
 
-async def run_weekly_planner(user_id: int, profile_dict: dict, strategy_dict: dict):
+    async with async_session() as db:
+        result = await db.execute(
+            select(UserData).where(UserData.user_id == user_id)
+        )
+        user_data = result.scalar_one_or_none()
+        if not user_data:
+            return
+
+        user_data.weekly_statuses = {
+            **(user_data.weekly_statuses or {}),
+            **{str(week): "error" for week in failed},
+        }
+        if not failed:
+            user_data.weekly_plan_status = "completed"
+        await db.commit()
+        publish_state(user_id, user_data, "weekly_plan_status", "weekly_statuses")
+
+    if failed:
+        week, error = next(iter(failed.items()))
+        raise RuntimeError(f"{len(failed)} week(s) failed, week {week}: {error}")
+
+
+async def fail_weekly_planner(user_id: int, error: str):
     """
-    Background task to generate the first week's detailed schedule.
+    Mark weekly planning as failed once the job has exhausted its retries.
+    Weeks that were generated successfully are kept, the failed ones are marked
+    "error" in weekly_statuses.
     """
-    async with async_session() as db:
-        try:
-            # Reconstruct models from dicts
-            profile = UserProfile.model_validate(profile_dict)
-            strategy = TrainingStrategy.model_validate(strategy_dict)
+    print(f"Weekly planner error for user {user_id}: {error}")
 
-            # Calculate weekly progression targets
-            weekly_targets = calculate_weekly_progression(profile, strategy)
-
-            # Get first week target
-            first_week_target = weekly_targets[0]
-
-            # Build prompt and run agent
-            prompt = build_weekly_planner_prompt(profile, first_week_target)
-            weekly_schedule = await weekly_agent.run(prompt)
-
-            # Update database
-            result = await db.execute(
-                select(UserData).where(UserData.user_id == user_id)
-            )
-            user_data = result.scalar_one_or_none()
-
-            if user_data:
-                user_data.weekly_plan_status = "completed"
-                user_data.weekly_schedules = [weekly_schedule.output.model_dump(mode="json")]
-                await db.commit()
+    async with async_session() as db:
+        result = await db.execute(
+            select(UserData).where(UserData.user_id == user_id)
+        )
+        user_data = result.scalar_one_or_none()
 
-        except Exception as e:
-            print(f"Weekly planner error for user {user_id}: {e}")
+        if user_data:
+            user_data.weekly_plan_status = "error"
+            await db.commit()
+            publish_state(user_id, user_data, "weekly_plan_status")
 
-            result = await db.execute(
-                select(UserData).where(UserData.user_id == user_id)
-            )
-            user_data = result.scalar_one_or_none()
 
-            if user_data:
-                user_data.weekly_plan_status = "error"
-                user_data.weekly_schedules = [{"error": str(e)}]
-                await db.commit()
+job_queue.register("verification", run_verification, on_failure=fail_verification)
+job_queue.register("macroplan", run_macroplanner, on_failure=fail_macroplanner)
+job_queue.register("weekly", run_weekly_planner, on_failure=fail_weekly_planner)
@@ -0,0 +1,125 @@
+"""
+Training load and fitness metrics measured from synced activities.
+
+Stored activities are folded into per-day totals (training_load_days) as they
+are saved, so a sync only touches the days of its new activities. Metrics are
+computed from the last WINDOW_DAYS of those totals, whatever the length of the
+history.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models as m
+from db_models.activity import Activity
+from db_models.training_load import TrainingLoadDay
+
+# Garmin typeKeys counted as runs for volume, long run and pace
+RUNNING_TYPES = frozenset({
+    "running", "trail_running", "treadmill_running", "track_running", "indoor_running", "street_running",
+    "ultra_run", "virtual_run",
+})
+
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+LONG_RUN_DAYS = 42
+# Pace trend compares the chronic window with the one before it
+WINDOW_DAYS = 2 * CHRONIC_DAYS
+
+
+def activity_load(activity: Activity) -> float:
+    # Garmin's training load when the device reports one, otherwise minutes of activity
+    if activity.training_load is not None:
+        return activity.training_load
+    return (activity.duration_s or 0) / 60
+
+
+async def add_activities(db: AsyncSession, user_id: int, activities: list[Activity]):
+    """Adds newly stored activities to their days' totals. The caller commits."""
+    by_day = defaultdict(list)
+    for activity in activities:
+        by_day[activity.start_time_local.date()].append(activity)
+    if not by_day:
+        return
+
+    result = await db.execute(
+        select(TrainingLoadDay).where(TrainingLoadDay.user_id == user_id, TrainingLoadDay.day.in_(list(by_day)))
+    )
+    days = {row.day: row for row in result.scalars().all()}
+    for day, day_activities in by_day.items():
+        row = days.get(day)
+        if row is None:
+            row = TrainingLoadDay(
+                user_id=user_id, day=day, run_count=0, run_distance_km=0, run_duration_s=0, longest_run_km=0,
+                activity_count=0, load=0,
+            )
+            db.add(row)
+        for activity in day_activities:
+            row.activity_count += 1
+            row.load += activity_load(activity)
+            if activity.activity_type in RUNNING_TYPES:
+                distance_km = (activity.distance_m or 0) / 1000
+                row.run_count += 1
+                row.run_distance_km += distance_km
+                row.run_duration_s += activity.duration_s or 0
+                row.longest_run_km = max(row.longest_run_km, distance_km)
+
+
+async def rebuild(db: AsyncSession, user_id: int):
+    """Recomputes a user's daily totals from all their stored activities. The caller commits."""
+    await db.execute(delete(TrainingLoadDay).where(TrainingLoadDay.user_id == user_id))
+    result = await db.execute(select(Activity).where(Activity.user_id == user_id))
+    await add_activities(db, user_id, list(result.scalars().all()))
+
+
+def compute_metrics(days: list[TrainingLoadDay], as_of: date) -> m.TrainingMetrics | None:
+    """Metrics from the daily totals of the WINDOW_DAYS up to as_of, None without any activity in it."""
+    # Index 0 is as_of, WINDOW_DAYS - 1 the oldest day
+    offsets = np.array([(as_of - day.day).days for day in days], dtype=np.int64)
+    inside = (offsets >= 0) & (offsets < WINDOW_DAYS)
+    if not inside.any():
+        return None
+
+    def column(name: str) -> np.ndarray:
+        values = np.zeros(WINDOW_DAYS)
+        values[offsets[inside]] = np.array([getattr(day, name) for day in days], dtype=np.float64)[inside]
+        return values
+
+    distance, duration, runs = column("run_distance_km"), column("run_duration_s"), column("run_count")
+    longest, load = column("longest_run_km"), column("load")
+    chronic_weeks = CHRONIC_DAYS // 7
+
+    acute_load = load[:ACUTE_DAYS].sum()
+    chronic_load = load[:CHRONIC_DAYS].sum() / chronic_weeks
+    recent_distance, previous_distance = distance[:CHRONIC_DAYS].sum(), distance[CHRONIC_DAYS:].sum()
+    pace = duration[:CHRONIC_DAYS].sum() / recent_distance if recent_distance else None
+    previous_pace = duration[CHRONIC_DAYS:].sum() / previous_distance if previous_distance else None
+
+    return m.TrainingMetrics(
+        as_of=as_of,
+        weeks_of_data=int((runs[:CHRONIC_DAYS].reshape(chronic_weeks, 7).sum(axis=1) > 0).sum()),
+        weekly_volume_km=round(recent_distance / chronic_weeks, 1),
+        last_week_volume_km=round(distance[:ACUTE_DAYS].sum(), 1),
+        longest_run_km=round(longest[:LONG_RUN_DAYS].max(), 1),
+        runs_per_week=round(runs[:CHRONIC_DAYS].sum() / chronic_weeks, 1),
+        acute_load=round(acute_load, 1),
+        chronic_load=round(chronic_load, 1),
+        acute_chronic_ratio=round(acute_load / chronic_load, 2) if chronic_load else None,
+        pace_s_per_km=round(pace) if pace else None,
+        pace_trend_s_per_km=round(pace - previous_pace) if pace and previous_pace else None,
+    )
+
+
+async def get_metrics(db: AsyncSession, user_id: int, as_of: date | None = None) -> m.TrainingMetrics | None:
+    as_of = as_of or date.today()
+    result = await db.execute(
+        select(TrainingLoadDay).where(
+            TrainingLoadDay.user_id == user_id,
+            TrainingLoadDay.day > as_of - timedelta(days=WINDOW_DAYS),
+            TrainingLoadDay.day <= as_of,
+        )
+    )
+    return compute_metrics(list(result.scalars().all()), as_of)
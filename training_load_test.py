@@ -0,0 +1,131 @@
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import activity_store
+import models as m
+import shared
+import training_load
+import weeks_builder as wb
+from database import Base
+from db_models import TrainingLoadDay, User
+from macroplan_solver import solve_strategy
+from model_utils import to_llm_context
+
+AS_OF = date(2030, 3, 31)
+
+
+def activity(garmin_id: int, days_ago: int, km: float, pace_s: float = 360, type_key: str = "running", load=None):
+    start = datetime.combine(AS_OF - timedelta(days=days_ago), datetime.min.time()) + timedelta(hours=7)
+    summary = {
+        "startTimeLocal": start.isoformat(),
+        "startTimeGMT": start.isoformat(),
+        "distance": km * 1000,
+        "duration": km * pace_s,
+    }
+    if load is not None:
+        summary["activityTrainingLoad"] = load
+    return {"activityId": garmin_id, "activityTypeDTO": {"typeKey": type_key}, "summaryDTO": summary}
+
+
+# Four weeks of 3 runs (8, 10 and a long run) at 6:00/km, a ride, and slower running before that
+HISTORY = [
+    *(
+        activity(week * 10 + k, week * 7 + k * 2, km, load=50.0)
+        for week in range(4)
+        for k, km in enumerate([8, 10, 14 + week])
+    ),
+    activity(100, 3, 40, pace_s=120, type_key="cycling", load=80.0),
+    *(activity(200 + k, 29 + k * 3, 10, pace_s=390) for k in range(8)),
+]
+
+
+def metrics_after(*batches: list[dict]) -> tuple[m.TrainingMetrics, list[tuple], list[tuple]]:
+    """Metrics after storing the batches one sync at a time, with the daily totals before and after a rebuild."""
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, expire_on_commit=False)
+        async with factory() as db:
+            user = User(email="runner@example.com", hashed_password="x")
+            db.add(user)
+            await db.commit()
+
+        def totals(rows):
+            return sorted((r.day, r.run_count, round(r.run_distance_km, 6), r.longest_run_km, round(r.load, 6)) for r in rows)
+
+        for batch in batches:
+            async with factory() as db:
+                await activity_store.save_activities(
+                    db, user.id, [activity_store.to_record(user.id, d, None) for d in batch]
+                )
+                await db.commit()
+        async with factory() as db:
+            metrics = await training_load.get_metrics(db, user.id, AS_OF)
+            incremental = totals((await db.execute(select(TrainingLoadDay))).scalars().all())
+            await training_load.rebuild(db, user.id)
+            await db.commit()
+            rebuilt = totals((await db.execute(select(TrainingLoadDay))).scalars().all())
+        await engine.dispose()
+        return metrics, incremental, rebuilt
+
+    return asyncio.run(scenario())
+
+
+def test_metrics_from_history():
+    metrics, _, _ = metrics_after(HISTORY)
+    assert metrics.weeks_of_data == 4
+    # (8 + 10 + 14..17) per week, averaged
+    assert metrics.weekly_volume_km == 33.5
+    assert metrics.last_week_volume_km == 32
+    assert metrics.longest_run_km == 17
+    assert metrics.runs_per_week == 3
+    # 3 runs and the ride in the last 7 days, 12 runs and the ride over 4 weeks
+    assert metrics.acute_load == 230
+    assert metrics.chronic_load == 170
+    assert metrics.acute_chronic_ratio == 1.35
+    assert metrics.pace_s_per_km == 360
+    assert metrics.pace_trend_s_per_km == -30
+
+
+def test_incremental_updates_match_rebuild():
+    # The same activities arriving over several syncs, some of them twice
+    metrics, incremental, rebuilt = metrics_after(HISTORY[10:], HISTORY[:5], HISTORY[3:10])
+    assert incremental == rebuilt
+    assert metrics == metrics_after(HISTORY)[0]
+
+
+def test_no_recent_activities():
+    metrics, _, _ = metrics_after([activity(1, 90, 10)])
+    assert metrics is None
+    assert training_load.compute_metrics([], AS_OF) is None
+
+
+def test_measured_values_feed_the_plan():
+    metrics = m.TrainingMetrics(
+        as_of=AS_OF, weeks_of_data=4, weekly_volume_km=22.0, last_week_volume_km=24.0, longest_run_km=9.0,
+        runs_per_week=3.0, acute_load=200.0, chronic_load=180.0, acute_chronic_ratio=1.11,
+        pace_s_per_km=365, pace_trend_s_per_km=-8,
+    )
+    profile = shared.test_profile
+    assert wb.get_starting_values(profile, metrics) == (22.0, 9.0)
+    assert wb.get_starting_values(profile, metrics.model_copy(update={"weeks_of_data": 2})) == (35.0, 14.0)
+
+    strategy = solve_strategy(profile, metrics)
+    measured = wb.calculate_weekly_progression(profile, strategy, metrics)
+    reported = wb.calculate_weekly_progression(profile, strategy)
+    assert measured[0].total_volume_km < reported[0].total_volume_km
+    assert measured[-1] == reported[-1]
+
+    context = to_llm_context(profile, metrics)
+    assert "## Measured Training (synced activities up to 2030-03-31)" in context
+    assert "- **Avg Weekly Volume (4 weeks)**: 22.0 km over 3.0 runs/week" in context
+    assert "- **Avg Pace (4 weeks)**: 6:05 min/km (8 s/km faster than the 4 weeks before)" in context
+    assert "Measured Training" not in to_llm_context(profile)
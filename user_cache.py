@@ -0,0 +1,104 @@
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import event
+
+from db_models.user import User
+
+USER_CACHE_ENABLED = os.environ.get("AUTH_USER_CACHE_ENABLED", "1") == "1"
+USER_CACHE_TTL_SECONDS = float(os.environ.get("AUTH_USER_CACHE_TTL_SECONDS", 300))
+USER_CACHE_MAX_ENTRIES = int(os.environ.get("AUTH_USER_CACHE_MAX_ENTRIES", 10000))
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    id: int
+    email: str
+    created_at: datetime | None
+    expires_at: float
+
+    def to_user(self) -> User:
+        # Transient instance: request handlers only read id and email
+        return User(id=self.id, email=self.email, created_at=self.created_at)
+
+
+class UserCache:
+    """
+    In-process TTL + LRU cache of authenticated users keyed by user id, so
+    get_current_user does not query the users table on every request.
+    Updates and deletes of a User invalidate its entry (see the mapper events
+    below); entries also expire after `ttl_seconds`.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = USER_CACHE_TTL_SECONDS,
+        max_entries: int = USER_CACHE_MAX_ENTRIES,
+        enabled: bool = USER_CACHE_ENABLED,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._entries: OrderedDict[int, CachedUser] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int) -> User | None:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(user_id)
+        if entry is None or entry.expires_at < time.monotonic():
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry.to_user()
+
+    def put(self, user: User):
+        if not self.enabled:
+            return
+        self._entries[user.id] = CachedUser(
+            id=user.id,
+            email=user.email,
+            created_at=user.created_at,
+            expires_at=time.monotonic() + self.ttl_seconds,
+        )
+        self._entries.move_to_end(user.id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id: int):
+        if self._entries.pop(user_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+user_cache = UserCache()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def invalidate_cached_user(mapper, connection, target: User):
+    user_cache.invalidate(target.id)
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import auth
+from auth import create_access_token, get_current_user
+from database import Base
+from db_models import User
+from user_cache import UserCache, user_cache
+
+
+def make_user(user_id: int) -> User:
+    return User(id=user_id, email=f"user{user_id}@example.com")
+
+
+def test_get_put_and_lru_eviction():
+    cache = UserCache(ttl_seconds=60, max_entries=2)
+    assert cache.get(1) is None
+    cache.put(make_user(1))
+    cache.put(make_user(2))
+    assert cache.get(1).email == "user1@example.com"
+    # 2 is now the least recently used entry
+    cache.put(make_user(3))
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and cache.get(3) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire():
+    cache = UserCache(ttl_seconds=-1, max_entries=10)
+    cache.put(make_user(1))
+    assert cache.get(1) is None
+
+
+def test_disabled_cache_stores_nothing():
+    cache = UserCache(enabled=False)
+    cache.put(make_user(1))
+    assert cache.get(1) is None
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.fixture
+def factory():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    user_cache.clear()
+    yield async_sessionmaker(engine, expire_on_commit=False), engine
+    user_cache.clear()
+    asyncio.run(engine.dispose())
+
+
+def test_get_current_user_uses_cache_until_user_changes(factory):
+    factory, engine = factory
+
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with factory() as db:
+            user = User(email="test@example.com", hashed_password="x")
+            db.add(user)
+            await db.commit()
+        token = create_access_token(user.id)
+
+        async with factory() as db:
+            first = await get_current_user(token, db)
+        # Remove the row behind the ORM's back: a cached user still authenticates
+        async with engine.begin() as conn:
+            await conn.execute(text("DELETE FROM users"))
+        async with factory() as db:
+            cached = await get_current_user(token, db)
+
+        # An ORM update invalidates the entry, so the next lookup hits the database
+        async with factory() as db:
+            db.add(User(id=user.id, email="test@example.com", hashed_password="x"))
+            await db.commit()
+        async with factory() as db:
+            stored = await db.get(User, user.id)
+            stored.email = "new@example.com"
+            await db.commit()
+        async with factory() as db:
+            updated = await get_current_user(token, db)
+        return first, cached, updated
+
+    first, cached, updated = asyncio.run(scenario())
+    assert first.email == cached.email == "test@example.com"
+    assert updated.email == "new@example.com"
+
+
+def test_token_claims_mode_skips_lookup(monkeypatch, factory):
+    factory, _ = factory
+    monkeypatch.setattr(auth, "TRUST_TOKEN_CLAIMS", True)
+
+    async def scenario():
+        # No tables exist, so any query would fail
+        async with factory() as db:
+            return await get_current_user(create_access_token(7, "claims@example.com"), db)
+
+    user = asyncio.run(scenario())
+    assert (user.id, user.email) == (7, "claims@example.com")
+
+
+def test_invalid_token_is_rejected(factory):
+    factory, _ = factory
+
+    async def scenario():
+        async with factory() as db:
+            await get_current_user("not-a-token", db)
+
+    with pytest.raises(HTTPException):
+        asyncio.run(scenario())
@@ -1,5 +1,7 @@
 import models as m
 import shared
+from llm_cache import CachedAgent
+from model_utils import compact_profile
 from pydantic_ai import Agent
 import textwrap
 
@@ -54,9 +56,16 @@ You must output a JSON object with:
 Analyze the data below and generate the verification result.
 """.strip())
 
-agent = Agent(
-    model=shared.model,
-    output_type=m.ProfileEvaluation,
-    instructions=verifier_prompt
+agent = CachedAgent(
+    Agent(
+        model=shared.model,
+        output_type=m.ProfileEvaluation,
+        instructions=verifier_prompt
+    ),
+    name="verifier",
+    instructions=verifier_prompt,
 )
 
+
+def build_verifier_prompt(profile: m.UserProfile, metrics: m.TrainingMetrics | None = None) -> str:
+    return f"Here is the user profile:\n{compact_profile(profile, metrics)}"
@@ -0,0 +1,182 @@
+"""
+Deterministic fast path for the verifier.
+
+Evaluates the numeric rules of the verifier prompt directly on the UserProfile.
+Unambiguous profiles get a ProfileEvaluation instantly; borderline ones (tight
+timelines, aggressive ramp-ups, injury notes, older runners chasing a time)
+return None and are escalated to the verifier agent.
+"""
+import os
+from collections import Counter
+from datetime import timedelta
+
+import models as m
+from macroplan_solver import solve_phases, solve_targets
+from models.enums import RiskValuation
+from models.outputs import Proposal
+from weeks_builder import get_starting_values
+
+FAST_PATH_ENABLED = os.environ.get("VERIFIER_FAST_PATH", "1") == "1"
+
+# Minimum weeks of training, by race type and fitness level
+MIN_WEEKS = {
+    ("marathon", "beginner"): 16,
+    ("marathon", "intermediate"): 12,
+    ("marathon", "advanced"): 12,
+    ("half_marathon", "beginner"): 10,
+    ("half_marathon", "intermediate"): 8,
+    ("half_marathon", "advanced"): 8,
+}
+# Timelines within this many weeks above the minimum are judged by the agent
+BORDERLINE_WEEKS = 2
+MARATHON_MIN_DAYS = 3
+PB_AGE_THRESHOLD = 55
+# The "10% rule": weekly volume growth needed to reach the race's peak volume
+# above which the agent judges whether the ramp-up is too aggressive
+MAX_WEEKLY_RAMP = 0.10
+SHORTER_RACE = {"marathon": "half_marathon", "half_marathon": "10k"}
+RACE_NAMES = {"5k": "5k", "10k": "10k", "half_marathon": "half marathon", "marathon": "marathon"}
+
+stats = Counter()
+
+
+def required_weekly_ramp(profile: m.UserProfile) -> float:
+    """
+    Average weekly volume growth from the current volume to the planned peak,
+    over the Base and Build weeks the timeline leaves (the peak is reached when
+    the Peak phase starts).
+    """
+    start_vol, _ = get_starting_values(profile)
+    if start_vol <= 0:
+        return float("inf")  # Starting from nothing: for the agent to judge
+    peak_vol, _ = solve_targets(profile)
+    if peak_vol <= start_vol:
+        return 0.0
+    weeks = sum(weeks for name, weeks in solve_phases(profile) if name in ("Base", "Build"))
+    if weeks == 0:
+        return float("inf")
+    return (peak_vol / start_vol) ** (1 / weeks) - 1
+
+
+def escalation_reason(profile: m.UserProfile) -> str | None:
+    """Returns why the profile needs the agent's judgement, or None if the rules suffice."""
+    goal = profile.goal
+    if profile.injury_history and profile.injury_history.strip():
+        return "injury_history"
+    if profile.age > PB_AGE_THRESHOLD and goal.goal_type != "finish":
+        return "age_performance_goal"
+
+    min_weeks = MIN_WEEKS.get((goal.type, profile.fitness.level))
+    if min_weeks and goal.race_date:
+        if profile.duration_weeks < min_weeks:
+            return None  # Rejected by the rules
+        if profile.duration_weeks < min_weeks + BORDERLINE_WEEKS:
+            return "tight_timeline"
+    if required_weekly_ramp(profile) > MAX_WEEKLY_RAMP:
+        return "aggressive_ramp"
+    return None
+
+
+def timeline_proposals(profile: m.UserProfile, min_weeks: int) -> list[Proposal]:
+    goal = profile.goal
+    new_date = profile.plan_start_date + timedelta(weeks=min_weeks + BORDERLINE_WEEKS - 1)
+    proposals = [
+        Proposal(
+            description=f"Move the race to {new_date.strftime('%d %B %Y')} or later",
+            reason=f"A {RACE_NAMES[goal.type]} needs at least {min_weeks} weeks of preparation at your level.",
+            new_goal=goal.model_copy(update={"race_date": new_date}),
+        )
+    ]
+
+    shorter = SHORTER_RACE.get(goal.type)
+    shorter_min = MIN_WEEKS.get((shorter, profile.fitness.level), 0)
+    if shorter and profile.duration_weeks >= shorter_min:
+        proposals.append(Proposal(
+            description=f"Run a {RACE_NAMES[shorter]} on the same date",
+            reason=f"{profile.duration_weeks} weeks are enough to prepare a {RACE_NAMES[shorter]} safely.",
+            new_goal=m.RaceGoal(
+                type=shorter,
+                goal_type="finish",
+                race_date=goal.race_date,
+            ),
+        ))
+    return proposals
+
+
+def evaluate_rules(profile: m.UserProfile) -> m.ProfileEvaluation | None:
+    """
+    Applies the verifier's hard rules. Returns None when the case is borderline
+    and should be escalated to the verifier agent.
+    """
+    if not FAST_PATH_ENABLED:
+        return None
+
+    goal = profile.goal
+    if not isinstance(goal, m.RaceGoal):
+        # General fitness goals only need review for injuries
+        reason = "injury_history" if profile.injury_history else None
+    else:
+        reason = escalation_reason(profile)
+    if reason:
+        stats[f"escalated_{reason}"] += 1
+        return None
+
+    messages: list[str] = []
+    proposals: list[Proposal] = []
+    outcome = RiskValuation.OK
+
+    if isinstance(goal, m.RaceGoal):
+        days = len(profile.logistics.days_available)
+        min_weeks = MIN_WEEKS.get((goal.type, profile.fitness.level))
+
+        if min_weeks and goal.race_date and profile.duration_weeks < min_weeks:
+            outcome = RiskValuation.REJECTED
+            messages.append(
+                f"{profile.duration_weeks} weeks is not enough time to prepare a {RACE_NAMES[goal.type]} "
+                f"safely; at your level we recommend at least {min_weeks} weeks."
+            )
+            proposals.extend(timeline_proposals(profile, min_weeks))
+
+        if goal.type == "marathon" and days < MARATHON_MIN_DAYS:
+            outcome = RiskValuation.REJECTED
+            messages.append(
+                f"Training for a marathon on {days} day(s) per week carries a high injury risk; "
+                f"at least {MARATHON_MIN_DAYS} running days are needed."
+            )
+            proposals.append(Proposal(
+                description=f"Run {MARATHON_MIN_DAYS} days per week",
+                reason="Spreading the volume over more days keeps each run manageable.",
+                new_days_per_week=MARATHON_MIN_DAYS,
+            ))
+        elif goal.type == "marathon" and days == MARATHON_MIN_DAYS:
+            if outcome == RiskValuation.OK:
+                outcome = RiskValuation.WARNING
+            messages.append(
+                "A marathon on 3 days per week is possible, but it leaves little margin "
+                "if you miss a session."
+            )
+            proposals.append(Proposal(
+                description="Add a fourth running day",
+                reason="An extra easy run makes the weekly volume easier to absorb.",
+                new_days_per_week=MARATHON_MIN_DAYS + 1,
+            ))
+
+    if outcome == RiskValuation.OK:
+        messages.append("Your goal is realistic for your current fitness, schedule and timeline. Let's get started!")
+        proposals = []
+
+    stats[f"fast_path_{outcome.value}"] += 1
+    return m.ProfileEvaluation(message=" ".join(messages), outcome=outcome, proposals=proposals)
+
+
+def fast_path_report() -> dict:
+    """How often the fast path answered, and why the remaining profiles were escalated."""
+    fast = sum(v for k, v in stats.items() if k.startswith("fast_path_"))
+    escalated = sum(v for k, v in stats.items() if k.startswith("escalated_"))
+    total = fast + escalated
+    return {
+        "enabled": FAST_PATH_ENABLED,
+        "total": total,
+        "fast_path_rate": fast / total if total else None,
+        "counts": dict(stats),
+    }
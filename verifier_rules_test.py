@@ -0,0 +1,78 @@
+from datetime import date, timedelta
+
+import models as m
+from verifier_rules import evaluate_rules, required_weekly_ramp
+
+START = date(2030, 1, 7)  # a Monday
+DAYS_3 = [m.DayOfWeek.TUE, m.DayOfWeek.THU, m.DayOfWeek.SUN]
+DAYS_4 = [m.DayOfWeek.MON, m.DayOfWeek.WED, m.DayOfWeek.FRI, m.DayOfWeek.SUN]
+
+
+def make_profile(race_type: str, weeks: int, level: str = "intermediate", days=DAYS_4, injury: str | None = None):
+    if level == "beginner":
+        fitness = m.BeginnerFitness(level="beginner", general_activity_level="lightly_active", can_run_nonstop_30min="yes")
+    else:
+        fitness = m.IntermediateFitness(level=level, average_weekly_distance=30, current_longest_run=12)
+    return m.UserProfile(
+        name="Test",
+        birth_date=m.UserProfile.birth_date_from_age(35),
+        biological_sex="male",
+        injury_history=injury,
+        fitness=fitness,
+        logistics=m.Logistics(days_available=days, long_run_day=m.DayOfWeek.SUN),
+        goal=m.RaceGoal(type=race_type, goal_type="finish", race_date=START + timedelta(weeks=weeks - 1, days=6)),
+        first_training_date=START,
+    )
+
+
+def test_short_marathon_timeline_is_rejected_with_proposals():
+    profile = make_profile("marathon", weeks=10, level="beginner")
+    assert profile.duration_weeks == 10
+
+    evaluation = evaluate_rules(profile)
+    assert evaluation.outcome == "rejected"
+    new_goals = [p.new_goal for p in evaluation.proposals]
+    assert new_goals[0].type == "marathon" and new_goals[0].race_date > profile.goal.race_date
+    assert new_goals[1].type == "half_marathon" and new_goals[1].race_date == profile.goal.race_date
+
+
+def test_marathon_on_two_days_is_rejected():
+    evaluation = evaluate_rules(make_profile("marathon", weeks=20, days=DAYS_3[:2]))
+    assert evaluation.outcome == "rejected"
+    assert evaluation.proposals[0].new_days_per_week == 3
+
+
+def test_marathon_on_three_days_is_a_warning():
+    evaluation = evaluate_rules(make_profile("marathon", weeks=20, days=DAYS_3))
+    assert evaluation.outcome == "warning"
+
+
+def test_comfortable_half_marathon_is_ok():
+    evaluation = evaluate_rules(make_profile("half_marathon", weeks=20))
+    assert evaluation.outcome == "ok"
+    assert evaluation.proposals == []
+
+
+def test_borderline_cases_are_escalated():
+    assert evaluate_rules(make_profile("marathon", weeks=12)) is None
+    assert evaluate_rules(make_profile("half_marathon", weeks=20, injury="Stress fracture 2 months ago")) is None
+
+
+def test_aggressive_ramp_up_is_escalated():
+    # 15 km a week now, 32 km at the peak: 7 weeks of Base and Build need +11.4% a week
+    steep = make_profile("half_marathon", weeks=12, level="beginner")
+    assert round(required_weekly_ramp(steep), 3) == 0.114
+    assert evaluate_rules(steep) is None
+    # 15 weeks to get there: +5.2% a week
+    gradual = make_profile("half_marathon", weeks=20, level="beginner")
+    assert round(required_weekly_ramp(gradual), 3) == 0.052
+    assert evaluate_rules(gradual).outcome == "ok"
+    # No minimum timeline for a 10k, but no weeks to build up either
+    assert evaluate_rules(make_profile("10k", weeks=3, level="beginner")) is None
+
+
+def test_no_current_volume_is_escalated():
+    profile = make_profile("half_marathon", weeks=20)
+    profile.fitness.average_weekly_distance = 0
+    assert required_weekly_ramp(profile) == float("inf")
+    assert evaluate_rules(profile) is None
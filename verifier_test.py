@@ -1,53 +1,45 @@
-import json
+import os
+from pathlib import Path
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import pytest
+
 import models as m
-import enums
-from main import agent
-
-def main():
-    runner_profile = m.UserProfile(
-        name="Alice",
-        birth_date=m.UserProfile.birth_date_from_age(32),
-        biological_sex="female",
-        units=enums.DistanceUnit.KM,
-        injury_history="Recovered mild shin splints 6 months ago",
-        logistics=m.Logistics(days_available=[enums.DayOfWeek.MON, enums.DayOfWeek.WED, enums.DayOfWeek.FRI], long_run_day=enums.DayOfWeek.FRI),
-        fitness=m.IntermediateFitness(
-            level="intermediate",
-            average_weekly_distance=35.0,
-            current_longest_run=14.0,
-            easy_run_pace="06:30"
-        ),
-        goal=m.RaceGoal(
-            type="marathon",
-            goal_type="finish",
-            race_date="05/01/2026"
-        )
-    )
-    if runner_profile.needs_evaluation:
-        evaluation = agent.run_sync("Here is the user profile:\n" + runner_profile.to_llm_context())
-        print(json.dumps(evaluation.output.model_dump()))
-
-def tmp():
-    runner_profile = m.UserProfile(
-        name="Alice",
-        birth_date=m.UserProfile.birth_date_from_age(32),
-        biological_sex="female",
-        units=enums.DistanceUnit.KM,
-        injury_history="Recovered mild shin splints 6 months ago",
-        days_per_week=4,
-        fitness=m.IntermediateFitness(
-            level="intermediate",
-            average_weekly_distance=35.0,
-            current_longest_run=14.0,
-            easy_run_pace="06:30"
-        ),
-        goal=m.RaceGoal(
-            type="marathon",
-            goal_type="finish",
-            race_date="05/05/2026"
-        )
-    )
-    print(runner_profile.to_llm_context())
-
-if __name__ == "__main__":
-    tmp()
+import shared
+from cassette import CASSETTE_MODE, Cassette, CassetteModel, birth_date_for_age
+from models.enums import RiskValuation
+from verifier import agent, build_verifier_prompt
+
+# Committed with a hand-written response that follows the prompt's rules (it was not
+# recorded), so that the replay runs everywhere. Record the live model's with:
+# LLM_CASSETTE_MODE=record uv run pytest verifier_test.py
+CASSETTE = Path(__file__).parent / "cassettes" / "verifier.json"
+
+PROFILE = m.UserProfile(
+    name="Alice",
+    birth_date=birth_date_for_age(32),
+    biological_sex="female",
+    injury_history="Recovered mild shin splints 6 months ago",
+    logistics=m.Logistics(
+        days_available=[m.DayOfWeek.MON, m.DayOfWeek.WED, m.DayOfWeek.FRI], long_run_day=m.DayOfWeek.FRI,
+    ),
+    fitness=m.IntermediateFitness(
+        level="intermediate", average_weekly_distance=35.0, current_longest_run=14.0, easy_run_pace="06:30",
+    ),
+    goal=m.RaceGoal(type="marathon", goal_type="finish", race_date="2031-05-04"),
+    first_training_date="2030-11-04",
+)
+
+
+def test_verifier_agent():
+    if CASSETTE_MODE == "replay" and not CASSETTE.exists():
+        pytest.skip(f"{CASSETTE.name} not recorded")
+    model = CassetteModel(shared.model, Cassette(CASSETTE), latency_seconds=0)
+    with agent.override(model=model):
+        evaluation = agent.run_sync(build_verifier_prompt(PROFILE)).output
+
+    # A marathon on exactly 3 days per week is a warning by the prompt's rules, to be fixed by a fourth day
+    assert evaluation.outcome == RiskValuation.WARNING
+    assert evaluation.message
+    assert any(proposal.new_days_per_week == 4 for proposal in evaluation.proposals)
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import os
+from pathlib import Path
+
+from sqlalchemy import select
+
+import models as m
+from database import async_session
+from db_models.weekly_template import WeeklyTemplate
+from weeks_builder import WeeklyTarget
+
+TEMPLATES_ENABLED = os.environ.get("WEEKLY_TEMPLATES_ENABLED", "1") == "1"
+# Maximum relative difference in total volume and long run between a template and the target
+VOLUME_TOLERANCE = float(os.environ.get("WEEKLY_TEMPLATE_VOLUME_TOLERANCE", 0.15))
+# Rescaled distances are rounded to this step (km)
+DISTANCE_STEP_KM = 0.5
+
+DAY_ORDER = list(m.DayOfWeek)
+
+
+def template_key(user_profile: m.UserProfile, weekly_target: WeeklyTarget) -> str:
+    """
+    Normalized lookup key: every input of the weekly prompt except the volumes,
+    which are matched approximately and rescaled.
+    """
+    days = sorted(user_profile.logistics.days_available, key=DAY_ORDER.index)
+    strength = "none"
+    if user_profile.strength:
+        strength = f"{user_profile.strength.equipment_access}:{user_profile.strength.sessions_per_week}"
+
+    return "|".join([
+        weekly_target.phase_name,
+        "recovery" if weekly_target.is_recovery_week else "normal",
+        user_profile.fitness.level,
+        ",".join(d.value for d in days),
+        user_profile.logistics.long_run_day.value,
+        strength,
+    ])
+
+
+def round_distance(km: float) -> float:
+    return round(km / DISTANCE_STEP_KM) * DISTANCE_STEP_KM
+
+
+def rescale_schedule(schedule: m.WeeklySchedule, weekly_target: WeeklyTarget) -> m.WeeklySchedule:
+    """
+    Rescale a template schedule to hit the target exactly: the long run is set to
+    `long_run_km` and the other runs are scaled proportionally so that the week
+    sums to `total_volume_km`. Rounding leftovers go to the longest non-long run.
+    """
+    schedule = schedule.model_copy(deep=True)
+    schedule.week_number = weekly_target.week_number
+    schedule.phase_name = weekly_target.phase_name
+    schedule.weekly_volume_target = weekly_target.total_volume_km
+    schedule.weekly_long_run_target = weekly_target.long_run_km
+
+    long_runs = [s for s in schedule.running_sessions if s.run_type == "long_run"]
+    other_runs = [s for s in schedule.running_sessions if s.run_type != "long_run"]
+
+    if long_runs:
+        for session in long_runs:
+            session.distance_km = float(weekly_target.long_run_km)
+        remaining = weekly_target.total_volume_km - weekly_target.long_run_km * len(long_runs)
+    else:
+        remaining = weekly_target.total_volume_km
+
+    other_total = sum(s.distance_km for s in other_runs)
+    if not other_runs or other_total <= 0:
+        return schedule
+
+    factor = max(remaining, 0) / other_total
+    for session in other_runs:
+        session.distance_km = round_distance(session.distance_km * factor)
+
+    leftover = weekly_target.total_volume_km - sum(s.distance_km for s in schedule.running_sessions)
+    longest = max(other_runs, key=lambda s: s.distance_km)
+    longest.distance_km = max(round(longest.distance_km + leftover, 1), 0.0)
+    return schedule
+
+
+def within_tolerance(template_value: int, target_value: int) -> bool:
+    if target_value == 0:
+        return template_value == 0
+    return abs(template_value - target_value) / target_value <= VOLUME_TOLERANCE
+
+
+class WeeklyTemplateLibrary:
+    """
+    Index of previously generated weekly schedules. A target whose normalized key
+    matches a stored template within volume tolerance is served by rescaling the
+    nearest template instead of calling the weekly agent.
+    """
+
+    def __init__(self, session_factory=async_session, enabled: bool = TEMPLATES_ENABLED):
+        self.session_factory = session_factory
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    async def find(self, user_profile: m.UserProfile, weekly_target: WeeklyTarget) -> m.WeeklySchedule | None:
+        if not self.enabled:
+            return None
+
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(WeeklyTemplate).where(WeeklyTemplate.key == template_key(user_profile, weekly_target))
+            )
+            candidates = [
+                t for t in result.scalars().all()
+                if within_tolerance(t.total_volume_km, weekly_target.total_volume_km)
+                and within_tolerance(t.long_run_km, weekly_target.long_run_km)
+            ]
+
+        if not candidates:
+            self.misses += 1
+            return None
+
+        nearest = min(
+            candidates,
+            key=lambda t: (
+                abs(t.total_volume_km - weekly_target.total_volume_km),
+                abs(t.long_run_km - weekly_target.long_run_km),
+                t.id,
+            ),
+        )
+        self.hits += 1
+        return rescale_schedule(m.WeeklySchedule.model_validate(nearest.schedule), weekly_target)
+
+    async def add(self, user_profile: m.UserProfile, weekly_target: WeeklyTarget, schedule: m.WeeklySchedule):
+        if not self.enabled:
+            return
+
+        key = template_key(user_profile, weekly_target)
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(WeeklyTemplate.id).where(
+                    WeeklyTemplate.key == key,
+                    WeeklyTemplate.total_volume_km == weekly_target.total_volume_km,
+                    WeeklyTemplate.long_run_km == weekly_target.long_run_km,
+                )
+            )
+            if result.first():
+                return
+
+            db.add(WeeklyTemplate(
+                key=key,
+                total_volume_km=weekly_target.total_volume_km,
+                long_run_km=weekly_target.long_run_km,
+                schedule=schedule.model_dump(mode="json"),
+            ))
+            await db.commit()
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses}
+
+
+weekly_templates = WeeklyTemplateLibrary()
+
+
+async def main():
+    """Seed the library with the offline schedules in weeks/ (generated for shared.test_profile)."""
+    import shared
+    from database import init_db
+    from macroplanner import TrainingStrategy
+    from weeks_builder import calculate_weekly_progression
+
+    await init_db()
+    with open("plan.json") as f:
+        strategy = TrainingStrategy.model_validate(json.load(f))
+    targets = calculate_weekly_progression(shared.test_profile, strategy)
+    for i, weekly_target in enumerate(targets):
+        p = Path(f"weeks/{i}.json")
+        if not p.is_file():
+            continue
+        schedule = m.WeeklySchedule.model_validate_json(p.read_text())
+        await weekly_templates.add(shared.test_profile, weekly_target, schedule)
+        print(f"Added week {weekly_target.week_number}: {template_key(shared.test_profile, weekly_target)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
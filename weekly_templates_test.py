@@ -0,0 +1,55 @@
+import os
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import models as m
+from weekly_templates import rescale_schedule, template_key
+from weeks_builder import WeeklyTarget
+
+PROFILE = m.UserProfile(
+    name="Test",
+    birth_date=m.UserProfile.birth_date_from_age(30),
+    biological_sex="female",
+    fitness=m.IntermediateFitness(level="intermediate", average_weekly_distance=30, current_longest_run=12),
+    logistics=m.Logistics(days_available=[m.DayOfWeek.SUN, m.DayOfWeek.TUE, m.DayOfWeek.THU], long_run_day=m.DayOfWeek.SUN),
+    goal=m.GeneralGoal(type="base_building"),
+    first_training_date="2025-12-01",
+)
+
+TEMPLATE = m.WeeklySchedule(
+    week_number=3,
+    phase_name="Base",
+    weekly_volume_target=30,
+    weekly_long_run_target=12,
+    week_overview="Easy week.",
+    running_sessions=[
+        m.RunningSession(day="Tuesday", run_type="easy", distance_km=8, workout_description="Easy"),
+        m.RunningSession(day="Thursday", run_type="easy", distance_km=10, workout_description="Easy"),
+        m.RunningSession(day="Sunday", run_type="long_run", distance_km=12, workout_description="Long"),
+    ],
+    strength_sessions=[],
+)
+
+
+def test_key_ignores_day_order_and_volumes():
+    target = WeeklyTarget(week_number=1, phase_name="Base", is_recovery_week=False, total_volume_km=30, long_run_km=12)
+    other = target.model_copy(update={"week_number": 5, "total_volume_km": 33})
+    reordered = PROFILE.model_copy(update={"logistics": m.Logistics(
+        days_available=[m.DayOfWeek.TUE, m.DayOfWeek.THU, m.DayOfWeek.SUN], long_run_day=m.DayOfWeek.SUN
+    )})
+
+    assert template_key(PROFILE, target) == template_key(reordered, other)
+    assert template_key(PROFILE, target) != template_key(PROFILE, target.model_copy(update={"is_recovery_week": True}))
+
+
+def test_rescale_hits_exact_targets():
+    target = WeeklyTarget(week_number=4, phase_name="Base", is_recovery_week=False, total_volume_km=33, long_run_km=13)
+    schedule = rescale_schedule(TEMPLATE, target)
+
+    distances = {s.day: s.distance_km for s in schedule.running_sessions}
+    assert distances[m.DayOfWeek.SUN] == 13
+    assert sum(distances.values()) == 33
+    assert distances[m.DayOfWeek.THU] > distances[m.DayOfWeek.TUE]
+    assert schedule.week_number == 4
+    # The template itself is left untouched
+    assert TEMPLATE.running_sessions[2].distance_km == 12
@@ -1,7 +1,15 @@
+import asyncio
+import time
 import models as m
+import numpy as np
+from collections.abc import Awaitable, Callable
 from macroplanner import TrainingStrategy
 from pydantic import BaseModel
+from typing import TypedDict
 from pydantic_ai import Agent
+from llm_cache import CachedAgent
+import model_utils as mu
+from llm_usage import BudgetExhausted, usage_tracker
 import shared
 import json
 from pathlib import Path
@@ -14,6 +22,20 @@ class WeeklyTarget(BaseModel):
     total_volume_km: int
     long_run_km: int
 
+
+class WeeklyScheduleDraft(TypedDict, total=False):
+    """
+    Streaming variant of WeeklySchedule. Partial validation only works on
+    TypedDicts with optional keys, and drops the (incomplete) last list item.
+    """
+    week_number: int
+    phase_name: str
+    weekly_volume_target: float
+    weekly_long_run_target: float
+    week_overview: str
+    running_sessions: list[m.RunningSession]
+    strength_sessions: list[m.StrengthSession]
+
 # --- Helper Logic ---
 
 def determine_recovery_cycle(profile: m.UserProfile) -> int:
@@ -37,10 +59,17 @@ def determine_recovery_cycle(profile: m.UserProfile) -> int:
         return 3 # 2 weeks build, 1 week recovery
     return 4 # 3 weeks build, 1 week recovery
 
-def get_starting_values(profile: m.UserProfile):
+# Weeks with runs (out of the last 4) needed to trust measured training over the profile
+MIN_MEASURED_WEEKS = 3
+
+def get_starting_values(profile: m.UserProfile, metrics: m.TrainingMetrics | None = None):
     """
-    Estimates current safe volume and long run based on profile.
+    Current safe volume and long run: measured from synced activities when
+    there are enough of them, otherwise estimated from the profile.
     """
+    if metrics and metrics.weeks_of_data >= MIN_MEASURED_WEEKS and metrics.longest_run_km > 0:
+        return metrics.weekly_volume_km, metrics.longest_run_km
+
     if isinstance(profile.fitness, m.IntermediateFitness):
         start_vol = profile.fitness.average_weekly_distance
         start_lr = profile.fitness.current_longest_run
@@ -55,130 +84,127 @@ def get_starting_values(profile: m.UserProfile):
             
     return start_vol, start_lr
 
+PHASES = ("Base", "Build", "Peak", "Taper")
+TAPER = PHASES.index("Taper")
+
+# One row per week of every plan in a batch
+WEEK_DTYPE = np.dtype([
+    ("plan", np.int32),             # index of the (profile, strategy) pair in the batch
+    ("week_number", np.int16),
+    ("phase", np.int8),             # index into PHASES
+    ("is_recovery_week", np.bool_),
+    ("total_volume_km", np.int32),
+    ("long_run_km", np.int32),
+])
+
+
+def calculate_weekly_progression_batch(
+    plans: list[tuple[m.UserProfile, TrainingStrategy]],
+    metrics: list[m.TrainingMetrics | None] | None = None,
+) -> np.ndarray:
+    """
+    Vectorized weekly progression for many (profile, strategy) pairs at once,
+    starting from each plan's measured training if given (see get_starting_values).
+    Returns a WEEK_DTYPE structured array with the weeks of all plans, in order.
+
+    Per week (i = 0-based index, peak = last week before the first Taper week):
+    - Taper weeks: a fraction of the peak targets depending on weeks left to race.
+    - Other weeks: linear interpolation from the starting values to the targets at
+      the peak week, with a dip every `cycle_length` weeks (recovery) and the long
+      run capped at 55% of volume once volume exceeds 30 km.
+    """
+    n_plans = len(plans)
+
+    # 1. Per-plan scalars
+    cycle = np.empty(n_plans, dtype=np.int64)
+    start_vol = np.empty(n_plans)
+    start_lr = np.empty(n_plans)
+    peak_vol = np.empty(n_plans, dtype=np.int64)
+    peak_lr = np.empty(n_plans, dtype=np.int64)
+    phase_codes, phase_weeks, phase_plans = [], [], []
+    first_taper = np.full(n_plans, -1, dtype=np.int64)
+
+    for p, (profile, strategy) in enumerate(plans):
+        cycle[p] = determine_recovery_cycle(profile)
+        start_vol[p], start_lr[p] = get_starting_values(profile, metrics[p] if metrics else None)
+        peak_vol[p] = strategy.target_peak_volume_km
+        peak_lr[p] = strategy.target_longest_run_km
+        offset = 0
+        for phase in strategy.phases:
+            if phase.duration_weeks <= 0:
+                continue
+            if phase.phase_name == "Taper" and first_taper[p] < 0:
+                first_taper[p] = offset
+            phase_codes.append(PHASES.index(phase.phase_name))
+            phase_weeks.append(phase.duration_weeks)
+            phase_plans.append(p)
+            offset += phase.duration_weeks
+
+    # 2. Expand phases into one row per week
+    phase_weeks = np.asarray(phase_weeks, dtype=np.int64)
+    plan = np.repeat(np.asarray(phase_plans, dtype=np.int64), phase_weeks)
+    phase = np.repeat(np.asarray(phase_codes, dtype=np.int64), phase_weeks)
+    total_weeks = np.bincount(plan, minlength=n_plans)
+    plan_offset = np.concatenate([[0], np.cumsum(total_weeks)[:-1]])
+    i = np.arange(len(plan)) - plan_offset[plan]
+    week_num = i + 1
+
+    peak_index = np.where(first_taper >= 0, first_taper - 1, total_weeks - 1)
+    peak_index = np.where(peak_index < 0, total_weeks - 1, peak_index)
+
+    # Broadcast per-plan values to weeks
+    cycle, start_vol, start_lr = cycle[plan], start_vol[plan], start_lr[plan]
+    peak_vol, peak_lr, peak_index, total_weeks = peak_vol[plan], peak_lr[plan], peak_index[plan], total_weeks[plan]
+
+    # 3. Build/Base/Peak weeks
+    vol_range = np.maximum(0, peak_vol - start_vol)
+    lr_range = np.maximum(0, peak_lr - start_lr)
+    progress = np.divide(i, peak_index, out=np.ones(len(i)), where=peak_index > 0)
+    raw_vol = start_vol + (vol_range * progress)
+    raw_lr = start_lr + (lr_range * progress)
+
+    is_peak = i == peak_index
+    is_recovery = (week_num % cycle == 0) & ~is_peak
+    vol = np.where(is_recovery, np.rint(raw_vol * 0.8), np.where(is_peak, peak_vol, np.rint(raw_vol)))
+    lr = np.where(is_recovery, np.rint(raw_lr * 0.75), np.where(is_peak, peak_lr, np.rint(raw_lr)))
+
+    # Safety cap: long run at most 55% of total volume for non-trivial volumes
+    capped = (vol > 30) & (lr > vol * 0.55)
+    lr = np.where(capped, np.rint(vol * 0.55), lr)
+
+    # 4. Taper weeks: drops relative to peak regardless of cycles
+    is_taper = phase == TAPER
+    weeks_until_race = total_weeks - i
+    factor = np.select([weeks_until_race >= 3, weeks_until_race == 2], [0.75, 0.60], default=0.40)
+    vol = np.where(is_taper, np.rint(peak_vol * factor), vol)
+    lr = np.where(is_taper, np.rint(peak_lr * factor * 0.6), lr)
+
+    weeks = np.empty(len(plan), dtype=WEEK_DTYPE)
+    weeks["plan"] = plan
+    weeks["week_number"] = week_num
+    weeks["phase"] = phase
+    weeks["is_recovery_week"] = is_recovery | is_taper
+    weeks["total_volume_km"] = vol
+    weeks["long_run_km"] = lr
+    return weeks
+
+
 def calculate_weekly_progression(
     user_profile: m.UserProfile, 
-    strategy: TrainingStrategy
+    strategy: TrainingStrategy,
+    metrics: m.TrainingMetrics | None = None,
 ) -> list[WeeklyTarget]:
-    
-    # 1. Setup Baselines
-    cycle_length = determine_recovery_cycle(user_profile)
-    current_vol, current_lr = get_starting_values(user_profile)
-    
-    # 2. Expand Phases into a linear week map
-    # We need to know which week belongs to which phase
-    weeks_map = []
-    week_counter = 1
-    for phase in strategy.phases:
-        for _ in range(phase.duration_weeks):
-            weeks_map.append({
-                "week_num": week_counter,
-                "phase": phase.phase_name
-            })
-            week_counter += 1
-            
-    total_weeks = len(weeks_map)
-    
-    # Identify index of the Peak week (Usually the last week of the 'Peak' phase)
-    # If Taper exists, the Peak is the week before Taper starts.
-    peak_week_index = total_weeks - 1
-    for i, w in enumerate(weeks_map):
-        if w["phase"] == "Taper":
-            peak_week_index = i - 1
-            break
-            
-    # If no specific peak/taper structure (e.g. general fitness), peak is end
-    if peak_week_index < 0: peak_week_index = total_weeks - 1
-
-    # 3. Calculate Progression (Linear Interpolation with Recovery Dips)
-    weekly_targets = []
-    
-    # Calculate the raw amount to add per week to reach target by peak week
-    # (Target - Start) / Number of build weeks
-    # This is a simplification; we will refine it by iterating.
-    
-    vol_range = strategy.target_peak_volume_km - current_vol
-    lr_range = strategy.target_longest_run_km - current_lr
-    
-    # Avoid negative progression if user is already above target (rare but possible)
-    vol_range = max(0, vol_range)
-    lr_range = max(0, lr_range)
-
-    for i, w_data in enumerate(weeks_map):
-        phase = w_data["phase"]
-        week_num = w_data["week_num"]
-        
-        # --- TAPER LOGIC ---
-        if phase == "Taper":
-            # Taper is specific: huge drops regardless of cycles
-            # Week 1 of taper: ~70-75% of peak
-            # Week 2 of taper: ~40-50% of peak (Race week)
-            # We calculate distance from end of plan
-            weeks_until_race = total_weeks - i
-            
-            if weeks_until_race >= 3:
-                factor = 0.75
-            elif weeks_until_race == 2:
-                factor = 0.60
-            else: # Race week
-                factor = 0.40 # Includes the race itself usually
-                
-            vol = round(strategy.target_peak_volume_km * factor)
-            lr = round(strategy.target_longest_run_km * factor * 0.6) # LR drops faster in taper
-            
-            weekly_targets.append(WeeklyTarget(
-                week_number=week_num,
-                phase_name=phase,
-                is_recovery_week=True, # Taper is all recovery
-                total_volume_km=vol,
-                long_run_km=lr
-            ))
-            continue
-
-        # --- BUILD/BASE/PEAK LOGIC ---
-        
-        # Determine if this is a recovery week in the cycle
-        # e.g., in a 3:1 cycle (length 4), weeks 4, 8, 12 are recovery
-        # Logic: If it's the last week of a cycle, OR if it's the very first week (ramp up)
-        is_recovery = (week_num % cycle_length == 0) and (i != peak_week_index)
-        
-        # Linear progress calculation
-        # Fraction of progress from 0.0 to 1.0 based on current index vs peak index
-        if peak_week_index > 0:
-            progress_fraction = i / peak_week_index
-        else:
-            progress_fraction = 1.0
-            
-        # Calculate "Ideal Linear" value for this week
-        raw_vol = current_vol + (vol_range * progress_fraction)
-        raw_lr = current_lr + (lr_range * progress_fraction)
-        
-        if is_recovery:
-            # Drop back 20-25% from the *calculated current level*
-            vol = round(raw_vol * 0.8)
-            lr = round(raw_lr * 0.75)
-        elif i == peak_week_index:
-            # Force exact targets on peak week
-            vol = strategy.target_peak_volume_km
-            lr = strategy.target_longest_run_km
-        else:
-            # Standard build week
-            vol = round(raw_vol)
-            lr = round(raw_lr)
-
-        # Safety Cap: Long run should usually not exceed 50% of total volume 
-        # (Exception: beginner low volume plans where LR is the main workout)
-        if vol > 30 and lr > (vol * 0.55):
-             lr = round(vol * 0.55)
-
-        weekly_targets.append(WeeklyTarget(
-            week_number=week_num,
-            phase_name=phase,
-            is_recovery_week=is_recovery,
-            total_volume_km=vol,
-            long_run_km=lr
-        ))
-        
-    return weekly_targets
+    weeks = calculate_weekly_progression_batch([(user_profile, strategy)], [metrics])
+    return [
+        WeeklyTarget(
+            week_number=int(w["week_number"]),
+            phase_name=PHASES[w["phase"]],
+            is_recovery_week=bool(w["is_recovery_week"]),
+            total_volume_km=int(w["total_volume_km"]),
+            long_run_km=int(w["long_run_km"]),
+        )
+        for w in weeks
+    ]
 
 
 system_prompt="""
@@ -210,58 +236,125 @@ Return a valid JSON object matching the `WeeklySchedule` schema.
 - Ensure descriptions are human-readable and motivating.
 """
 
-agent = Agent(model=shared.model, instructions=system_prompt, output_type=m.WeeklySchedule)
+agent = CachedAgent(
+    Agent(model=shared.model, instructions=system_prompt, output_type=m.WeeklySchedule),
+    name="weekly",
+    instructions=system_prompt,
+)
 
-def build_weekly_planner_prompt(
-    user_profile: m.UserProfile, 
-    weekly_target: WeeklyTarget
-) -> str:
-    
-    # 1. Format Strength Info
-    strength_info = "Not requested."
-    if user_profile.strength:
-        strength_info = f"""
-        - Status: Active
-        - Target Sessions: {user_profile.strength.sessions_per_week}
-        - Equipment: {user_profile.strength.equipment_access}
-        """
-
-    # 2. Format Running Schedule
-    available_days = [d.value for d in user_profile.logistics.days_available]
-    lr_day = user_profile.logistics.long_run_day.value
-
-    # 3. Construct Message
-    return f"""
-Please generate the schedule for this specific week:
-
-### Weekly Goals
-- **Week Number**: {weekly_target.week_number}
-- **Phase**: {weekly_target.phase_name}
-- **Target Total Volume**: {weekly_target.total_volume_km} km
-- **Target Long Run**: {weekly_target.long_run_km} km
-
-### User Constraints
-- **Fitness Level**: {user_profile.fitness.level}
-- **Running Days**: {", ".join(available_days)}
-- **Long Run Day**: {lr_day}
-
-### Strength Training Context
-{strength_info}
+# Used for streaming: same instructions, output validated incrementally
+stream_agent = Agent(model=shared.model, instructions=system_prompt, output_type=WeeklyScheduleDraft)
+
+def build_weekly_planner_prompt(user_profile: m.UserProfile, weekly_target: WeeklyTarget) -> str:
+    """The week's targets and constraints as compact JSON, keyed as in the system prompt."""
+    strength = user_profile.strength
+    return "Generate the schedule for this week:\n" + mu.compact_json({
+        "week_number": weekly_target.week_number,
+        "phase": weekly_target.phase_name,
+        "recovery_week": weekly_target.is_recovery_week or None,
+        "weekly_volume_target": weekly_target.total_volume_km,
+        "weekly_long_run_target": weekly_target.long_run_km,
+        "fitness_level": user_profile.fitness.level,
+        "running_days_available": mu.sorted_days(user_profile.logistics.days_available),
+        "long_run_day": user_profile.logistics.long_run_day.value,
+        "strength_profile": strength.model_dump(mode="json") if strength else None,
+    })
+
+async def stream_weekly_schedule(
+    user_profile: m.UserProfile,
+    weekly_target: WeeklyTarget,
+    on_session: Callable[[m.RunningSession], Awaitable[None]],
+) -> m.WeeklySchedule:
     """
+    Runs the weekly agent in streaming mode and awaits `on_session` for each running
+    session as soon as it is complete, i.e. once the model has moved on to the next
+    one (the last session is only known to be complete when the stream ends).
+    Streamed runs bypass the response cache.
+    """
+    emitted = 0
+    prompt = build_weekly_planner_prompt(user_profile, weekly_target)
+    start = time.perf_counter()
+    async with stream_agent.run_stream(prompt) as result:
+        try:
+            async for draft in result.stream_output(debounce_by=0.1):
+                complete = draft.get("running_sessions", [])[:-1]
+                for session in complete[emitted:]:
+                    await on_session(session)
+                emitted = max(emitted, len(complete))
+            draft = await result.get_output()
+        finally:
+            # A stream that broke off is accounted too, with the part of the response it produced
+            messages = result.new_messages()
+            if not result.is_complete:
+                messages = [*messages, result.response]
+            await usage_tracker.record("weekly_stream", messages, time.perf_counter() - start)
+
+    schedule = m.WeeklySchedule.model_validate(draft)
+    for session in schedule.running_sessions[emitted:]:
+        await on_session(session)
+    return schedule
 
-def main():
+
+async def generate_weekly_schedules(
+    user_profile: m.UserProfile,
+    weekly_targets: list[WeeklyTarget],
+    concurrency: int = 4,
+    on_complete: Callable[[WeeklyTarget, m.WeeklySchedule], Awaitable[None]] | None = None,
+    on_session: Callable[[WeeklyTarget, m.RunningSession], Awaitable[None]] | None = None,
+    admit: Callable[[], Awaitable[bool]] | None = None,
+    validate: Callable[[WeeklyTarget, m.WeeklySchedule], Awaitable[m.WeeklySchedule]] | None = None,
+) -> dict[int, m.WeeklySchedule | Exception]:
+    """
+    Generates the schedules for several weeks concurrently, with at most
+    `concurrency` weeks calling the agent at a time. Each schedule goes through
+    `validate`, which may ask the agent again and so runs within that limit too,
+    then `on_complete` is awaited as soon as the week is ready. If `on_session` is
+    given the agent is streamed and it is awaited for every running session as it
+    completes. If `admit` is given it is awaited before each week's agent call,
+    and weeks it refuses fail with BudgetExhausted.
+    Returns the schedule (or the raised exception) per week number.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def generate(weekly_target: WeeklyTarget) -> m.WeeklySchedule:
+        async with semaphore:
+            if admit and not await admit():
+                raise BudgetExhausted("Monthly LLM budget exhausted")
+            if on_session:
+                async def forward(session: m.RunningSession):
+                    await on_session(weekly_target, session)
+
+                schedule = await stream_weekly_schedule(user_profile, weekly_target, forward)
+            else:
+                response = await agent.run(build_weekly_planner_prompt(user_profile, weekly_target))
+                schedule = response.output
+            schedule.week_number = weekly_target.week_number
+            if validate:
+                schedule = await validate(weekly_target, schedule)
+        if on_complete:
+            await on_complete(weekly_target, schedule)
+        return schedule
+
+    results = await asyncio.gather(*(generate(t) for t in weekly_targets), return_exceptions=True)
+    return {t.week_number: r for t, r in zip(weekly_targets, results)}
+
+
+async def main():
     with open("plan.json") as f:
         train_raw = json.load(f)
     train = TrainingStrategy.model_validate(train_raw)
     res = calculate_weekly_progression(shared.test_profile, train)
-    for i,w in enumerate(res[:6]):
-        p = Path(f"weeks/{i}.json")
-        if p.is_file():
-            continue
+    missing = [w for i, w in enumerate(res[:6]) if not Path(f"weeks/{i}.json").is_file()]
+
+    async def save(weekly_target: WeeklyTarget, schedule: m.WeeklySchedule):
+        with Path(f"weeks/{weekly_target.week_number - 1}.json").open("w") as f:
+            f.write(schedule.model_dump_json(indent=2))
 
-        response = agent.run_sync(build_weekly_planner_prompt(shared.test_profile, w))
-        with p.open("w") as f:
-            f.write(response.output.model_dump_json(indent=2))
+    results = await generate_weekly_schedules(shared.test_profile, missing, on_complete=save)
+    for week_number, result in results.items():
+        if isinstance(result, Exception):
+            print(f"Week {week_number} failed: {result}")
 
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    asyncio.run(main())